@@ -0,0 +1,80 @@
+"""
+指标别名匹配模块
+把所有指标名称和别名构建成前缀树并编译为一个正则，一次扫描找出文本中最靠前、最长的指标名
+"""
+
+import re
+from typing import Dict, Iterable, NamedTuple, Optional
+
+
+def _is_ascii_letter(char: str) -> bool:
+    return 'a' <= char <= 'z'
+
+
+class AliasMatch(NamedTuple):
+    """一次别名匹配"""
+    start: int  # 在原文中的起始位置
+    end: int  # 结束位置（不含）
+    name: str  # 标准指标名称
+
+
+class AliasMatcher:
+    """指标别名匹配器
+
+    所有别名（小写）先插入前缀树，再把前缀树展开成嵌套的正则分支：每个节点先尝试更长的子分支，
+    最后才在当前节点结束，因此正则引擎从左到右扫描时得到的就是最靠前、最长的匹配，
+    例如 "MCHC" 不会被识别为 "MCH"。扫描本身在正则引擎中完成，不需要逐字符的Python循环。
+
+    英文别名不区分大小写，并要求两侧不紧挨英文字母（避免 Hb 匹配到 HbsAg 之类的词）；
+    中文别名直接按子串匹配。
+    """
+
+    def __init__(self, aliases: Dict[str, Iterable[str]]):
+        """
+        Args:
+            aliases: 标准名称 -> 别名列表，标准名称本身也会作为别名
+        """
+        # 小写别名 -> 标准名称；多个指标使用同一别名时以先出现的为准
+        self._names: Dict[str, str] = {}
+        trie: Dict[str, dict] = {}
+        for standard_name, names in aliases.items():
+            for alias in [standard_name, *names]:
+                alias = alias.lower()
+                if not alias or alias in self._names:
+                    continue
+                self._names[alias] = standard_name
+                node = trie
+                for char in alias:
+                    node = node.setdefault(char, {})
+                node[''] = {}
+
+        # 正则源码，可嵌入更大的正则（需要在不区分大小写的范围内使用）
+        self.pattern = '|'.join(
+            ('(?<![a-z])' if _is_ascii_letter(char) else '') + re.escape(char) + self._compile_node(child, char)
+            for char, child in sorted(trie.items())
+        )
+        self._regex = re.compile(self.pattern, re.IGNORECASE)
+
+    @classmethod
+    def _compile_node(cls, node: Dict[str, dict], last_char: str) -> str:
+        branches = [
+            re.escape(char) + cls._compile_node(child, char)
+            for char, child in sorted(node.items()) if char
+        ]
+        if '' in node:
+            # 在此结束的别名放在最后，保证优先匹配更长的别名
+            branches.append('(?![a-z])' if _is_ascii_letter(last_char) else '')
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    def lookup(self, alias: str) -> Optional[str]:
+        """别名（不区分大小写）对应的标准名称"""
+        return self._names.get(alias.lower())
+
+    def find(self, text: str, pos: int = 0) -> Optional[AliasMatch]:
+        """找出文本中最靠前、最长的指标名，没有时返回None"""
+        match = self._regex.search(text, pos)
+        if match is None:
+            return None
+        return AliasMatch(match.start(), match.end(), self._names[match.group().lower()])
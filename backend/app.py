@@ -3,24 +3,38 @@
 为ITP患者提供血常规指标分析和趋势跟踪服务
 """
 
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import pandas as pd
 import numpy as np
 from datetime import datetime, date
+import asyncio
 import json
 import os
 import sqlite3
 from pathlib import Path
 
 # 导入血常规识别相关模块
-from models import BloodTestReport, BloodTestItem, BloodTestComparison, UploadResponse
-from blood_test_service import BloodTestAnalysisService
-from storage_service import BloodTestStorageService
-from utils import parse_iso_datetime
+from models import (
+    BloodTestReport, BloodTestItem, BloodTestComparison, UploadResponse, ReportPage, OCRJob,
+    BatchReportResult, BatchUploadResponse
+)
+from blood_test_service import BloodTestAnalysisService, ANALYZE_FIELDS
+from batch_analysis import BatchBloodTestAnalyzer, read_records
+from storage_service import BloodTestStorageService, REPORT_SORT_FIELDS
+from image_store import ImageTooLargeError, StoredImage
+from ocr_jobs import OCRJobQueue, QueueFullError, TERMINAL_STATES
+from ocr_cache import create_ocr_cache
+from report_pages import count_pages
+from patient_index import DEFAULT_MATCH_THRESHOLD
+from cohort_stats import GROUP_BY_FIELDS
+from reference_ranges import normalize_sex
+from utils import parse_iso_datetime, to_naive_local
 
 # 创建FastAPI应用实例
 app = FastAPI(
@@ -38,9 +52,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 上传图片大小上限（字节）与分块读取大小
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 50 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 批量上传的文件数上限
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 50))
+
 # 初始化服务
 blood_test_service = BloodTestAnalysisService()
+batch_analyzer = BatchBloodTestAnalyzer(blood_test_service)
 storage_service = BloodTestStorageService()
+ocr_cache = create_ocr_cache(storage_service.data_dir, blood_test_service.ocr_service.pipeline_fingerprint())
+ocr_job_queue = OCRJobQueue(
+    blood_test_service,
+    storage_service,
+    max_workers=int(os.getenv("OCR_WORKERS", 0)) or None,
+    max_pending=int(os.getenv("OCR_MAX_PENDING", 100)),
+    ocr_cache=ocr_cache
+)
+
+@app.on_event("shutdown")
+def shutdown_ocr_workers():
+    """关闭OCR进程池"""
+    ocr_job_queue.shutdown()
 
 # 血常规图片识别和对比API端点
 
@@ -53,44 +88,88 @@ async def root():
         "status": "healthy"
     }
 
+async def _store_upload(image: UploadFile, keep_data: bool = False) -> StoredImage:
+    """分块读取上传文件写入图片存储，超过大小上限时返回413（keep_data 时同时保留内存中的内容）"""
+    writer = storage_service.open_image_writer(image.filename, max_bytes=MAX_FILE_SIZE, keep_data=keep_data)
+    try:
+        while True:
+            chunk = await image.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception:
+        writer.abort()
+        raise
+    return writer.commit()
+
 @app.post("/api/upload-report", response_model=UploadResponse)
 async def upload_blood_test_report(
     image: UploadFile = File(...),
     patient_name: str = Form(...),
     hospital: str = Form(...),
     test_date: str = Form(...),
-    notes: Optional[str] = Form(None)
+    notes: Optional[str] = Form(None),
+    sex: Optional[str] = Form(None),
+    age: Optional[float] = Form(None),
+    wait: bool = False
 ):
-    """上传血常规报告图片并识别"""
+    """上传血常规报告图片并提交识别任务
+
+    默认立即返回任务ID（status=queued），可通过 /api/jobs/{job_id} 查询进度；
+    wait=true 时等待识别和保存完成后再返回（status=success）。
+    sex/age 用于选择参考范围，未填写时采用报告抬头中识别出的性别和年龄。
+    """
     try:
         # 验证文件类型
         if not image.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="只支持图片文件")
         
-        # 保存图片
-        image_data = await image.read()
-        image_path = storage_service.save_image(image_data, image.filename)
-        
         # 解析日期
         try:
             parsed_date = parse_iso_datetime(test_date)
         except ValueError:
             raise HTTPException(status_code=400, detail="日期格式错误，请使用ISO格式")
         
-        # 分析报告
-        report = blood_test_service.analyze_report(
-            image_path=image_path,
-            patient_name=patient_name,
-            hospital=hospital,
-            test_date=parsed_date
-        )
+        # 分块保存图片（边接收边写盘），按内容哈希去重；内容同时留在内存中供识别直接解码
+        stored = await _store_upload(image, keep_data=True)
+        image_path = stored.path
         
-        # 添加备注
-        if notes:
-            report.notes = notes
+        # 重复上传的图片直接复用已有报告的识别结果，跳过OCR
+        known_items = None
+        if stored.existed:
+            existing_reports = storage_service.get_reports_by_image(image_path)
+            if existing_reports:
+                known_items = existing_reports[0].items
         
-        # 保存报告
-        report_id = storage_service.save_report(report)
+        # 提交OCR任务，识别在进程池中执行
+        try:
+            job_id = ocr_job_queue.submit(
+                image_path=image_path,
+                patient_name=patient_name,
+                hospital=hospital,
+                test_date=parsed_date,
+                notes=notes,
+                known_items=known_items,
+                image_sha256=stored.sha256,
+                image_data=stored.data,
+                sex=sex,
+                age=age
+            )
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        
+        status = "queued"
+        report_id = None
+        if wait:
+            # 等待任务完成（不阻塞事件循环）
+            done = ocr_job_queue.completion(job_id)
+            job = await asyncio.wrap_future(done) if done is not None else ocr_job_queue.get_job(job_id)
+            if job.state == "failed":
+                raise HTTPException(status_code=500, detail=f"报告识别失败: {job.error}")
+            status = "success"
+            report_id = job.report_id
         
         # 构建分析结果
         analysis_result = {
@@ -107,10 +186,14 @@ async def upload_blood_test_report(
             upload_time=datetime.now().isoformat(),
             file_path=image_path,
             analysis=analysis_result,
-            status="success",
-            fix_applied=True
+            status=status,
+            fix_applied=True,
+            job_id=job_id,
+            report_id=report_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"❌ 上传API异常: {str(e)}")
@@ -118,96 +201,374 @@ async def upload_blood_test_report(
         print(f"📋 异常堆栈: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"报告识别失败: {str(e)}")
 
-@app.get("/api/reports", response_model=List[BloodTestReport])
-async def get_all_reports():
-    """获取所有血常规报告"""
+@app.post("/api/upload-reports/batch", response_model=BatchUploadResponse)
+async def upload_blood_test_reports_batch(
+    images: List[UploadFile] = File(...),
+    patient_name: str = Form(...),
+    hospital: str = Form(...),
+    test_date: str = Form(...),
+    notes: Optional[str] = Form(None),
+    merge: bool = Form(False),
+    manifest: Optional[str] = Form(None),
+    sex: Optional[str] = Form(None),
+    age: Optional[float] = Form(None)
+):
+    """批量上传报告图片（支持多页TIFF/PDF）并识别
+
+    多页文件的各页合并为一份报告；merge=true 时所有文件合并为一份报告（同一份报告分多张拍摄）。
+    manifest 为与 images 一一对应的JSON数组，可为每个文件单独指定
+    patient_name/hospital/test_date/notes/sex/age，以及 report（相同值的文件合并为一份报告，元数据取第一个文件的）。
+    各页在OCR进程池中并发识别，全部报告在存储引擎中一次提交。
+    """
     try:
-        return storage_service.get_all_reports()
+        if len(images) > MAX_BATCH_FILES:
+            raise HTTPException(status_code=400, detail=f"单次最多上传 {MAX_BATCH_FILES} 个文件")
+        
+        # 解析每个文件的元数据
+        try:
+            entries = json.loads(manifest) if manifest else [{} for _ in images]
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="manifest 不是有效的JSON")
+        if not isinstance(entries, list) or len(entries) != len(images):
+            raise HTTPException(status_code=400, detail="manifest 必须是与文件数量相同的数组")
+        if not all(isinstance(entry, dict) for entry in entries):
+            raise HTTPException(status_code=400, detail="manifest 的每一项必须是JSON对象")
+        
+        groups: Dict[str, Dict[str, Any]] = {}
+        keys = []
+        for index, (image, entry) in enumerate(zip(images, entries)):
+            if not (image.content_type.startswith('image/') or image.content_type == 'application/pdf'):
+                raise HTTPException(status_code=400, detail=f"只支持图片或PDF文件: {image.filename}")
+            meta = {
+                'patient_name': entry.get('patient_name') or patient_name,
+                'hospital': entry.get('hospital') or hospital,
+                'test_date': entry.get('test_date') or test_date,
+                'notes': entry.get('notes') or notes,
+                'sex': entry.get('sex') or sex,
+                'age': entry.get('age') if entry.get('age') is not None else age
+            }
+            try:
+                parsed_date = parse_iso_datetime(meta['test_date'])
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"日期格式错误，请使用ISO格式: {meta['test_date']}")
+            key = 'merged' if merge else str(entry.get('report') or f"file-{index}")
+            group = groups.setdefault(key, dict(meta, parsed_date=parsed_date, files=[], stored=[]))
+            group['files'].append(image.filename)
+            keys.append(key)
+        
+        # 分块保存全部文件；没有保存成报告的分组（识别失败、队列已满等）结束时释放本次新写入的图片
+        saved_ids: Dict[str, str] = {}
+        try:
+            for image, key in zip(images, keys):
+                groups[key]['stored'].append(await _store_upload(image))
+            
+            # 统计页数，展开为逐页的识别任务
+            pages = []  # (分组, 文件路径, 页码, 缓存键)
+            errors: Dict[str, str] = {}
+            for key, group in groups.items():
+                for stored in group['stored']:
+                    try:
+                        page_count = await run_in_threadpool(count_pages, stored.path)
+                    except ValueError as e:
+                        errors[key] = str(e)
+                        continue
+                    for page in range(page_count):
+                        cache_key = stored.sha256 if page_count == 1 else f"{stored.sha256}:{page}"
+                        pages.append((key, stored.path, page, cache_key))
+            
+            # 并发识别所有页
+            try:
+                futures = ocr_job_queue.recognize_pages([page[1:] for page in pages])
+            except QueueFullError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+            
+            # 按分组合并各页的检测项目
+            page_items: Dict[str, List[List[BloodTestItem]]] = {key: [] for key in groups}
+            page_info: Dict[str, List[Optional[Dict[str, Any]]]] = {key: [] for key in groups}
+            for (key, _, _, _), result in zip(pages, results):
+                if isinstance(result, Exception):
+                    errors.setdefault(key, f"报告识别失败: {str(result)}")
+                else:
+                    page_items[key].append(result[0])
+                    page_info[key].append(result[1])
+            
+            reports = []
+            report_keys = []
+            for key, group in groups.items():
+                if key in errors:
+                    continue
+                report = blood_test_service.analyze_report(
+                    image_path=group['stored'][0].path,
+                    patient_name=group['patient_name'],
+                    hospital=group['hospital'],
+                    test_date=group['parsed_date'],
+                    items=blood_test_service.merge_page_items(page_items[key]),
+                    ocr_info={'pages': page_info[key]},
+                    sex=group['sex'],
+                    age=group['age']
+                )
+                if group['notes']:
+                    report.notes = group['notes']
+                reports.append(report)
+                report_keys.append(key)
+            
+            # 一次提交全部报告
+            if reports:
+                saved_ids.update(zip(report_keys, await run_in_threadpool(storage_service.save_reports, reports)))
+            items_count = {key: len(report.items) for key, report in zip(report_keys, reports)}
+            
+            results = []
+            for key, group in groups.items():
+                results.append(BatchReportResult(
+                    report_id=saved_ids.get(key),
+                    patient_name=group['patient_name'],
+                    hospital=group['hospital'],
+                    test_date=group['test_date'],
+                    files=group['files'],
+                    image_paths=[stored.path for stored in group['stored']],
+                    pages=sum(1 for page in pages if page[0] == key),
+                    items_count=items_count.get(key, 0),
+                    status="saved" if key in saved_ids else "failed",
+                    error=errors.get(key)
+                ))
+        finally:
+            kept = {stored.path for key in saved_ids for stored in groups[key]['stored']}
+            storage_service.release_images(stored for key, group in groups.items() if key not in saved_ids
+                                           for stored in group['stored'] if stored.path not in kept)
+        
+        saved = len(saved_ids)
+        failed = len(results) - saved
+        return BatchUploadResponse(
+            status="success" if failed == 0 else ("partial" if saved else "failed"),
+            upload_time=datetime.now().isoformat(),
+            saved=saved,
+            failed=failed,
+            reports=results
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"❌ 批量上传API异常: {str(e)}")
+        print(f"📋 异常堆栈: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"批量识别失败: {str(e)}")
+
+@app.get("/api/jobs/{job_id}", response_model=OCRJob)
+async def get_ocr_job(job_id: str):
+    """查询OCR任务状态"""
+    job = ocr_job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_ocr_job(job_id: str):
+    """以SSE推送OCR任务状态变化，任务结束后关闭"""
+    if ocr_job_queue.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    async def events():
+        last_state = None
+        while True:
+            job = ocr_job_queue.get_job(job_id)
+            if job is None:
+                break
+            if job.state != last_state:
+                last_state = job.state
+                yield f"event: {job.state}\ndata: {job.json()}\n\n"
+            if job.state in TERMINAL_STATES:
+                break
+            await asyncio.sleep(0.2)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _list_or_page(reports: List[BloodTestReport], limit: Optional[int], after: Optional[str],
+                  sort: str, order: str) -> Union[List[BloodTestReport], ReportPage]:
+    """未指定limit时返回完整列表（兼容旧客户端），否则返回游标分页结果"""
+    if limit is None:
+        return reports
+    try:
+        return storage_service.paginate_reports(
+            reports, limit=limit, after=after, sort_by=sort, descending=(order == "desc")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _validate_page_params(sort: str, order: str):
+    """校验分页排序参数"""
+    if sort not in REPORT_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort 仅支持: {', '.join(REPORT_SORT_FIELDS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order 仅支持 asc 或 desc")
+
+def _parse_date_param(value: Optional[str], name: str, end_of_day: bool = False) -> Optional[datetime]:
+    """解析日期查询参数，仅给出日期的结束时间按当天最后一刻处理
+
+    带时区的参数（如 ...Z）换算为不带时区的本地时间，与报告中保存的检测日期一致。
+    """
+    if value is None:
+        return None
+    try:
+        parsed = to_naive_local(parse_iso_datetime(value))
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail=f"{name} 日期格式错误，请使用ISO格式")
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
+
+@app.get("/api/reports", response_model=Union[List[BloodTestReport], ReportPage])
+def get_all_reports(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after: Optional[str] = None,
+    sort: str = "test_date",
+    order: str = "desc",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    patient: Optional[str] = None
+):
+    """获取血常规报告，可按检测日期区间（from/to）和患者过滤，指定limit时按游标分页
+
+    读取报告的接口均为同步处理函数：其他进程写入后首次读取会重建报告缓存，由线程池执行，不阻塞事件循环。
+    """
+    _validate_page_params(sort, order)
+    start_date = _parse_date_param(date_from, "from")
+    end_date = _parse_date_param(date_to, "to", end_of_day=True)
+    try:
+        if start_date or end_date:
+            reports = storage_service.query_reports_by_date(start_date, end_date, patient_name=patient)
+        elif patient is not None:
+            reports = storage_service.get_reports_by_patient(patient)
+        else:
+            reports = storage_service.get_all_reports()
+        return _list_or_page(reports, limit, after, sort, order)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取报告失败: {str(e)}")
 
+@app.get("/api/reports/export")
+async def export_reports():
+    """以NDJSON流式导出全部报告，逐条从存储读取"""
+    def generate():
+        for report_data in storage_service.iter_report_dicts():
+            yield json.dumps(report_data, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=blood_test_reports.ndjson"}
+    )
+
 @app.get("/api/reports/{report_id}", response_model=BloodTestReport)
-async def get_report(report_id: str):
+def get_report(report_id: str):
     """根据ID获取血常规报告"""
     try:
         report = storage_service.get_report(report_id)
         if not report:
             raise HTTPException(status_code=404, detail="报告不存在")
         return report
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取报告失败: {str(e)}")
 
-@app.get("/api/reports/patient/{patient_name}", response_model=List[BloodTestReport])
-async def get_patient_reports(patient_name: str):
-    """获取指定患者的血常规报告"""
+@app.get("/api/reports/patient/{patient_name}", response_model=Union[List[BloodTestReport], ReportPage])
+def get_patient_reports(
+    patient_name: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after: Optional[str] = None,
+    sort: str = "test_date",
+    order: str = "desc"
+):
+    """获取指定患者的血常规报告，指定limit时按游标分页"""
+    _validate_page_params(sort, order)
     try:
-        return storage_service.get_reports_by_patient(patient_name)
+        return _list_or_page(storage_service.get_reports_by_patient(patient_name), limit, after, sort, order)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取患者报告失败: {str(e)}")
 
-@app.get("/api/reports/search/{query}", response_model=List[BloodTestReport])
-async def search_reports(query: str):
-    """搜索血常规报告"""
+@app.get("/api/reports/search/{query}", response_model=Union[List[BloodTestReport], ReportPage])
+def search_reports(
+    query: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    after: Optional[str] = None,
+    sort: str = "test_date",
+    order: str = "desc"
+):
+    """搜索血常规报告，指定limit时按游标分页"""
+    _validate_page_params(sort, order)
     try:
-        return storage_service.search_reports(query)
+        return _list_or_page(storage_service.search_reports(query), limit, after, sort, order)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索报告失败: {str(e)}")
 
 @app.get("/api/reports/compare/{report_id}")
-async def compare_with_history(report_id: str):
-    """与历史数据对比"""
+def compare_with_history(report_id: str,
+                         threshold: Optional[float] = Query(None, ge=0, le=1, description="患者姓名匹配阈值（0-1）"),
+                         compact: bool = Query(False, description="只返回历史报告ID，不内嵌完整报告")):
+    """与历史数据对比，历史报告按患者姓名模糊匹配（规范化姓名、字符/拼音相似度）
+
+    对比结果按报告物化保存，同一患者的报告变化前重复打开只读取已保存的结果。
+    查询、计算和保存（等待跨进程写锁）都是阻塞操作，使用同步处理函数由线程池执行，不占用事件循环。
+    """
     try:
         current_report = storage_service.get_report(report_id)
         if not current_report:
             raise HTTPException(status_code=404, detail="报告不存在")
         
-        # 获取所有报告
-        all_reports = storage_service.get_all_reports()
-        
-        # 查找相似患者名的历史报告（支持模糊匹配）
-        previous_reports = []
-        current_patient_name = current_report.patient_name.lower()
-        
-        print(f"🔍 调试信息: 当前患者 '{current_report.patient_name}' (ID: {report_id})")
-        print(f"🔍 调试信息: 当前患者名(小写): '{current_patient_name}'")
-        print(f"🔍 调试信息: 总报告数: {len(all_reports)}")
-        
-        for report in all_reports:
-            if report.id != report_id:  # 排除当前报告
-                # 检查患者姓名是否相似（包含关系或前缀匹配）
-                report_patient_name = report.patient_name.lower()
-                print(f"🔍 调试信息: 检查报告 '{report.patient_name}' (ID: {report.id})")
-                print(f"🔍 调试信息: 报告患者名(小写): '{report_patient_name}'")
-                
-                # 检查匹配条件
-                contains_current = current_patient_name in report_patient_name
-                current_contains = report_patient_name in current_patient_name
-                surname_match = current_patient_name.split()[0] == report_patient_name.split()[0] if ' ' in current_patient_name or ' ' in report_patient_name else False
-                
-                print(f"🔍 调试信息: 包含关系: {contains_current}, 被包含: {current_contains}, 姓氏匹配: {surname_match}")
-                
-                if (contains_current or current_contains or surname_match):
-                    print(f"✅ 匹配成功: '{report.patient_name}' 添加到历史报告")
-                    previous_reports.append(report)
-                else:
-                    print(f"❌ 匹配失败: '{report.patient_name}' 不匹配")
+        # 阈值保留两位小数，作为物化结果的键
+        threshold = round(DEFAULT_MATCH_THRESHOLD if threshold is None else threshold, 2)
+        fingerprint = blood_test_service.comparison_fingerprint()
+        materialized = storage_service.get_comparison(report_id, threshold, fingerprint)
         
-        print(f"🔍 调试信息: 找到 {len(previous_reports)} 个历史报告")
+        if materialized is None:
+            token = storage_service.change_token()
+            
+            # 从患者身份索引查找匹配患者的历史报告
+            previous_reports, matched_patients = storage_service.get_history_reports(current_report, threshold)
+            
+            # 从列式存储读取匹配患者的指标历史
+            history = storage_service.get_indicator_history(
+                (r.patient_name for r in previous_reports), exclude_report_id=report_id
+            )
+            
+            # 进行对比分析，保存时历史报告只记录ID
+            comparison_result = blood_test_service.compare_with_history(current_report, previous_reports, history)
+            if "previous_reports" in comparison_result:
+                comparison_result["previous_report_ids"] = [r.id for r in comparison_result.pop("previous_reports")]
+            materialized = {
+                "comparison": comparison_result,
+                "matched_patients": [{"patient_name": name, "score": score} for name, score in matched_patients]
+            }
+            storage_service.save_comparison(current_report, threshold, fingerprint, materialized, token)
         
-        # 进行对比分析
-        comparison_result = blood_test_service.compare_with_history(current_report, previous_reports)
+        comparison_result = materialized["comparison"]
+        if not compact and "previous_report_ids" in comparison_result:
+            comparison_result["previous_reports"] = [
+                report for report in map(storage_service.get_report, comparison_result.pop("previous_report_ids"))
+                if report is not None
+            ]
         
         return {
             "current_report": current_report,
-            "comparison": comparison_result
+            "comparison": comparison_result,
+            "matched_patients": materialized["matched_patients"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"对比分析失败: {str(e)}")
 
 @app.delete("/api/reports/{report_id}")
-async def delete_report(report_id: str):
-    """删除血常规报告"""
+def delete_report(report_id: str):
+    """删除血常规报告（等待跨进程写锁并可能删除图片文件，同步处理函数由线程池执行）"""
     try:
         success = storage_service.delete_report(report_id)
         if not success:
@@ -215,17 +576,49 @@ async def delete_report(report_id: str):
         
         return {"message": "报告删除成功"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除报告失败: {str(e)}")
 
+@app.get("/api/trends")
+async def get_trends(
+    patient: Optional[List[str]] = Query(None, description="患者姓名，可重复传入；为空时计算全部患者"),
+    indicator: Optional[List[str]] = Query(None, description="指标名称，可重复传入；为空时返回全部标准指标")
+):
+    """按实际检测时间批量计算患者各指标的趋势（每天斜率、相对变化、置信度）"""
+    try:
+        return await run_in_threadpool(storage_service.get_patient_trends, patient, indicator)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"计算趋势失败: {str(e)}")
+
 @app.get("/api/statistics")
-async def get_statistics():
+def get_statistics():
     """获取统计信息"""
     try:
         return storage_service.get_statistics()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
+@app.get("/api/statistics/check")
+async def check_statistics():
+    """校验当前进程增量维护的统计信息与存储中的数据是否一致"""
+    try:
+        drift = await run_in_threadpool(storage_service.check_statistics)
+        return {"consistent": not drift, "drift": drift}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"校验统计信息失败: {str(e)}")
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """获取报告缓存和OCR识别结果缓存的命中统计"""
+    try:
+        stats = storage_service.get_cache_stats()
+        stats["ocr"] = ocr_cache.stats()
+        return stats
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取缓存统计失败: {str(e)}")
+
 @app.get("/api/indicators/reference-ranges")
 async def get_reference_ranges():
     """获取血常规指标参考范围"""
@@ -234,11 +627,23 @@ async def get_reference_ranges():
         ocr_service = blood_test_service.ocr_service
         return {
             "reference_ranges": ocr_service.reference_ranges,
+            "rules": ocr_service.reference_engine.describe(),
             "indicators": ocr_service.blood_indicators
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取参考范围失败: {str(e)}")
 
+@app.post("/api/indicators/reclassify")
+async def reclassify_reports():
+    """参考范围规则变化后，按各报告的性别年龄重新判定已保存的检测项目"""
+    try:
+        updated = await run_in_threadpool(
+            storage_service.reclassify_reports, blood_test_service.reference_engine
+        )
+        return {"updated_reports": updated}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重新判定失败: {str(e)}")
+
 @app.post("/api/analyze")
 async def analyze_blood_test(request: dict):
     """分析血常规数据"""
@@ -261,6 +666,135 @@ async def analyze_blood_test(request: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"分析失败: {str(e)}")
 
+@app.post("/api/analyze/batch")
+async def analyze_blood_test_batch(request: Request):
+    """批量分析血常规数据
+
+    请求体为 JSON 记录数组（或 {"records": [...], "analysis_type": ...}）、NDJSON 或 CSV，
+    每条记录的字段与 /api/analyze 的 blood_test 相同。结果以NDJSON流式返回，
+    每行为 {"index": 记录序号, "result": 分析结果} 或 {"index": 记录序号, "error": 错误信息}。
+    """
+    try:
+        frame, analysis_type, client_typed = read_records(await request.body(),
+                                                          request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"无法解析批量数据: {str(e)}")
+    
+    if frame.empty:
+        raise HTTPException(status_code=400, detail="缺少血常规数据")
+    
+    def generate():
+        for outcome in batch_analyzer.iter_results(frame, analysis_type, client_typed=client_typed):
+            yield json.dumps(outcome, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+def _cohort_params(indicator: str, date_from: Optional[str], date_to: Optional[str],
+                   sex: Optional[str], percentiles: Optional[str] = None) -> Dict[str, Any]:
+    """解析人群统计的公共参数：指标可用字段名（如 plt）或中文名，百分位点以逗号分隔"""
+    params = {
+        "indicator": ANALYZE_FIELDS.get(indicator, indicator),
+        "start_date": _parse_date_param(date_from, "from"),
+        "end_date": _parse_date_param(date_to, "to", end_of_day=True),
+        "sex": None
+    }
+    if sex is not None:
+        params["sex"] = normalize_sex(sex)
+        if params["sex"] is None:
+            raise HTTPException(status_code=400, detail=f"无法识别的性别: {sex}")
+    if percentiles is not None:
+        try:
+            params["percentiles"] = [float(p) for p in percentiles.split(",") if p.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="percentiles 格式错误，例如 5,25,50,75,95")
+        if any(p < 0 or p > 100 for p in params["percentiles"]):
+            raise HTTPException(status_code=400, detail="百分位点必须在0-100之间")
+    return params
+
+@app.get("/api/cohort/summary")
+async def cohort_summary(
+    indicator: str,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    hospital: Optional[str] = None,
+    sex: Optional[str] = None,
+    percentiles: str = "5,25,50,75,95",
+    below: Optional[float] = Query(None, description="统计低于该值的报告数和占比"),
+    above: Optional[float] = Query(None, description="统计高于该值的报告数和占比")
+):
+    """指标的人群分布：计数、均值、标准差、百分位数和异常占比（一次遍历流式计算）"""
+    params = _cohort_params(indicator, date_from, date_to, sex, percentiles)
+    try:
+        aggregator = await run_in_threadpool(
+            storage_service.aggregate_cohort, params["indicator"], params["start_date"], params["end_date"],
+            hospital, params["sex"], None, below, above
+        )
+        return {"indicator": params["indicator"], **aggregator.overall.summary(params["percentiles"])}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"人群统计失败: {str(e)}")
+
+@app.get("/api/cohort/histogram")
+async def cohort_histogram(
+    indicator: str,
+    bins: int = Query(20, ge=1, le=200),
+    low: Optional[float] = Query(None, alias="min", description="直方图下界，默认为最小值"),
+    high: Optional[float] = Query(None, alias="max", description="直方图上界，默认为最大值"),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    hospital: Optional[str] = None,
+    sex: Optional[str] = None
+):
+    """指标的人群直方图（等宽分箱，由分位数草图得到）"""
+    params = _cohort_params(indicator, date_from, date_to, sex)
+    if low is not None and high is not None and high <= low:
+        raise HTTPException(status_code=400, detail="max 必须大于 min")
+    try:
+        aggregator = await run_in_threadpool(
+            storage_service.aggregate_cohort, params["indicator"], params["start_date"], params["end_date"],
+            hospital, params["sex"]
+        )
+        return {
+            "indicator": params["indicator"],
+            "count": aggregator.overall.moments.count,
+            **aggregator.overall.histogram(bins, low, high)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"人群统计失败: {str(e)}")
+
+@app.get("/api/cohort/groups")
+async def cohort_groups(
+    indicator: str,
+    group_by: str = "hospital",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    hospital: Optional[str] = None,
+    sex: Optional[str] = None,
+    percentiles: str = "50",
+    below: Optional[float] = Query(None, description="统计各组低于该值的报告数和占比"),
+    above: Optional[float] = Query(None, description="统计各组高于该值的报告数和占比")
+):
+    """按医院、年份、季度、月份或性别分组的指标统计，例如各医院 PLT<50 的报告占比"""
+    if group_by not in GROUP_BY_FIELDS:
+        raise HTTPException(status_code=400, detail=f"group_by 只能是: {', '.join(GROUP_BY_FIELDS)}")
+    params = _cohort_params(indicator, date_from, date_to, sex, percentiles)
+    try:
+        aggregator = await run_in_threadpool(
+            storage_service.aggregate_cohort, params["indicator"], params["start_date"], params["end_date"],
+            hospital, params["sex"], group_by, below, above
+        )
+        return {
+            "indicator": params["indicator"],
+            "group_by": group_by,
+            "overall": aggregator.overall.summary(params["percentiles"]),
+            "groups": {
+                key: aggregator.groups[key].summary(params["percentiles"]) for key in sorted(aggregator.groups)
+            }
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"人群统计失败: {str(e)}")
+
 @app.get("/health")
 async def health_check():
     """健康检查端点"""
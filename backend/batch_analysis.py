@@ -0,0 +1,293 @@
+"""
+血常规批量分析模块
+将大批量记录读入 DataFrame，按列向量化判定血小板、红细胞、白细胞状态和ITP出血风险，
+每条记录的结果与逐条分析（BloodTestAnalysisService.analyze_blood_test_data）一致
+"""
+
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+from blood_test_service import ANALYZE_FIELDS, BloodTestAnalysisService
+from reference_ranges import STATUS_LABELS, STATUS_NORMAL
+
+# 每次向量化处理并输出的记录数
+BATCH_CHUNK_SIZE = 2000
+
+# 各项分析的状态文字模板，{} 处填入请求中的原始数值
+_PLATELET_MESSAGES = {
+    "severe": "血小板严重减少 ({} ×10^9/L)，出血风险极高",
+    "moderate": "血小板中度减少 ({} ×10^9/L)，需要关注",
+    "mild": "血小板轻度减少 ({} ×10^9/L)",
+    "high": "血小板计数偏高 ({} ×10^9/L)",
+    "normal": "血小板计数正常 ({} ×10^9/L)"
+}
+_RBC_MESSAGES = {
+    "severe": "严重贫血 (Hb: {} g/L)",
+    "moderate": "中度贫血 (Hb: {} g/L)",
+    "mild": "轻度贫血 (Hb: {} g/L)",
+    "high": "血红蛋白偏高 (Hb: {} g/L)",
+    "normal": "血红蛋白正常 (Hb: {} g/L)"
+}
+_WBC_MESSAGES = {
+    "low": "白细胞减少 (WBC: {} ×10^9/L)",
+    "high": "白细胞增多 (WBC: {} ×10^9/L)",
+    "normal": "白细胞计数正常 (WBC: {} ×10^9/L)"
+}
+
+# (分析字段, 字段, 数据缺失提示, 状态文字模板, 参考范围单位, 关键发现前缀)
+_SECTIONS = (
+    ("platelet_analysis", "plt", "血小板计数数据缺失", _PLATELET_MESSAGES, "×10^9/L", "血小板计数异常"),
+    ("rbc_analysis", "hgb", "血红蛋白数据缺失", _RBC_MESSAGES, "g/L", "红细胞指标异常"),
+    ("wbc_analysis", "wbc", "白细胞计数数据缺失", _WBC_MESSAGES, "×10^9/L", "白细胞指标异常")
+)
+
+
+def _coerce_cell(text: Any) -> Any:
+    """CSV 数值字段的单元格按其文字转换：空白为None，整数为int，小数为float，无法转换时保留原文"""
+    if text is None:
+        return None
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def read_records(body: bytes, content_type: str) -> Tuple[pd.DataFrame, str, bool]:
+    """
+    解析批量分析请求体
+
+    支持 JSON（记录数组，或 {"records": [...], "analysis_type": ...}）、
+    NDJSON（每行一条记录）和 CSV（首行为字段名）。
+    CSV 不区分数值和文字，各单元格按 _coerce_cell 单独转换，不按整列推断类型。
+
+    Args:
+        body: 请求体
+        content_type: 请求的 Content-Type
+
+    Returns:
+        (记录表（object列，缺失值为None）, 分析类型, 字段类型是否由客户端给出（JSON/NDJSON）)
+
+    Raises:
+        ValueError: 请求体无法解析
+    """
+    analysis_type = "comprehensive"
+    content_type = (content_type or "").split(";")[0].strip().lower()
+
+    if content_type in ("text/csv", "application/csv"):
+        frame = pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False)
+        columns = {}
+        for name in frame.columns:
+            if name in ANALYZE_FIELDS or name == "age":
+                cells = [_coerce_cell(text) for text in frame[name]]
+            else:
+                cells = [text.strip() or None for text in frame[name]]
+            # object 列避免 None 与整数混合时被转换为浮点数
+            columns[name] = pd.Series(cells, index=frame.index, dtype=object)
+        frame = pd.DataFrame(columns, index=frame.index)
+        client_typed = False
+    else:
+        text = body.decode("utf-8-sig")
+        if content_type in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            payload = json.loads(text)
+            if isinstance(payload, dict):
+                analysis_type = payload.get("analysis_type", analysis_type)
+                records = payload.get("records", [])
+            else:
+                records = payload
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError("记录必须是JSON对象数组")
+        # object 列保留原始数值类型，输出的文字与逐条分析一致（如 80 与 80.0）
+        frame = pd.DataFrame(records, dtype=object) if records else pd.DataFrame()
+        client_typed = True
+
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None), analysis_type, client_typed
+
+
+class BatchBloodTestAnalyzer:
+    """血常规批量分析器
+
+    参考范围判定对整批记录的全部指标只调用一次参考范围引擎，
+    分级、整体状态和ITP评估用 NumPy 按列计算；只有组装输出字典时逐行处理。
+    建议内容只取决于 (整体状态, 血小板状态, 出血风险)，每种组合只生成一次。
+    """
+
+    def __init__(self, service: BloodTestAnalysisService):
+        self.service = service
+        self.reference_engine = service.reference_engine
+        self._recommendations: Dict[Tuple[str, str, str], List[str]] = {}
+
+    def iter_results(self, frame: pd.DataFrame, analysis_type: str = "comprehensive",
+                     chunk_size: int = BATCH_CHUNK_SIZE, client_typed: bool = True) -> Iterator[Dict[str, Any]]:
+        """按块分析并逐条产出 {"index": 行号, "result": 分析结果} 或 {"index": 行号, "error": 错误信息}"""
+        for start in range(0, len(frame), chunk_size):
+            chunk = frame.iloc[start:start + chunk_size]
+            for offset, outcome in enumerate(self.analyze(chunk, analysis_type, client_typed)):
+                yield {"index": start + offset, **outcome}
+
+    def analyze(self, frame: pd.DataFrame, analysis_type: str = "comprehensive",
+                client_typed: bool = True) -> List[Dict[str, Any]]:
+        """
+        向量化分析一批记录
+
+        Args:
+            frame: 每行一条记录，列为 analyze_blood_test_data 接受的字段，缺失值为None
+            analysis_type: 分析类型
+            client_typed: 字段类型由客户端给出（JSON）；此时分级字段为字符串的记录与逐条分析一样判为失败
+
+        Returns:
+            与行一一对应的 {"result": ...} 或 {"error": ...}
+        """
+        count = len(frame)
+        fields = list(ANALYZE_FIELDS)
+
+        def column(name: str) -> pd.Series:
+            if name in frame.columns:
+                return frame[name].reset_index(drop=True)
+            return pd.Series([None] * count, dtype=object)
+
+        raw = {field: column(field).to_numpy(dtype=object) for field in fields}
+        present = np.zeros((count, len(fields)), dtype=bool)
+        numeric = np.full((count, len(fields)), np.nan)
+        for j, field in enumerate(fields):
+            present[:, j] = pd.notna(raw[field])
+            numeric[:, j] = pd.to_numeric(pd.Series(raw[field], dtype=object), errors='coerce').to_numpy(dtype=float)
+
+        # 性别取 sex，为空时取 gender；年龄必须是数值
+        sex = column("sex")
+        sexes = np.where(sex.map(bool, na_action='ignore').fillna(False).astype(bool),
+                         sex.to_numpy(dtype=object), column("gender").to_numpy(dtype=object))
+        age = column("age")
+        ages = pd.to_numeric(age, errors='coerce').to_numpy(dtype=float)
+
+        # 逐条分析会抛出异常的记录：数值字段无法转换，（JSON中）分级字段为字符串，或全部字段为空
+        errors = np.full(count, None, dtype=object)
+        bad = (present & np.isnan(numeric)).any(axis=1) | (age.notna().to_numpy() & np.isnan(ages))
+        if client_typed:
+            for field in ("plt", "hgb", "wbc"):
+                bad |= np.array([isinstance(value, str) for value in raw[field]], dtype=bool)
+        errors[bad] = "血常规数据分析失败: 无法转换为数值"
+        errors[frame.isna().all(axis=1).to_numpy() if len(frame.columns) else np.ones(count, bool)] = "缺少血常规数据"
+        valid = np.array([error is None for error in errors], dtype=bool)
+
+        # 全部记录的全部指标一次判定
+        rows, cols = np.nonzero(present & valid[:, None])
+        names = np.array([ANALYZE_FIELDS[field] for field in fields], dtype=object)
+        result = self.reference_engine.classify(names[cols], numeric[rows, cols], sexes[rows], ages[rows])
+
+        low = np.full((count, len(fields)), np.nan)
+        high = np.full((count, len(fields)), np.nan)
+        low[rows, cols] = result.low
+        high[rows, cols] = result.high
+
+        statuses = {}
+        for section, field, _, _, _, _ in _SECTIONS:
+            j = fields.index(field)
+            statuses[section] = self._grade(field, present[:, j], numeric[:, j], low[:, j], high[:, j])
+
+        abnormal_count = sum((statuses[section] != "normal").astype(int) for section, *_ in _SECTIONS)
+        overall = np.select([abnormal_count == 0, abnormal_count <= 2], ["normal", "attention"], "abnormal")
+
+        plt_grade = statuses["platelet_analysis"]
+        plt_status = np.select(
+            [plt_grade == "unknown", np.isin(plt_grade, ("severe", "moderate", "mild"))],
+            ["unknown", plt_grade], "normal"
+        )
+        bleeding_risk = np.select([plt_status == "severe", plt_status == "mild"], ["high", "moderate"], "minimal")
+
+        # 组装输出
+        indicators = [{} for _ in range(count)]
+        for k, (i, j) in enumerate(zip(rows.tolist(), cols.tolist())):
+            rule = self.reference_engine.rules[int(result.rules[k])]
+            code = int(result.codes[k])
+            indicators[i][fields[j]] = {
+                "name": rule.name,
+                "value": float(result.values[k]),
+                "low": rule.low,
+                "high": rule.high,
+                "unit": rule.unit,
+                "reference_range": rule.range_text,
+                "status": STATUS_LABELS[code],
+                "is_abnormal": code != STATUS_NORMAL
+            }
+
+        patient_ids = column("patient_id").to_numpy(dtype=object)
+        analysis_date = datetime.now()
+        default_patient_id = f"patient_{analysis_date.strftime('%Y%m%d%H%M%S')}"
+
+        outcomes = []
+        for i in range(count):
+            if not valid[i]:
+                outcomes.append({"error": errors[i]})
+                continue
+
+            analysis_results = {"indicators": indicators[i]}
+            key_findings = []
+            for section, field, missing, messages, unit, finding in _SECTIONS:
+                status = statuses[section][i]
+                if status == "unknown":
+                    analysis = {"status": status, "message": missing}
+                else:
+                    reference = indicators[i][field]
+                    analysis = {
+                        "status": status,
+                        "message": messages[status].format(raw[field][i]),
+                        "value": raw[field][i],
+                        "reference_range": f"{reference['reference_range']} {unit}",
+                        "is_abnormal": reference["is_abnormal"]
+                    }
+                analysis_results[section] = analysis
+                if status != "normal":
+                    key_findings.append(f"{finding}: {analysis['message']}")
+
+            itp_assessment = {
+                "plt_status": str(plt_status[i]),
+                "bleeding_risk": str(bleeding_risk[i]),
+                "treatment_response": "待评估"
+            }
+            outcomes.append({"result": {
+                "patient_id": patient_ids[i] if patient_ids[i] is not None else default_patient_id,
+                "analysis_date": analysis_date.isoformat(),
+                "overall_status": str(overall[i]),
+                "key_findings": key_findings,
+                "itp_assessment": itp_assessment,
+                "recommendations": self._recommend(str(overall[i]), itp_assessment),
+                "detailed_analysis": analysis_results
+            }})
+        return outcomes
+
+    @staticmethod
+    def _grade(field: str, present: np.ndarray, values: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """按列分级，阈值与逐条分析的 _analyze_* 相同"""
+        below = values < low
+        if field == "plt":
+            conditions = [~present, below & (values < 50), below & (values < 100), below, values > high]
+            choices = ["unknown", "severe", "moderate", "mild", "high"]
+        elif field == "hgb":
+            conditions = [~present, below & (values < 80), below & (values < 110), below, values > high]
+            choices = ["unknown", "severe", "moderate", "mild", "high"]
+        else:
+            conditions = [~present, below, values > high]
+            choices = ["unknown", "low", "high"]
+        return np.select(conditions, choices, "normal").astype(object)
+
+    def _recommend(self, overall_status: str, itp_assessment: Dict[str, str]) -> List[str]:
+        """建议只取决于整体状态和ITP评估，每种组合生成一次"""
+        key = (overall_status, itp_assessment["plt_status"], itp_assessment["bleeding_risk"])
+        recommendations = self._recommendations.get(key)
+        if recommendations is None:
+            recommendations = self.service._generate_recommendations(overall_status, itp_assessment, {})
+            self._recommendations[key] = recommendations
+        return list(recommendations)
@@ -0,0 +1,80 @@
+"""
+上传图片解码路径基准测试
+对比原来的"写盘后 cv2.imread 全分辨率读回"与"直接在内存中 cv2.imdecode 并按目标分辨率缩小解码"的耗时。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_image_decode.py --images 10
+    python benchmarks/bench_image_decode.py --image 某张手机拍摄的报告.jpg
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_pages import TARGET_LONG_SIDE, decode_image
+
+
+def make_photo(width: int, height: int) -> bytes:
+    """生成一张模拟手机拍摄的报告照片（JPEG）"""
+    image = np.full((height, width, 3), 235, np.uint8)
+    for row in range(40, height - 40, max(height // 60, 20)):
+        cv2.putText(image, f"WBC 5.{row % 10} 10^9/L 3.5-9.5", (width // 10, row),
+                    cv2.FONT_HERSHEY_SIMPLEX, height / 1500, (20, 20, 20), max(height // 1000, 1))
+    noise = np.random.default_rng(0).normal(0, 6, image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def measure(label: str, func, samples):
+    latencies = []
+    shape = None
+    for data in samples:
+        started = time.perf_counter()
+        shape = func(data).shape
+        latencies.append(time.perf_counter() - started)
+    print(f"[{label}] 中位数 {statistics.median(latencies) * 1000:.1f}ms，"
+          f"最大 {max(latencies) * 1000:.1f}ms，解码尺寸 {shape[1]}x{shape[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传图片解码路径基准测试")
+    parser.add_argument("--images", type=int, default=10, help="每种尺寸的模拟照片数量")
+    parser.add_argument("--image", help="使用指定的图片代替模拟照片")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            groups = {os.path.basename(args.image): [f.read()] * args.images}
+    else:
+        groups = {f"{w}x{h}": [make_photo(w, h)] * args.images
+                  for w, h in ((1600, 1200), (4032, 3024), (8000, 6000))}
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        def write_then_imread(data: bytes) -> np.ndarray:
+            path = os.path.join(tmp_dir, "upload.jpg")
+            with open(path, 'wb') as f:
+                f.write(data)
+            return cv2.imread(path)
+
+        print(f"目标长边 {TARGET_LONG_SIDE} 像素")
+        for name, samples in groups.items():
+            print(f"== {name}（{len(samples[0]) / 1024:.0f} KB）")
+            measure("写盘 + imread", write_then_imread, samples)
+            measure("内存 imdecode（缩小解码）", decode_image, samples)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+OCR文本行解析基准测试
+生成大量模拟OCR文本，对比旧的多正则 + 别名双向子串扫描与别名前缀树正则单次匹配的解析速度，
+并列出两者结果不一致的行（旧实现的误匹配，如 MCHC 被识别为 MCH）。
+
+计时只包含从文本行中匹配出指标名、数值和单位这一步；两种实现共用的参考范围判定
+（_create_blood_test_item）单独计时，不计入加速比。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_line_parser.py --lines 200000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blood_test_service import BloodTestOCRService
+from indicators import BLOOD_INDICATORS, REFERENCE_RANGES
+
+# 噪声行：表头、患者信息、页脚等不含指标的内容
+NOISE_LINES = [
+    "姓名: 张三 性别: 男 年龄: 35岁",
+    "科室: 血液科 床号: 12 标本: 全血",
+    "检验项目 结果 单位 参考范围",
+    "送检日期 2025-03-01 报告日期 2025-03-02",
+    "检验者: 李四 审核者: 王五",
+    "本结果仅对该标本负责",
+    "HbsAg 阴性",
+    "-----------------------------",
+]
+
+
+def _legacy_normalize(name: str) -> Optional[str]:
+    """旧实现：对所有指标和别名做双向子串比较"""
+    name = name.strip()
+    for standard_name, aliases in BLOOD_INDICATORS.items():
+        if name == standard_name:
+            return standard_name
+        for alias in aliases:
+            if alias.lower() in name.lower() or name.lower() in alias.lower():
+                return standard_name
+    return None
+
+
+def legacy_match_line(line: str):
+    """旧实现：每行依次尝试三个未预编译的正则，返回 (指标名, 数值, 单位)"""
+    patterns = [
+        r'([^\d\s]+)\s*([\d\.]+)\s*([^\d\s]+)\s*([\d\.]+-[ \d\.]+)',
+        r'([^\d\s]+)\s*([\d\.]+)\s*([^\d\s]+)',
+        r'([^\d\s]+)\s*([\d\.]+)'
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, line)
+        if match:
+            normalized_name = _legacy_normalize(match.group(1).strip())
+            if not normalized_name:
+                continue
+            unit = match.group(3).strip() if len(match.groups()) > 2 else ""
+            try:
+                return normalized_name, float(match.group(2)), unit
+            except ValueError:
+                continue
+    return None
+
+
+def make_corpus(lines: int, seed: int = 0):
+    """生成模拟OCR文本行：指标行使用随机别名、随机分隔符和单位，并混入噪声行"""
+    rng = random.Random(seed)
+    names = list(BLOOD_INDICATORS.items())
+    corpus = []
+    for _ in range(lines):
+        if rng.random() < 0.3:
+            corpus.append(rng.choice(NOISE_LINES))
+            continue
+        standard_name, aliases = rng.choice(names)
+        low, high, unit = REFERENCE_RANGES[standard_name]
+        label = rng.choice([standard_name, *aliases])
+        if rng.random() < 0.3:
+            label = f"{rng.choice(aliases)}({standard_name})"
+        value = round(rng.uniform(low * 0.5, high * 1.5 + 0.1), 2)
+        flag = rng.choice(["", "", "↑", "↓"])
+        separator = rng.choice([" ", "  ", ": ", "\t"])
+        corpus.append(f"{label}{separator}{value} {flag} {unit} {low}-{high}".replace("  ", " "))
+    return corpus
+
+
+def _time(fn, corpus):
+    started = time.perf_counter()
+    results = [fn(line) for line in corpus]
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR文本行解析基准测试")
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.lines, args.seed)
+    service = BloodTestOCRService()
+
+    legacy_time, legacy_results = _time(legacy_match_line, corpus)
+    current_time, current_results = _time(service._match_line, corpus)
+    parse_time, _ = _time(service._parse_line, corpus)
+
+    print(f"{args.lines} 行模拟OCR文本（只计匹配指标名、数值和单位）")
+    print(f"  旧实现（多正则 + 别名扫描）: {legacy_time:.3f}s ({args.lines / legacy_time:,.0f} 行/秒)")
+    print(f"  别名前缀树正则单次匹配:     {current_time:.3f}s ({args.lines / current_time:,.0f} 行/秒)")
+    print(f"  加速 {legacy_time / current_time:.1f}x")
+    print(f"  _parse_line 含逐行参考范围判定: {parse_time:.3f}s ({args.lines / parse_time:,.0f} 行/秒)")
+
+    differences = Counter()
+    for old, new in zip(legacy_results, current_results):
+        old = old[:2] if old else None
+        new = new[:2] if new else None
+        if old != new:
+            differences[(old[0] if old else None, new[0] if new else None)] += 1
+    if differences:
+        print("  结果不一致的行（旧 -> 新）:")
+        for (old, new), count in differences.most_common():
+            print(f"    {old} -> {new}: {count}")
+    else:
+        print("  两种实现结果完全一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+OCR引擎单张图像延迟基准测试
+对比 pytesseract（每次启动 tesseract 进程）与 tesserocr 常驻引擎池识别同一批模拟报告区域的耗时。
+未安装的引擎会被跳过。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_ocr_backends.py --images 20
+    python benchmarks/bench_ocr_backends.py --image 某张报告.png
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blood_test_service import BloodTestOCRService
+from ocr_backends import create_ocr_backend, tesserocr
+
+
+def make_region_image(index: int) -> np.ndarray:
+    """生成一块白底黑字的模拟结果区域（英文缩写，便于在只有 eng 模型的环境中运行）"""
+    rows = [
+        f"WBC {4.0 + index % 5:.1f} 10^9/L 3.5-9.5",
+        f"RBC {4.2 + index % 3 * 0.3:.2f} 10^12/L 3.8-5.8",
+        f"HGB {120 + index % 30} g/L 115-175",
+        f"PLT {60 + index * 7 % 200} 10^9/L 125-350",
+    ]
+    image = np.full((40 * len(rows) + 20, 640), 255, np.uint8)
+    for i, row in enumerate(rows):
+        cv2.putText(image, row, (10, 40 + i * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+    return image
+
+
+def run(name: str, lang: str, images, psm: int):
+    started = time.perf_counter()
+    backend = create_ocr_backend(lang, name=name)
+    setup = time.perf_counter() - started
+    if backend.name != name:
+        print(f"[{name}] 不可用，跳过")
+        return
+
+    # 第一次调用单独计时（冷启动）
+    latencies = []
+    try:
+        for image in images:
+            started = time.perf_counter()
+            backend.image_to_string(image, psm)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        backend.close()
+
+    cold, warm = latencies[0], latencies[1:] or latencies
+    warm_sorted = sorted(warm)
+    p95 = warm_sorted[min(len(warm_sorted) - 1, int(len(warm_sorted) * 0.95))]
+    print(f"[{name}] 初始化 {setup * 1000:.0f}ms，首张 {cold * 1000:.0f}ms，"
+          f"之后每张 中位数 {statistics.median(warm) * 1000:.0f}ms / "
+          f"p95 {p95 * 1000:.0f}ms（{len(images)} 张）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR引擎单张图像延迟基准测试")
+    parser.add_argument("--images", type=int, default=20, help="模拟图像数量")
+    parser.add_argument("--image", help="使用指定的报告图片（先经过预处理）代替模拟图像")
+    parser.add_argument("--lang", default=BloodTestOCRService.ocr_lang)
+    parser.add_argument("--psm", type=int, default=BloodTestOCRService.region_psm)
+    args = parser.parse_args()
+
+    if args.image:
+        processed = BloodTestOCRService().preprocess_image(args.image)
+        images = [processed] * args.images
+    else:
+        images = [make_region_image(i) for i in range(args.images)]
+
+    if tesserocr is None:
+        print("未安装 tesserocr（pip install tesserocr），只测试 pytesseract")
+    for name in ("pytesseract", "tesserocr"):
+        try:
+            run(name, args.lang, images, args.psm)
+        except Exception as e:
+            print(f"[{name}] 识别失败: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
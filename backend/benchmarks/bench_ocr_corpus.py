@@ -0,0 +1,463 @@
+"""
+OCR识别准确率与延迟基准测试（带回归比较）
+语料由两部分组成：data/images 中已标注的示例报告（标注见 corpus_labels.json，按图片SHA-256对应），
+以及按已知数值渲染、再加上噪声/模糊/倾斜/阴影/缩小/JPEG压缩的模拟报告。
+统计解码、预处理、版面分析、OCR、解析各阶段耗时，不同工作进程数下的吞吐量，
+以及每个指标的精确率和召回率，结果保存为JSON；指定 --compare 时与上一次结果比较，退化超过阈值时返回非零退出码。
+全部在本地CPU上运行，不需要网络。
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_ocr_corpus.py --synthetic 24 --workers 1,2,4 --output bench_ocr.json
+    python benchmarks/bench_ocr_corpus.py --compare bench_ocr.json --output bench_ocr_new.json
+    python benchmarks/bench_ocr_corpus.py --font /usr/share/fonts/noto/NotoSansCJK-Regular.ttc  # 用中文指标名渲染
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blood_test_service import BloodTestOCRService
+from indicators import BLOOD_INDICATORS, REFERENCE_RANGES
+from report_pages import decode_image
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+VARIANTS = ('clean', 'noise', 'blur', 'skew', 'shadow', 'small', 'jpeg')
+
+# 干扰行：不属于标准指标的项目，用来统计误识别
+DISTRACTOR_ROWS = [
+    ("RDW-CV", "12.6", "%", "10.9-15.4"),
+    ("MPV", "11.3", "fL", "6-11.5"),
+    ("PCT", "0.30", "%", "0.1-0.5"),
+    ("P-LCR", "33.9", "%", "19.7-42.4"),
+]
+
+STAGES = ('decode', 'preprocess', 'layout', 'ocr', 'parse', 'total')
+
+# 工作进程中的OCR服务
+_worker_service = None
+
+
+# ---------------------------------------------------------------- 语料
+
+def _decimals(high: float) -> int:
+    """按参考上限决定数值的小数位数"""
+    return 0 if high >= 100 else 1 if high >= 10 else 2
+
+
+def _sample_values(rng: random.Random) -> Dict[str, float]:
+    """随机抽取 8-13 个指标，数值在参考范围附近（约两成偏高或偏低）"""
+    names = rng.sample(list(BLOOD_INDICATORS), rng.randint(8, len(BLOOD_INDICATORS)))
+    values = {}
+    for name in names:
+        low, high, _ = REFERENCE_RANGES[name]
+        span = high - low
+        value = rng.uniform(low - span * 0.4, high + span * 0.4)
+        values[name] = round(max(value, 0.0), _decimals(high))
+    return values
+
+
+def _draw_text(image: np.ndarray, text: str, x: int, y: int, font) -> np.ndarray:
+    """在图像上写一段文字；font 为PIL字体时支持中文，否则使用OpenCV内置字体"""
+    if font is None:
+        cv2.putText(image, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (20, 20, 20), 2, cv2.LINE_AA)
+        return image
+    from PIL import Image, ImageDraw
+    canvas = Image.fromarray(image)
+    ImageDraw.Draw(canvas).text((x, y - font.size), text, font=font, fill=(20, 20, 20))
+    return np.asarray(canvas).copy()
+
+
+def render_report(values: Dict[str, float], rng: random.Random, font=None) -> np.ndarray:
+    """渲染一张三线表样式的模拟检验单（白底BGR图像）"""
+    rows = []
+    for name, value in values.items():
+        low, high, unit = REFERENCE_RANGES[name]
+        label = name if font is not None else BLOOD_INDICATORS[name][0]
+        digits = _decimals(high)
+        rows.append((label, f"{value:.{digits}f}", unit, f"{low:g}-{high:g}"))
+    for row in rng.sample(DISTRACTOR_ROWS, rng.randint(0, len(DISTRACTOR_ROWS))):
+        rows.insert(rng.randint(0, len(rows)), row)
+
+    line_height = 52
+    top = 230
+    height = top + line_height * (len(rows) + 1) + 200
+    width = 1400
+    image = np.full((height, width, 3), 255, np.uint8)
+
+    image = _draw_text(image, "CBC Laboratory Report", 420, 70, font)
+    image = _draw_text(image, f"Name: P{rng.randint(100, 999)}   Age: {rng.randint(18, 80)}   "
+                              f"Sample: {rng.randint(1000, 9999)}", 60, 140, font)
+    cv2.line(image, (40, top - 50), (width - 40, top - 50), (0, 0, 0), 3)
+    for x, title in zip((60, 420, 700, 960), ("Item", "Result", "Unit", "Range")):
+        image = _draw_text(image, title, x, top - 12, font)
+    cv2.line(image, (40, top + 4), (width - 40, top + 4), (0, 0, 0), 2)
+    for i, row in enumerate(rows):
+        y = top + line_height * (i + 1)
+        for x, text in zip((60, 420, 700, 960), row):
+            image = _draw_text(image, text, x, y, font)
+    bottom = top + line_height * (len(rows) + 1) - 20
+    cv2.line(image, (40, bottom), (width - 40, bottom), (0, 0, 0), 3)
+    image = _draw_text(image, "Report time: 2025-08-23 09:56", 60, bottom + 70, font)
+    return image
+
+
+def degrade(image: np.ndarray, variant: str, rng: random.Random) -> bytes:
+    """按变体加入拍摄或传输中的质量退化，返回编码后的文件内容"""
+    if variant == 'noise':
+        noise = np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, 14, image.shape)
+        image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    elif variant == 'blur':
+        image = cv2.GaussianBlur(image, (5, 5), 0)
+    elif variant == 'skew':
+        height, width = image.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-3, 3), 1.0)
+        image = cv2.warpAffine(image, matrix, (width, height), borderValue=(255, 255, 255))
+    elif variant == 'shadow':
+        gradient = np.linspace(0.5, 1.0, image.shape[1], dtype=np.float32)[None, :, None]
+        image = (image * gradient).astype(np.uint8)
+    elif variant == 'small':
+        image = cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+
+    if variant == 'jpeg':
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 35])
+    else:
+        ok, buffer = cv2.imencode('.png', image)
+    return buffer.tobytes()
+
+
+def load_sample_corpus(images_dir: str, labels_file: str) -> List[Dict]:
+    """读取 data/images 中的示例报告，相同内容只取一份；没有标注的图片只参与计时"""
+    labels = {}
+    if os.path.exists(labels_file):
+        with open(labels_file, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+
+    corpus, seen = [], set()
+    for path in sorted(glob.glob(os.path.join(images_dir, '*'))):
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        label = labels.get(digest)
+        corpus.append({
+            'name': os.path.basename(path),
+            'kind': 'sample',
+            'variant': 'original',
+            'sha256': digest,
+            'data': data,
+            'truth': label['items'] if label else None
+        })
+    return corpus
+
+
+def build_synthetic_corpus(count: int, seed: int, font=None) -> List[Dict]:
+    """生成 count 张模拟报告，退化变体轮流使用"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        variant = VARIANTS[i % len(VARIANTS)]
+        values = _sample_values(rng)
+        data = degrade(render_report(values, rng, font), variant, rng)
+        corpus.append({
+            'name': f"synthetic_{i:03d}",
+            'kind': 'synthetic',
+            'variant': variant,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'data': data,
+            'truth': values
+        })
+    return corpus
+
+
+# ---------------------------------------------------------------- 评测
+
+def _matches(predicted: float, truth: float) -> bool:
+    return abs(predicted - truth) <= max(1e-6, abs(truth) * 1e-3)
+
+
+def score(items: List, truth: Dict[str, float], counts: Dict[str, Dict[str, int]]):
+    """
+    累加一张图片的识别结果
+
+    同名指标取第一次出现的值；数值正确记为TP，数值错误同时记FP和FN，
+    多出的指标（包括重复识别）记FP，漏识别记FN。
+    """
+    seen = set()
+    for item in items:
+        entry = counts.setdefault(item.name, {'tp': 0, 'fp': 0, 'fn': 0})
+        if item.name in seen or item.name not in truth:
+            entry['fp'] += 1
+        elif _matches(item.value, truth[item.name]):
+            entry['tp'] += 1
+        else:
+            entry['fp'] += 1
+            entry['fn'] += 1
+        seen.add(item.name)
+    for name in truth:
+        if name not in seen:
+            counts.setdefault(name, {'tp': 0, 'fp': 0, 'fn': 0})['fn'] += 1
+
+
+def _ratios(entry: Dict[str, int]) -> Dict[str, Optional[float]]:
+    tp, fp, fn = entry['tp'], entry['fp'], entry['fn']
+    return dict(
+        entry,
+        precision=round(tp / (tp + fp), 4) if tp + fp else None,
+        recall=round(tp / (tp + fn), 4) if tp + fn else None
+    )
+
+
+def _summary(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'mean': None, 'p50': None, 'p95': None}
+    ordered = sorted(values)
+    return {
+        'mean': round(statistics.mean(ordered), 4),
+        'p50': round(statistics.median(ordered), 4),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4)
+    }
+
+
+def run_accuracy(service: BloodTestOCRService, corpus: List[Dict]) -> Dict:
+    """逐张识别，统计各阶段耗时和每个指标的精确率/召回率"""
+    stages = {stage: [] for stage in STAGES}
+    counts: Dict[str, Dict[str, int]] = {}
+    images = []
+
+    for entry in corpus:
+        record = {key: entry[key] for key in ('name', 'kind', 'variant', 'sha256')}
+        started = time.perf_counter()
+        try:
+            image = decode_image(entry['data'])
+            decoded = time.perf_counter()
+            text, items, info = service.recognize(entry['name'], image=image)
+            finished = time.perf_counter()
+
+            parse_started = time.perf_counter()
+            service.parse_blood_test_data(text)
+            parse_seconds = time.perf_counter() - parse_started
+        except Exception as e:
+            record['error'] = str(e)
+            if entry['truth'] is not None:
+                score([], entry['truth'], counts)
+            images.append(record)
+            print(f"❌ {entry['name']}: {str(e)}")
+            continue
+
+        attempts = info['attempts']
+        timing = {
+            'decode': decoded - started,
+            'preprocess': sum(a.get('preprocess_seconds', 0) for a in attempts),
+            'layout': sum(a.get('layout_seconds', 0) for a in attempts),
+            'ocr': sum(a.get('ocr_seconds', 0) for a in attempts),
+            'parse': parse_seconds * len(attempts),  # 每次尝试都解析一次
+            'total': finished - started
+        }
+        for stage, seconds in timing.items():
+            stages[stage].append(seconds)
+
+        record.update(
+            strategy=info['strategy'],
+            confidence=info['confidence'],
+            attempts=len(attempts),
+            items=len(items),
+            seconds={stage: round(seconds, 4) for stage, seconds in timing.items()}
+        )
+        if entry['truth'] is not None:
+            image_counts: Dict[str, Dict[str, int]] = {}
+            score(items, entry['truth'], image_counts)
+            for name, entry_counts in image_counts.items():
+                total = counts.setdefault(name, {'tp': 0, 'fp': 0, 'fn': 0})
+                for key in total:
+                    total[key] += entry_counts[key]
+            record['correct'] = sum(c['tp'] for c in image_counts.values())
+            record['expected'] = len(entry['truth'])
+        images.append(record)
+        print(f"✅ {entry['name']} [{entry['variant']}] {record['items']}项 "
+              f"{record.get('correct', '-')}/{record.get('expected', '-')} 正确，"
+              f"策略 {info['strategy']}，{timing['total'] * 1000:.0f}ms")
+
+    micro = {key: sum(c[key] for c in counts.values()) for key in ('tp', 'fp', 'fn')}
+    return {
+        'stages': {stage: _summary(values) for stage, values in stages.items()},
+        'accuracy': {
+            'micro': _ratios(micro),
+            'per_indicator': {name: _ratios(counts[name]) for name in sorted(counts)}
+        },
+        'errors': sum(1 for record in images if 'error' in record),
+        'images': images
+    }
+
+
+def _init_worker():
+    global _worker_service
+    _worker_service = BloodTestOCRService()
+    _worker_service.ocr_backend
+
+
+def _recognize_bytes(data: bytes) -> int:
+    """工作进程中识别一张图片，返回识别出的指标数（失败时为-1）"""
+    try:
+        return len(_worker_service.recognize('', image=decode_image(data))[1])
+    except Exception:
+        return -1
+
+
+def run_throughput(corpus: List[Dict], worker_counts: List[int]) -> List[Dict]:
+    """在不同工作进程数下识别整个语料，统计每秒图片数（进程启动和引擎加载不计入）"""
+    payloads = [entry['data'] for entry in corpus]
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            # 预热：每个进程完成初始化
+            list(executor.map(_recognize_bytes, payloads[:workers]))
+            started = time.perf_counter()
+            outcomes = list(executor.map(_recognize_bytes, payloads))
+            seconds = time.perf_counter() - started
+        results.append({
+            'workers': workers,
+            'images': len(payloads),
+            'failed': sum(1 for outcome in outcomes if outcome < 0),
+            'seconds': round(seconds, 4),
+            'images_per_sec': round(len(payloads) / seconds, 3) if seconds else None
+        })
+        print(f"⚡ {workers} 个进程：{results[-1]['images_per_sec']} 张/秒")
+    return results
+
+
+# ---------------------------------------------------------------- 回归比较
+
+def compare(baseline: Dict, current: Dict, max_recall_drop: float, max_slowdown: float) -> List[str]:
+    """与基线结果比较，返回退化项说明"""
+    problems = []
+
+    old_micro, new_micro = baseline['accuracy']['micro'], current['accuracy']['micro']
+    for metric in ('precision', 'recall'):
+        old, new = old_micro.get(metric), new_micro.get(metric)
+        print(f"  {metric}: {old} -> {new}")
+        if old is not None and (new is None or old - new > max_recall_drop):
+            problems.append(f"总体{metric}下降 {old} -> {new}")
+
+    for name, old_entry in baseline['accuracy']['per_indicator'].items():
+        new_entry = current['accuracy']['per_indicator'].get(name, {})
+        old, new = old_entry.get('recall'), new_entry.get('recall')
+        if old is not None and (new is None or old - new > max_recall_drop):
+            problems.append(f"{name} 召回率下降 {old} -> {new}")
+
+    for stage in STAGES:
+        old, new = baseline['stages'][stage]['p50'], current['stages'][stage]['p50']
+        print(f"  {stage} p50: {old} -> {new}")
+        if old and new and stage in ('total', 'ocr') and new > old * max_slowdown:
+            problems.append(f"{stage} 中位耗时 {old}s -> {new}s")
+
+    old_throughput = {r['workers']: r['images_per_sec'] for r in baseline.get('throughput', [])}
+    for record in current.get('throughput', []):
+        old = old_throughput.get(record['workers'])
+        new = record['images_per_sec']
+        if old and new:
+            print(f"  {record['workers']} 进程吞吐量: {old} -> {new} 张/秒")
+            if new < old / max_slowdown:
+                problems.append(f"{record['workers']} 进程吞吐量 {old} -> {new} 张/秒")
+    return problems
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR识别准确率与延迟基准测试")
+    parser.add_argument("--synthetic", type=int, default=21, help="模拟报告数量")
+    parser.add_argument("--seed", type=int, default=20250823, help="模拟语料的随机种子")
+    parser.add_argument("--images-dir", default=os.path.join(BACKEND_DIR, "data", "images"))
+    parser.add_argument("--labels", default=os.path.join(BENCH_DIR, "corpus_labels.json"))
+    parser.add_argument("--no-samples", action="store_true", help="只使用模拟语料")
+    parser.add_argument("--font", help="TrueType字体（需支持中文），指定时用中文指标名渲染模拟报告")
+    parser.add_argument("--workers", default="1,2,4", help="吞吐量测试的工作进程数，逗号分隔；为空时跳过")
+    parser.add_argument("--output", default="bench_ocr_corpus.json", help="结果JSON文件")
+    parser.add_argument("--compare", help="用于回归比较的基线结果JSON")
+    parser.add_argument("--max-recall-drop", type=float, default=0.01)
+    parser.add_argument("--max-slowdown", type=float, default=1.2)
+    args = parser.parse_args()
+
+    font = None
+    if args.font:
+        from PIL import ImageFont
+        font = ImageFont.truetype(args.font, 30)
+
+    corpus = build_synthetic_corpus(args.synthetic, args.seed, font)
+    if not args.no_samples:
+        corpus = load_sample_corpus(args.images_dir, args.labels) + corpus
+    print(f"语料 {len(corpus)} 张（已标注 {sum(1 for e in corpus if e['truth'] is not None)} 张）")
+
+    service = BloodTestOCRService()
+    result = {
+        'meta': {
+            'created_at': datetime.now().isoformat(),
+            'commit': _git_commit(),
+            'pipeline': service.pipeline_fingerprint(),
+            'backend': service.ocr_backend.name,
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'synthetic': args.synthetic,
+            'font': bool(font)
+        },
+        'corpus': [{key: entry[key] for key in ('name', 'kind', 'variant', 'sha256')} for entry in corpus]
+    }
+    result.update(run_accuracy(service, corpus))
+
+    worker_counts = [int(n) for n in args.workers.split(',') if n.strip()]
+    result['throughput'] = run_throughput(corpus, worker_counts) if worker_counts else []
+
+    micro = result['accuracy']['micro']
+    print(f"总体精确率 {micro['precision']}，召回率 {micro['recall']}，"
+          f"单张中位耗时 {result['stages']['total']['p50']}s，失败 {result['errors']} 张")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"与基线 {args.compare}（{baseline['meta'].get('commit')}）比较:")
+        problems = compare(baseline, result, args.max_recall_drop, args.max_slowdown)
+        for problem in problems:
+            print(f"⚠️ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ 未发现退化")
+
+
+if __name__ == "__main__":
+    main()
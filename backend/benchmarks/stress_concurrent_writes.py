@@ -0,0 +1,144 @@
+"""
+多进程并发写入压力测试
+模拟 uvicorn --workers N：多个进程各自创建存储服务，并发保存和删除报告，
+同时有读取进程持续读取，结束后校验没有报告丢失、统计信息没有偏差。
+
+用法（在 backend 目录下）:
+    python benchmarks/stress_concurrent_writes.py --workers 8 --ops 50
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import BloodTestItem, BloodTestReport
+from storage_service import BloodTestStorageService
+
+
+def _make_report(report_id: str, index: int) -> BloodTestReport:
+    return BloodTestReport(
+        id=report_id,
+        patient_name=f"患者{index % 7}",
+        test_date=datetime(2025, 1, 1) + timedelta(days=index % 90),
+        hospital=f"医院{index % 3}",
+        items=[
+            BloodTestItem(name='血小板', value=20 + index % 200, unit='10^9/L',
+                          reference_range='125-350', status='偏低', is_abnormal=index % 2 == 0),
+            BloodTestItem(name='白细胞', value=5.0, unit='10^9/L',
+                          reference_range='3.5-9.5', status='正常', is_abnormal=False)
+        ],
+        notes=f"压力测试 {report_id}"
+    )
+
+
+def _writer(args):
+    data_dir, engine, worker_id, ops = args
+    service = BloodTestStorageService(data_dir, engine=engine)
+    saved, deleted = [], []
+    for i in range(ops):
+        report_id = f"w{worker_id}-{i}"
+        service.save_report(_make_report(report_id, worker_id * ops + i))
+        saved.append(report_id)
+        # 每三次写入删除一条本进程之前写入的报告
+        if i % 3 == 2:
+            victim = saved[i - 2]
+            if not service.delete_report(victim):
+                raise RuntimeError(f"删除失败: {victim}")
+            deleted.append(victim)
+    return saved, deleted
+
+
+def _reader(data_dir, engine, stop_event, error_queue):
+    service = BloodTestStorageService(data_dir, engine=engine)
+    reads = 0
+    while not stop_event.is_set():
+        try:
+            service.get_all_reports()
+            service.get_statistics()
+            reads += 1
+        except Exception as e:
+            error_queue.put(f"读取失败: {e!r}")
+    error_queue.put(reads)
+
+
+def run(engine: str, workers: int, ops: int) -> bool:
+    data_dir = tempfile.mkdtemp(prefix=f"stress_{engine}_")
+    try:
+        # 初始化数据目录（含迁移等一次性操作）
+        BloodTestStorageService(data_dir, engine=engine)
+
+        ctx = multiprocessing.get_context("spawn")
+        stop_event = ctx.Event()
+        error_queue = ctx.Queue()
+        reader = ctx.Process(target=_reader, args=(data_dir, engine, stop_event, error_queue))
+        reader.start()
+
+        started = time.perf_counter()
+        with ctx.Pool(workers) as pool:
+            results = pool.map(_writer, [(data_dir, engine, w, ops) for w in range(workers)])
+        elapsed = time.perf_counter() - started
+
+        stop_event.set()
+        reader.join()
+        errors, reads = [], 0
+        while not error_queue.empty():
+            message = error_queue.get()
+            if isinstance(message, int):
+                reads = message
+            else:
+                errors.append(message)
+
+        expected = set()
+        for saved, deleted in results:
+            expected.update(saved)
+            expected.difference_update(deleted)
+
+        service = BloodTestStorageService(data_dir, engine=engine)
+        actual = {report.id for report in service.get_all_reports()}
+        drift = service.check_statistics()
+
+        total_ops = sum(len(saved) + len(deleted) for saved, deleted in results)
+        print(f"[{engine}] {workers}进程 {total_ops}次写入 用时{elapsed:.2f}s "
+              f"({total_ops / elapsed:.0f} 次/秒)，并发读取{reads}次")
+
+        ok = True
+        if actual != expected:
+            print(f"  ❌ 报告丢失 {len(expected - actual)} 条，多出 {len(actual - expected)} 条")
+            ok = False
+        if drift:
+            print(f"  ❌ 统计信息偏差: {drift}")
+            ok = False
+        if errors:
+            print(f"  ❌ 读取错误 {len(errors)} 次，例如: {errors[0]}")
+            ok = False
+        if ok:
+            print(f"  ✅ {len(actual)} 条报告全部一致")
+        return ok
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程并发写入压力测试")
+    parser.add_argument("--engine", choices=["sqlite", "journal", "json", "all"], default="all")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=50, help="每个进程的写入次数")
+    args = parser.parse_args()
+
+    # 让日志引擎在测试中多次触发压缩
+    os.environ.setdefault("JOURNAL_COMPACT_BYTES", str(64 * 1024))
+
+    engines = ["sqlite", "journal", "json"] if args.engine == "all" else [args.engine]
+    results = [run(engine, args.workers, args.ops) for engine in engines]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
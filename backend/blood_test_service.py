@@ -7,88 +7,307 @@ import cv2
 import pytesseract
 import re
 import json
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Tuple
 from PIL import Image
 import numpy as np
 from models import BloodTestItem, BloodTestReport, OCRResult
+from indicators import BLOOD_INDICATORS, REFERENCE_RANGES
+from alias_matcher import AliasMatcher
+from table_layout import TableRegion, detect_table_regions
+from ocr_backends import OCRBackend, OCRText, create_ocr_backend, resolve_backend_name
+from report_pages import TARGET_LONG_SIDE, load_page
+from timeseries_store import PatientSeries
+from trend_engine import TREND_RELATIVE_THRESHOLD, fit_ragged
+from reference_ranges import STATUS_LABELS, STATUS_NORMAL, get_reference_engine, normalize_sex
+
+# 识别流程版本，修改预处理或解析逻辑时递增，使已缓存的识别结果失效
+OCR_PIPELINE_VERSION = 6
+
+# 历史对比逻辑版本，修改趋势或对比计算时递增，使已物化的对比结果失效
+COMPARISON_VERSION = 3
+
+# 指标名之后的字段：名称与数值之间允许括号、冒号、箭头等非数字字符；
+# 数值后可以有升降箭头或 H/L 标记；单位可以以 10^9 之类的数量级开头；参考范围取数值之后第一个 "a-b" 形式的区间
+_ITEM_FIELDS_PATTERN = (
+    r'[^\d.]*?'
+    r'(?P<value>(?:\d+(?:\.\d+)?|\.\d+)(?:[eE][-+]?\d+)?)'
+    r'(?:\s*(?:[↑↓]|[HL](?![A-Za-z/^])))?'
+    r'(?:\s*(?P<unit>(?:\d+\^\d+)?[^\d\s\-~～]+))?'
+    r'(?:.*?(?P<reference>\d+(?:\.\d+)?\s*[-~～]\s*\d+(?:\.\d+)?))?'
+)
+
+# 报告抬头中的性别和年龄，如 "性  别: 男"、"年 龄: 26岁"、"Sex: F"、"Age: 35"
+_SEX_PATTERN = re.compile(r'(?:性\s*别|(?<![A-Za-z])(?i:sex|gender))\s*[:：]?\s*(男|女|(?i:male|female|m|f)\b)')
+_AGE_PATTERN = re.compile(r'(?:年\s*龄|(?<![A-Za-z])(?i:age))\s*[:：]?\s*(\d{1,3}(?:\.\d+)?)\s*(岁|个月|月|天)?')
+_AGE_UNIT_YEARS = {'个月': 1 / 12, '月': 1 / 12, '天': 1 / 365}
+
+# /api/analyze 请求字段对应的标准指标
+ANALYZE_FIELDS = {
+    'wbc': '白细胞',
+    'rbc': '红细胞',
+    'hgb': '血红蛋白',
+    'hct': '红细胞压积',
+    'mcv': '平均红细胞体积',
+    'mch': '平均红细胞血红蛋白含量',
+    'mchc': '平均红细胞血红蛋白浓度',
+    'plt': '血小板',
+    'neut_count': '中性粒细胞',
+    'lymph_count': '淋巴细胞',
+    'mono_count': '单核细胞',
+    'eos_count': '嗜酸性粒细胞',
+    'baso_count': '嗜碱性粒细胞',
+    'neut_percent': '中性粒细胞百分比',
+    'lymph_percent': '淋巴细胞百分比',
+    'mono_percent': '单核细胞百分比',
+    'eos_percent': '嗜酸性粒细胞百分比',
+    'baso_percent': '嗜碱性粒细胞百分比'
+}
 
 class BloodTestOCRService:
     """血常规OCR识别服务"""
     
+    # OCR语言与预处理参数
+    ocr_lang = 'chi_sim+eng'
+    median_blur_ksize = 3
+    morph_kernel_size = (2, 2)
+    
+    # 预处理策略，按开销从低到高依次尝试；置信度和识别出的指标数达标即停止
+    preprocess_strategies = ('otsu', 'adaptive', 'deskew', 'upscale')
+    min_confidence = 70.0
+    min_items = 5
+    adaptive_block_size = 31
+    adaptive_c = 15
+    upscale_max_side = 2000
+    
+    # 版面分析：只识别结果表格中的文字行，拆成若干区域并行调用OCR
+    detect_layout = True
+    max_layout_regions = 4
+    region_psm = 6
+    
     def __init__(self):
         # 常见血常规指标及其单位
-        self.blood_indicators = {
-            '白细胞': ['WBC', '白细胞计数', '白细胞数'],
-            '红细胞': ['RBC', '红细胞计数', '红细胞数'],
-            '血红蛋白': ['HGB', 'Hb', '血红蛋白', '血色素'],
-            '红细胞压积': ['HCT', '红细胞压积', '红细胞比容'],
-            '平均红细胞体积': ['MCV', '平均红细胞体积'],
-            '平均红细胞血红蛋白含量': ['MCH', '平均红细胞血红蛋白含量'],
-            '平均红细胞血红蛋白浓度': ['MCHC', '平均红细胞血红蛋白浓度'],
-            '血小板': ['PLT', '血小板计数', '血小板数'],
-            '淋巴细胞': ['LYM', '淋巴细胞', '淋巴细胞计数'],
-            '中性粒细胞': ['NEU', '中性粒细胞', '中性粒细胞计数'],
-            '嗜酸性粒细胞': ['EOS', '嗜酸性粒细胞', '嗜酸性粒细胞计数'],
-            '嗜碱性粒细胞': ['BAS', '嗜碱性粒细胞', '嗜碱性粒细胞计数'],
-            '单核细胞': ['MON', '单核细胞', '单核细胞计数']
-        }
+        self.blood_indicators = BLOOD_INDICATORS
         
-        # 参考范围（正常值）
-        self.reference_ranges = {
-            '白细胞': (3.5, 9.5, '10^9/L'),
-            '红细胞': (3.8, 5.8, '10^12/L'),
-            '血红蛋白': (115, 175, 'g/L'),
-            '红细胞压积': (0.35, 0.50, 'L/L'),
-            '平均红细胞体积': (80, 100, 'fL'),
-            '平均红细胞血红蛋白含量': (27, 34, 'pg'),
-            '平均红细胞血红蛋白浓度': (320, 360, 'g/L'),
-            '血小板': (125, 350, '10^9/L'),
-            '淋巴细胞': (1.1, 3.2, '10^9/L'),
-            '中性粒细胞': (1.8, 6.3, '10^9/L'),
-            '嗜酸性粒细胞': (0.02, 0.52, '10^9/L'),
-            '嗜碱性粒细胞': (0.00, 0.06, '10^9/L'),
-            '单核细胞': (0.10, 0.60, '10^9/L')
-        }
-
-    def preprocess_image(self, image_path: str) -> np.ndarray:
-        """图像预处理"""
-        # 读取图像
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError("无法读取图像文件")
+        # 参考范围（正常值）；判定使用按性别、年龄区分的参考范围引擎
+        self.reference_ranges = REFERENCE_RANGES
+        self.reference_engine = get_reference_engine()
         
+        # 指标名称及别名的匹配器；与字段模式合并成一个正则，每行只扫描一次
+        self._alias_matcher = AliasMatcher(self.blood_indicators)
+        self._line_pattern = re.compile(
+            f'(?P<name>(?i:{self._alias_matcher.pattern})){_ITEM_FIELDS_PATTERN}'
+        )
+        
+        # OCR引擎在首次识别时创建（API进程只做解析，不需要加载语言模型）
+        self._ocr_backend: Optional[OCRBackend] = None
+
+    @property
+    def ocr_backend(self) -> OCRBackend:
+        """OCR引擎（tesserocr 常驻引擎池或 pytesseract）"""
+        if self._ocr_backend is None:
+            self._ocr_backend = create_ocr_backend(self.ocr_lang)
+        return self._ocr_backend
+
+    def preprocess_image(self, image_path: str, page: int = 0, strategy: str = 'otsu') -> np.ndarray:
+        """图像预处理（多页TIFF/PDF读取指定页）"""
+        return self.preprocess_array(load_page(image_path, page), strategy)
+
+    def preprocess_array(self, image: np.ndarray, strategy: str = 'otsu') -> np.ndarray:
+        """
+        按指定策略预处理已读取的BGR图像
+
+        otsu: 中值滤波 + Otsu全局阈值 + 闭运算，适合清晰的截图
+        adaptive: 局部自适应阈值，适合光照不均的照片
+        deskew: 自适应阈值后按文字整体倾角旋转校正
+        upscale: 小图放大两倍后自适应阈值，适合字号过小的图片
+        """
         # 转换为灰度图
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
-        # 去噪
-        denoised = cv2.medianBlur(gray, 3)
-        
-        # 二值化
-        _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # 形态学操作
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-        processed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+        if strategy == 'otsu':
+            # 去噪
+            denoised = cv2.medianBlur(gray, self.median_blur_ksize)
+            
+            # 二值化
+            _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            
+            # 形态学操作
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, self.morph_kernel_size)
+            return cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+        
+        if strategy == 'upscale' and max(gray.shape) < self.upscale_max_side:
+            gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+        if strategy in ('adaptive', 'deskew', 'upscale'):
+            denoised = cv2.GaussianBlur(gray, (3, 3), 0)
+            binary = cv2.adaptiveThreshold(
+                denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                self.adaptive_block_size, self.adaptive_c
+            )
+            return self._deskew(binary) if strategy == 'deskew' else binary
         
-        return processed
+        raise ValueError(f"未知的预处理策略: {strategy}")
+
+    def _deskew(self, binary: np.ndarray) -> np.ndarray:
+        """按文字像素最小外接矩形的角度旋转校正，角度过小或过大（不可靠）时不旋转"""
+        coords = cv2.findNonZero(cv2.bitwise_not(binary))
+        if coords is None or len(coords) < 100:
+            return binary
+        angle = cv2.minAreaRect(coords)[-1]
+        if angle > 45:
+            angle -= 90
+        elif angle < -45:
+            angle += 90
+        if abs(angle) < 0.5 or abs(angle) > 15:
+            return binary
+        height, width = binary.shape
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        return cv2.warpAffine(binary, matrix, (width, height), flags=cv2.INTER_NEAREST,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+    def pipeline_fingerprint(self) -> str:
+        """识别流程指纹：流程版本、预处理参数、OCR语言、Tesseract版本和指标配置，任一变化时识别结果缓存失效"""
+        try:
+            tesseract_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            tesseract_version = "unknown"
+        config = {
+            'version': OCR_PIPELINE_VERSION,
+            'decode_long_side': TARGET_LONG_SIDE,
+            'lang': self.ocr_lang,
+            'median_blur_ksize': self.median_blur_ksize,
+            'morph_kernel_size': list(self.morph_kernel_size),
+            'layout': [self.detect_layout, self.max_layout_regions, self.region_psm],
+            'strategies': list(self.preprocess_strategies),
+            'early_exit': [self.min_confidence, self.min_items],
+            'adaptive': [self.adaptive_block_size, self.adaptive_c, self.upscale_max_side],
+            'tesseract': tesseract_version,
+            'backend': resolve_backend_name(),
+            'indicators': self.blood_indicators,
+            'reference_ranges': self.reference_ranges,
+            'reference_rules': self.reference_engine.fingerprint()
+        }
+        payload = json.dumps(config, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def extract_text(self, image_path: str, progress: Optional[Callable[[str], None]] = None,
+                     page: int = 0) -> str:
+        """提取图像中的文字，progress 用于报告当前阶段（preprocessing/ocr）"""
+        return self.recognize(image_path, progress, page)[0]
 
-    def extract_text(self, image_path: str) -> str:
-        """提取图像中的文字"""
+    def recognize(self, image_path: str, progress: Optional[Callable[[str], None]] = None,
+                  page: int = 0, image: Optional[np.ndarray] = None) -> Tuple[str, List[BloodTestItem], Dict[str, Any]]:
+        """
+        识别图像中的文字并解析检测项目
+
+        image 为已在内存中解码的页面（如上传数据直接解码）时不再从 image_path 读取。
+
+        按 preprocess_strategies 的顺序尝试预处理策略，Tesseract单词平均置信度不低于
+        min_confidence 且识别出至少 min_items 个指标时立即停止；都不达标时采用
+        识别出指标最多（其次置信度最高）的一次结果。
+
+        Returns:
+            (文本, 检测项目, 识别信息：采用的策略、置信度、总耗时和每次尝试的明细)
+        """
         try:
-            # 预处理图像
-            processed_image = self.preprocess_image(image_path)
+            if progress:
+                progress("preprocessing")
+            started = time.perf_counter()
+            if image is None:
+                image = load_page(image_path, page)
             
-            # OCR识别
-            text = pytesseract.image_to_string(processed_image, lang='chi_sim+eng')
+            attempts = []
+            best = None
+            for strategy in self.preprocess_strategies:
+                # 图片已经足够大时 upscale 不放大，结果与 adaptive 相同，不再重复识别
+                if strategy == 'upscale' and max(image.shape[:2]) >= self.upscale_max_side:
+                    continue
+                text, confidence, timings = self._recognize_with(image, strategy, progress)
+                items = self.parse_blood_test_data(text)
+                attempt = dict(strategy=strategy, confidence=round(confidence, 1), items=len(items), **timings)
+                attempts.append(attempt)
+                if best is None or (len(items), confidence) > (len(best[1]), best[2]['confidence']):
+                    best = (text, items, attempt)
+                if confidence >= self.min_confidence and len(items) >= self.min_items:
+                    break
+                # 只在第一次尝试时上报阶段
+                progress = None
             
-            return text
+            text, items, chosen = best
+            info = {
+                "strategy": chosen["strategy"],
+                "confidence": chosen["confidence"],
+                "seconds": round(time.perf_counter() - started, 4),
+                "backend": self.ocr_backend.name,
+                "demographics": self.parse_demographics(text),
+                "attempts": attempts
+            }
+            return text, items, info
         except Exception as e:
             raise Exception(f"OCR识别失败: {str(e)}")
 
-    def parse_blood_test_data(self, text: str) -> List[BloodTestItem]:
-        """解析血常规数据"""
-        items = []
+    def _recognize_with(self, image: np.ndarray, strategy: str,
+                        progress: Optional[Callable[[str], None]] = None) -> Tuple[str, float, Dict[str, Any]]:
+        """
+        用一种预处理策略识别图像
+
+        版面分析找到结果表格时，只把表格中的文字行分区域并行识别；否则识别整幅图像。
+
+        Returns:
+            (文本, 按单词数加权的平均置信度, 各阶段及各区域的耗时)
+        """
+        started = time.perf_counter()
+        processed_image = self.preprocess_array(image, strategy)
+        timings = {"preprocess_seconds": round(time.perf_counter() - started, 4)}
+        
+        # 版面分析
+        regions = []
+        if self.detect_layout:
+            started = time.perf_counter()
+            regions = detect_table_regions(processed_image, self.max_layout_regions)
+            timings["layout_seconds"] = round(time.perf_counter() - started, 4)
+        
+        # OCR识别（先在当前线程创建引擎，再分发给区域线程）
+        if progress:
+            progress("ocr")
+        started = time.perf_counter()
+        self.ocr_backend
+        if regions:
+            with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+                results = list(executor.map(self._recognize_region, regions))
+        else:
+            results = [self._recognize_region(TableRegion(0, int(processed_image.shape[0]), 0, processed_image))]
+        timings["ocr_seconds"] = round(time.perf_counter() - started, 4)
+        timings["regions"] = [timing for _, timing in results]
+        
+        words = sum(result.words for result, _ in results)
+        confidence = sum(result.confidence * result.words for result, _ in results) / words if words else 0.0
+        text = '\n'.join(result.text for result, _ in results)
+        return text, confidence, timings
+
+    def _ocr(self, image: np.ndarray, psm: Optional[int] = None) -> OCRText:
+        """对一幅内存中的图像调用OCR引擎"""
+        return self.ocr_backend.image_to_data(image, psm)
+
+    def _recognize_region(self, region: TableRegion) -> Tuple[OCRText, Dict[str, Any]]:
+        """识别一个区域（rows 为0表示整幅图像），返回识别结果和耗时"""
+        started = time.perf_counter()
+        result = self._ocr(region.image, psm=self.region_psm if region.rows else None)
+        return result, {
+            "top": region.top,
+            "bottom": region.bottom,
+            "rows": region.rows or None,
+            "confidence": round(result.confidence, 1),
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+
+    def parse_blood_test_data(self, text: str, sex: Optional[str] = None,
+                              age: Optional[float] = None) -> List[BloodTestItem]:
+        """解析血常规数据，未指定性别年龄时从报告抬头中识别，整批判定参考范围"""
+        names, values, units = [], [], []
         lines = text.split('\n')
         
         for line in lines:
@@ -97,102 +316,78 @@ class BloodTestOCRService:
                 continue
                 
             # 尝试匹配指标和数值
-            item = self._parse_line(line)
-            if item:
-                items.append(item)
+            fields = self._match_line(line)
+            if fields:
+                names.append(fields[0])
+                values.append(fields[1])
+                units.append(fields[2])
+        
+        if not names:
+            return []
+        if sex is None or age is None:
+            demographics = self.parse_demographics(text)
+            sex = sex or demographics['sex']
+            age = age if age is not None else demographics['age']
+        return self.reference_engine.build_items(names, values, units, sex, age)
+
+    def parse_demographics(self, text: str) -> Dict[str, Any]:
+        """从报告文本中识别性别和年龄（岁），识别不到时为None"""
+        sex_match = _SEX_PATTERN.search(text)
+        age_match = _AGE_PATTERN.search(text)
+        age = None
+        if age_match:
+            age = round(float(age_match.group(1)) * _AGE_UNIT_YEARS.get(age_match.group(2), 1), 2)
+        return {
+            'sex': normalize_sex(sex_match.group(1)) if sex_match else None,
+            'age': age
+        }
+
+    def _match_line(self, line: str) -> Optional[Tuple[str, float, str]]:
+        """一次匹配出单行中的指标名、数值和单位"""
+        match = self._line_pattern.search(line)
+        if match is None:
+            return None
         
-        return items
+        try:
+            value = float(match.group('value'))
+        except ValueError:
+            return None
+        return self._alias_matcher.lookup(match.group('name')), value, match.group('unit') or ""
 
     def _parse_line(self, line: str) -> Optional[BloodTestItem]:
         """解析单行数据"""
-        # 匹配模式：指标名 + 数值 + 单位 + 参考范围
-        patterns = [
-            r'([^\d\s]+)\s*([\d\.]+)\s*([^\d\s]+)\s*([\d\.]+-[ \d\.]+)',
-            r'([^\d\s]+)\s*([\d\.]+)\s*([^\d\s]+)',
-            r'([^\d\s]+)\s*([\d\.]+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, line)
-            if match:
-                indicator_name = match.group(1).strip()
-                value_str = match.group(2)
-                unit = match.group(3).strip() if len(match.groups()) > 2 else ""
-                reference = match.group(4).strip() if len(match.groups()) > 3 else ""
-                
-                # 标准化指标名称
-                normalized_name = self._normalize_indicator_name(indicator_name)
-                if not normalized_name:
-                    continue
-                
-                try:
-                    value = float(value_str)
-                    item = self._create_blood_test_item(normalized_name, value, unit, reference)
-                    return item
-                except ValueError:
-                    continue
-        
-        return None
+        fields = self._match_line(line)
+        if fields is None:
+            return None
+        return self._create_blood_test_item(*fields, "")
 
     def _normalize_indicator_name(self, name: str) -> Optional[str]:
         """标准化指标名称"""
-        name = name.strip()
-        
-        # 查找匹配的指标
-        for standard_name, aliases in self.blood_indicators.items():
-            if name == standard_name:
-                return standard_name
-            for alias in aliases:
-                if alias.lower() in name.lower() or name.lower() in alias.lower():
-                    return standard_name
-        
-        return None
-
-    def _create_blood_test_item(self, name: str, value: float, unit: str, reference: str) -> BloodTestItem:
-        """创建血常规检测项目"""
-        # 获取参考范围
-        ref_min, ref_max, standard_unit = self.reference_ranges.get(name, (0, 0, ""))
-        
-        # 判断状态
-        if ref_min <= value <= ref_max:
-            status = "正常"
-            is_abnormal = False
-        elif value < ref_min:
-            status = "偏低"
-            is_abnormal = True
-        else:
-            status = "偏高"
-            is_abnormal = True
-        
-        # 使用标准单位
-        final_unit = standard_unit if standard_unit else unit
-        
-        return BloodTestItem(
-            name=name,
-            value=value,
-            unit=final_unit,
-            reference_range=f"{ref_min}-{ref_max}",
-            status=status,
-            is_abnormal=is_abnormal
-        )
+        alias = self._alias_matcher.find(name.strip())
+        return alias.name if alias else None
 
-    def process_image(self, image_path: str) -> OCRResult:
-        """处理图像并返回识别结果"""
+    def _create_blood_test_item(self, name: str, value: float, unit: str, reference: str,
+                                sex: Optional[str] = None, age: Optional[float] = None) -> BloodTestItem:
+        """创建血常规检测项目（按参考范围引擎判定状态，单位统一为参考范围的单位）"""
+        return self.reference_engine.build_items([name], [value], [unit], sex, age)[0]
+
+    def process_image(self, image_path: str, progress: Optional[Callable[[str], None]] = None,
+                      page: int = 0, image: Optional[np.ndarray] = None) -> OCRResult:
+        """处理图像并返回识别结果（多页文件识别指定页，已解码的图像可直接传入）"""
         try:
-            # 提取文字
-            text = self.extract_text(image_path)
-            
-            # 解析数据
-            items = self.parse_blood_test_data(text)
-            
-            # 计算置信度（基于识别到的项目数量）
-            confidence = min(len(items) / 10.0, 1.0) if items else 0.0
+            # 提取文字并解析数据
+            text, items, info = self.recognize(image_path, progress, page, image)
             
             return OCRResult(
                 text=text,
-                confidence=confidence,
+                confidence=info["confidence"] / 100.0,
                 items=items,
-                raw_data={"image_path": image_path, "processed_at": datetime.now().isoformat()}
+                raw_data={
+                    "image_path": image_path,
+                    "page": page,
+                    "processed_at": datetime.now().isoformat(),
+                    "ocr_info": info
+                }
             )
             
         except Exception as e:
@@ -203,25 +398,72 @@ class BloodTestAnalysisService:
     
     def __init__(self):
         self.ocr_service = BloodTestOCRService()
+        self.reference_engine = self.ocr_service.reference_engine
+    
+    def comparison_fingerprint(self) -> str:
+        """历史对比指纹：对比逻辑版本、趋势阈值和参考范围规则，任一变化时物化的对比结果失效"""
+        return f"{COMPARISON_VERSION}:{TREND_RELATIVE_THRESHOLD}:{self.reference_engine.fingerprint()}"
     
-    def analyze_report(self, image_path: str, patient_name: str, hospital: str, test_date: datetime) -> BloodTestReport:
-        """分析血常规报告"""
-        # OCR识别
-        ocr_result = self.ocr_service.process_image(image_path)
+    def analyze_report(self, image_path: str, patient_name: str, hospital: str, test_date: datetime,
+                       items: Optional[List[BloodTestItem]] = None,
+                       ocr_info: Optional[Dict[str, Any]] = None,
+                       sex: Optional[str] = None, age: Optional[float] = None) -> BloodTestReport:
+        """分析血常规报告，已知识别结果（如重复上传的图片）时跳过OCR
+
+        性别、年龄未指定时采用从报告抬头识别出的值，并据此重新判定各项目的参考范围。
+        """
+        if items is None:
+            # OCR识别
+            result = self.ocr_service.process_image(image_path)
+            items = result.items
+            ocr_info = result.raw_data.get("ocr_info")
+        
+        detected = self._ocr_demographics(ocr_info)
+        sex = normalize_sex(sex) or detected.get('sex')
+        age = age if age is not None else detected.get('age')
         
         # 创建报告
         report = BloodTestReport(
             patient_name=patient_name,
             test_date=test_date,
             hospital=hospital,
-            items=ocr_result.items,
-            image_path=image_path
+            items=self.reference_engine.classify_items(items, sex, age),
+            image_path=image_path,
+            ocr_info=ocr_info,
+            sex=sex,
+            age=age
         )
         
         return report
     
-    def compare_with_history(self, current_report: BloodTestReport, previous_reports: List[BloodTestReport]) -> Dict[str, any]:
-        """与历史数据对比"""
+    @staticmethod
+    def _ocr_demographics(ocr_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """识别信息中的性别年龄；多页报告取各页中最先识别到的值"""
+        if not ocr_info:
+            return {}
+        pages = ocr_info.get('pages') or [ocr_info]
+        detected = {}
+        for page in pages:
+            for key, value in ((page or {}).get('demographics') or {}).items():
+                if value is not None:
+                    detected.setdefault(key, value)
+        return detected
+    
+    def merge_page_items(self, pages: List[List[BloodTestItem]]) -> List[BloodTestItem]:
+        """合并同一份报告各页的检测项目，同一指标出现在多页时保留先出现的一页"""
+        merged = {}
+        for items in pages:
+            for item in items:
+                merged.setdefault(item.name, item)
+        return list(merged.values())
+    
+    def compare_with_history(self, current_report: BloodTestReport, previous_reports: List[BloodTestReport],
+                             history: Optional[PatientSeries] = None) -> Dict[str, any]:
+        """与历史数据对比
+
+        提供 history（列式指标历史）时，标准指标直接读取连续数组；
+        非标准指标仍从历史报告的项目列表中收集。
+        """
         if not previous_reports:
             return {"message": "无历史数据可对比"}
         
@@ -230,20 +472,29 @@ class BloodTestAnalysisService:
         
         # 计算趋势
         trends = {}
+        series = {}
         abnormal_changes = []
         
         for item in current_report.items:
             item_name = item.name
-            values = []
-            dates = []
+            column = history.column(item_name) if history is not None else None
             
-            # 收集历史数据
-            for report in sorted_reports:
-                for hist_item in report.items:
-                    if hist_item.name == item_name:
-                        values.append(hist_item.value)
-                        dates.append(report.test_date)
-                        break
+            if column is not None:
+                # 列式历史：掩码过滤缺失值
+                present = ~np.isnan(column)
+                values = column[present].tolist()
+                dates = history.dates[present].astype('datetime64[us]').tolist()
+            else:
+                values = []
+                dates = []
+                
+                # 收集历史数据
+                for report in sorted_reports:
+                    for hist_item in report.items:
+                        if hist_item.name == item_name:
+                            values.append(hist_item.value)
+                            dates.append(report.test_date)
+                            break
             
             if values:
                 # 添加当前值
@@ -252,9 +503,9 @@ class BloodTestAnalysisService:
                 
                 trends[item_name] = {
                     "values": values,
-                    "dates": [d.isoformat() for d in dates],
-                    "trend": self._calculate_trend(values)
+                    "dates": [d.isoformat() for d in dates]
                 }
+                series[item_name] = (dates, values)
                 
                 # 检查异常变化
                 if len(values) >= 2:
@@ -268,6 +519,14 @@ class BloodTestAnalysisService:
                         if values[-1] != 0:
                             abnormal_changes.append(f"{item_name}: 从0变化到{values[-1]}")
         
+        # 所有指标按实际检测时间一次拟合
+        if series:
+            described = fit_ragged(list(series.values())).describe()
+            for row, item_name in enumerate(series):
+                trends[item_name].update(described[row])
+        
+        abnormal_changes.extend(self._range_crossings(trends, current_report.sex, current_report.age))
+        
         return {
             "trends": trends,
             "abnormal_changes": abnormal_changes,
@@ -275,33 +534,28 @@ class BloodTestAnalysisService:
             "previous_reports": previous_reports
         }
     
-    def _calculate_trend(self, values: List[float]) -> str:
-        """计算趋势"""
-        if len(values) < 2:
-            return "无趋势"
-        
-        # 简单线性回归
-        x = list(range(len(values)))
-        y = values
-        
-        # 计算斜率
-        n = len(x)
-        sum_x = sum(x)
-        sum_y = sum(y)
-        sum_xy = sum(x[i] * y[i] for i in range(n))
-        sum_x2 = sum(x[i] ** 2 for i in range(n))
-        
-        if n * sum_x2 - sum_x ** 2 == 0:
-            return "无趋势"
-        
-        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x ** 2)
-        
-        if slope > 0.1:
-            return "上升"
-        elif slope < -0.1:
-            return "下降"
-        else:
-            return "稳定"
+    def _range_crossings(self, trends: Dict[str, Dict], sex: Optional[str], age: Optional[float]) -> List[str]:
+        """一次判定所有指标历史值的参考范围状态，记入 trends[指标]["statuses"]，
+        并列出最近一次相对上一次越出或回到参考范围的指标"""
+        names = [name for name, trend in trends.items() for _ in trend["values"]]
+        values = [value for trend in trends.values() for value in trend["values"]]
+        if not names:
+            return []
+        codes = self.reference_engine.classify(names, values, sex, age).codes
+        
+        crossings = []
+        offset = 0
+        for name, trend in trends.items():
+            statuses = codes[offset:offset + len(trend["values"])]
+            offset += len(trend["values"])
+            trend["statuses"] = [STATUS_LABELS[int(code)] for code in statuses]
+            if len(statuses) >= 2 and statuses[-1] != statuses[-2]:
+                previous, latest = STATUS_LABELS[int(statuses[-2])], STATUS_LABELS[int(statuses[-1])]
+                if statuses[-1] == STATUS_NORMAL:
+                    crossings.append(f"{name}: 由{previous}恢复正常")
+                else:
+                    crossings.append(f"{name}: 由{previous}变为{latest}")
+        return crossings
     
     def _generate_comparison_summary(self, current: BloodTestReport, previous: List[BloodTestReport]) -> str:
         """生成对比摘要"""
@@ -333,13 +587,20 @@ class BloodTestAnalysisService:
             # 生成患者ID
             patient_id = blood_test_data.get("patient_id", f"patient_{datetime.now().strftime('%Y%m%d%H%M%S')}")
             
+            # 按性别年龄一次判定所有提供的指标
+            ranges = self._classify_fields(
+                blood_test_data,
+                blood_test_data.get("sex") or blood_test_data.get("gender"),
+                blood_test_data.get("age")
+            )
+            
             # 分析各项指标
-            analysis_results = {}
+            analysis_results = {"indicators": ranges}
             key_findings = []
             abnormal_count = 0
             
             # 血小板相关指标分析（ITP重点关注）
-            plt_analysis = self._analyze_platelet_indicators(blood_test_data)
+            plt_analysis = self._analyze_platelet_indicators(blood_test_data, ranges)
             analysis_results["platelet_analysis"] = plt_analysis
             
             if plt_analysis["status"] != "normal":
@@ -347,7 +608,7 @@ class BloodTestAnalysisService:
                 key_findings.append(f"血小板计数异常: {plt_analysis['message']}")
             
             # 红细胞相关指标分析
-            rbc_analysis = self._analyze_red_blood_cell_indicators(blood_test_data)
+            rbc_analysis = self._analyze_red_blood_cell_indicators(blood_test_data, ranges)
             analysis_results["rbc_analysis"] = rbc_analysis
             
             if rbc_analysis["status"] != "normal":
@@ -355,7 +616,7 @@ class BloodTestAnalysisService:
                 key_findings.append(f"红细胞指标异常: {rbc_analysis['message']}")
             
             # 白细胞相关指标分析
-            wbc_analysis = self._analyze_white_blood_cell_indicators(blood_test_data)
+            wbc_analysis = self._analyze_white_blood_cell_indicators(blood_test_data, ranges)
             analysis_results["wbc_analysis"] = wbc_analysis
             
             if wbc_analysis["status"] != "normal":
@@ -384,7 +645,29 @@ class BloodTestAnalysisService:
         except Exception as e:
             raise Exception(f"血常规数据分析失败: {str(e)}")
     
-    def _analyze_platelet_indicators(self, data: dict) -> dict:
+    def _classify_fields(self, data: dict, sex: Optional[str], age: Optional[float]) -> Dict[str, Dict[str, Any]]:
+        """用参考范围引擎一次判定请求中提供的所有指标"""
+        fields = [field for field in ANALYZE_FIELDS if data.get(field) is not None]
+        if not fields:
+            return {}
+        result = self.reference_engine.classify([ANALYZE_FIELDS[f] for f in fields],
+                                                [float(data[f]) for f in fields], sex, age)
+        ranges = {}
+        for i, field in enumerate(fields):
+            rule = self.reference_engine.rules[int(result.rules[i])]
+            ranges[field] = {
+                "name": rule.name,
+                "value": float(result.values[i]),
+                "low": rule.low,
+                "high": rule.high,
+                "unit": rule.unit,
+                "reference_range": rule.range_text,
+                "status": STATUS_LABELS[int(result.codes[i])],
+                "is_abnormal": int(result.codes[i]) != STATUS_NORMAL
+            }
+        return ranges
+    
+    def _analyze_platelet_indicators(self, data: dict, ranges: Dict[str, Dict[str, Any]]) -> dict:
         """分析血小板相关指标"""
         plt = data.get("plt")
         mpv = data.get("mpv")
@@ -394,9 +677,9 @@ class BloodTestAnalysisService:
             return {"status": "unknown", "message": "血小板计数数据缺失"}
         
         # 血小板计数参考范围
-        plt_normal = 100 <= plt <= 300
+        reference = ranges["plt"]
         
-        if plt < 100:
+        if plt < reference["low"]:
             if plt < 50:
                 status = "severe"
                 message = f"血小板严重减少 ({plt} ×10^9/L)，出血风险极高"
@@ -406,7 +689,7 @@ class BloodTestAnalysisService:
             else:
                 status = "mild"
                 message = f"血小板轻度减少 ({plt} ×10^9/L)"
-        elif plt > 300:
+        elif plt > reference["high"]:
             status = "high"
             message = f"血小板计数偏高 ({plt} ×10^9/L)"
         else:
@@ -417,11 +700,11 @@ class BloodTestAnalysisService:
             "status": status,
             "message": message,
             "value": plt,
-            "reference_range": "100-300 ×10^9/L",
-            "is_abnormal": not plt_normal
+            "reference_range": f"{reference['reference_range']} ×10^9/L",
+            "is_abnormal": reference["is_abnormal"]
         }
     
-    def _analyze_red_blood_cell_indicators(self, data: dict) -> dict:
+    def _analyze_red_blood_cell_indicators(self, data: dict, ranges: Dict[str, Dict[str, Any]]) -> dict:
         """分析红细胞相关指标"""
         hgb = data.get("hgb")
         rbc = data.get("rbc")
@@ -430,10 +713,10 @@ class BloodTestAnalysisService:
         if hgb is None:
             return {"status": "unknown", "message": "血红蛋白数据缺失"}
         
-        # 血红蛋白参考范围（成年男性）
-        hgb_normal = 130 <= hgb <= 175
+        # 血红蛋白参考范围（按性别年龄）
+        reference = ranges["hgb"]
         
-        if hgb < 130:
+        if hgb < reference["low"]:
             if hgb < 80:
                 status = "severe"
                 message = f"严重贫血 (Hb: {hgb} g/L)"
@@ -443,7 +726,7 @@ class BloodTestAnalysisService:
             else:
                 status = "mild"
                 message = f"轻度贫血 (Hb: {hgb} g/L)"
-        elif hgb > 175:
+        elif hgb > reference["high"]:
             status = "high"
             message = f"血红蛋白偏高 (Hb: {hgb} g/L)"
         else:
@@ -454,11 +737,11 @@ class BloodTestAnalysisService:
             "status": status,
             "message": message,
             "value": hgb,
-            "reference_range": "130-175 g/L",
-            "is_abnormal": not hgb_normal
+            "reference_range": f"{reference['reference_range']} g/L",
+            "is_abnormal": reference["is_abnormal"]
         }
     
-    def _analyze_white_blood_cell_indicators(self, data: dict) -> dict:
+    def _analyze_white_blood_cell_indicators(self, data: dict, ranges: Dict[str, Dict[str, Any]]) -> dict:
         """分析白细胞相关指标"""
         wbc = data.get("wbc")
         neut_percent = data.get("neut_percent")
@@ -468,12 +751,12 @@ class BloodTestAnalysisService:
             return {"status": "unknown", "message": "白细胞计数数据缺失"}
         
         # 白细胞计数参考范围
-        wbc_normal = 3.5 <= wbc <= 9.5
+        reference = ranges["wbc"]
         
-        if wbc < 3.5:
+        if wbc < reference["low"]:
             status = "low"
             message = f"白细胞减少 (WBC: {wbc} ×10^9/L)"
-        elif wbc > 9.5:
+        elif wbc > reference["high"]:
             status = "high"
             message = f"白细胞增多 (WBC: {wbc} ×10^9/L)"
         else:
@@ -484,8 +767,8 @@ class BloodTestAnalysisService:
             "status": status,
             "message": message,
             "value": wbc,
-            "reference_range": "3.5-9.5 ×10^9/L",
-            "is_abnormal": not wbc_normal
+            "reference_range": f"{reference['reference_range']} ×10^9/L",
+            "is_abnormal": reference["is_abnormal"]
         }
     
     def _assess_overall_status(self, abnormal_count: int) -> str:
@@ -501,15 +784,11 @@ class BloodTestAnalysisService:
         """评估ITP状况"""
         plt = data.get("plt")
         
-        # 血小板状态评估
+        # 血小板状态评估（与血小板分析使用同一参考范围）
         if plt is None:
             plt_status = "unknown"
-        elif plt < 50:
-            plt_status = "severe"
-        elif plt < 100:
-            plt_status = "moderate"
-        elif plt < 150:
-            plt_status = "mild"
+        elif plt_analysis["status"] in ("severe", "moderate", "mild"):
+            plt_status = plt_analysis["status"]
         else:
             plt_status = "normal"
         
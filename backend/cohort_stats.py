@@ -0,0 +1,323 @@
+"""
+人群统计模块
+对存储引擎逐批返回的指标数值做一次遍历的流式聚合：在线均值/方差（Welford）、
+可合并的分位数草图（对数分桶，相对误差有界），以及按医院、时间段、性别的分组计数
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from reference_ranges import normalize_sex
+
+# 分位数草图的默认相对精度（1%）
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# 支持的分组方式
+GROUP_BY_FIELDS = ('hospital', 'year', 'quarter', 'month', 'sex')
+
+# 一批数值行：(数值, 是否异常, 医院, 检测日期ISO字符串, 性别)
+IndicatorRow = Tuple[float, bool, str, str, Optional[str]]
+
+
+class RunningMoments:
+    """在线计数、均值、方差和极值
+
+    每批数值先用 NumPy 求出批内均值和离差平方和，再按 Chan 等人的并行公式合并，
+    结果与一次性计算一致；两个实例也可以同样合并。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray):
+        """合并一批数值"""
+        if not len(values):
+            return
+        batch = RunningMoments()
+        batch.count = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other: 'RunningMoments'):
+        """合并另一组统计量"""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> Optional[float]:
+        """样本方差，少于2个值时为None"""
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def std(self) -> Optional[float]:
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+
+class QuantileSketch:
+    """可合并的分位数草图（DDSketch 式对数分桶）
+
+    数值 x 落入编号 ceil(log_γ |x|) 的桶，γ = (1+α)/(1-α)，
+    以桶的代表值估计分位数时相对误差不超过 α。桶数只随数值跨度的对数增长，
+    与数值个数无关；合并两个草图只需把同编号的桶计数相加。
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _add_keys(self, store: Dict[int, int], magnitudes: np.ndarray):
+        if not len(magnitudes):
+            return
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def update(self, values: np.ndarray):
+        """加入一批数值"""
+        self.count += len(values)
+        self._add_keys(self.positive, values[values > 0])
+        self._add_keys(self.negative, -values[values < 0])
+        self.zero_count += int((values == 0).sum())
+
+    def merge(self, other: 'QuantileSketch'):
+        """合并相同精度的另一个草图"""
+        if other.gamma != self.gamma:
+            raise ValueError("只能合并相对精度相同的分位数草图")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _value(self, key: int) -> float:
+        """桶的代表值（与桶内任意数值的相对误差不超过 α）"""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """按数值升序排列的 (代表值, 计数)"""
+        result = [(-self._value(key), self.negative[key]) for key in sorted(self.negative, reverse=True)]
+        if self.zero_count:
+            result.append((0.0, self.zero_count))
+        result.extend((self._value(key), self.positive[key]) for key in sorted(self.positive))
+        return result
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """
+        估计一组分位数
+
+        Args:
+            qs: 0-1 之间的分位点
+
+        Returns:
+            与 qs 对应的估计值，草图为空时为None
+        """
+        if not self.count:
+            return [None] * len(qs)
+        buckets = self.buckets()
+        cumulative = np.cumsum([count for _, count in buckets])
+        values = [value for value, _ in buckets]
+        results = []
+        for q in qs:
+            rank = q * (self.count - 1)
+            index = int(np.searchsorted(cumulative, rank, side='right'))
+            results.append(values[min(index, len(values) - 1)])
+        return results
+
+
+class GroupStats:
+    """一组数值的流式统计：矩、分位数草图、异常数和阈值计数"""
+
+    def __init__(self, below: Optional[float] = None, above: Optional[float] = None,
+                 relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.below = below
+        self.above = above
+        self.moments = RunningMoments()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.abnormal = 0
+        self.below_count = 0
+        self.above_count = 0
+
+    def update(self, values: np.ndarray, abnormal: np.ndarray):
+        self.moments.update(values)
+        self.sketch.update(values)
+        self.abnormal += int(abnormal.sum())
+        if self.below is not None:
+            self.below_count += int((values < self.below).sum())
+        if self.above is not None:
+            self.above_count += int((values > self.above).sum())
+
+    def merge(self, other: 'GroupStats'):
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.abnormal += other.abnormal
+        self.below_count += other.below_count
+        self.above_count += other.above_count
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """分位数估计，限制在实际最小值和最大值之间"""
+        if not self.moments.count:
+            return [None] * len(qs)
+        return [min(max(value, self.moments.min), self.moments.max) for value in self.sketch.quantiles(qs)]
+
+    def summary(self, percentiles: Sequence[float]) -> Dict[str, any]:
+        """
+        统计摘要
+
+        Args:
+            percentiles: 百分位点（0-100）
+
+        Returns:
+            计数、均值、标准差、极值、百分位数、异常占比及阈值计数
+        """
+        count = self.moments.count
+
+        def rounded(value):
+            return None if value is None else round(value, 4)
+
+        result = {
+            "count": count,
+            "mean": rounded(self.moments.mean) if count else None,
+            "std": rounded(self.moments.std),
+            "min": rounded(self.moments.min) if count else None,
+            "max": rounded(self.moments.max) if count else None,
+            "percentiles": {
+                f"p{p:g}": rounded(value)
+                for p, value in zip(percentiles, self.quantiles([p / 100 for p in percentiles]))
+            },
+            "abnormal_count": self.abnormal,
+            "abnormal_share": round(self.abnormal / count, 4) if count else None
+        }
+        if self.below is not None:
+            result["below"] = {"threshold": self.below, "count": self.below_count,
+                               "share": round(self.below_count / count, 4) if count else None}
+        if self.above is not None:
+            result["above"] = {"threshold": self.above, "count": self.above_count,
+                               "share": round(self.above_count / count, 4) if count else None}
+        return result
+
+    def histogram(self, bins: int, low: Optional[float] = None, high: Optional[float] = None) -> Dict[str, any]:
+        """
+        由分位数草图的桶得到等宽直方图（桶边界附近的数值可能偏差 α 的相对误差）
+
+        Args:
+            bins: 分箱数
+            low: 下界，为空时取最小值
+            high: 上界，为空时取最大值
+
+        Returns:
+            分箱边界、各箱计数，以及落在区间外的计数
+        """
+        if not self.moments.count:
+            return {"edges": [], "counts": [], "below_range": 0, "above_range": 0}
+        low = self.moments.min if low is None else low
+        high = self.moments.max if high is None else high
+        if high <= low:
+            high = low + 1
+        edges = np.linspace(low, high, bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        below_range = above_range = 0
+        for value, count in self.sketch.buckets():
+            # 代表值限制在实际极值之间，避免最小/最大值所在的桶被计入区间外
+            value = min(max(value, self.moments.min), self.moments.max)
+            if value < low:
+                below_range += count
+            elif value > high:
+                above_range += count
+            else:
+                counts[min(int(np.searchsorted(edges, value, side='right')) - 1, bins - 1)] += count
+        return {
+            "edges": [round(float(edge), 4) for edge in edges],
+            "counts": counts.tolist(),
+            "below_range": below_range,
+            "above_range": above_range
+        }
+
+
+def _group_keys(group_by: str, hospitals: List[str], dates: List[str], sexes: List[Optional[str]]) -> pd.Series:
+    """一批行的分组键"""
+    if group_by == 'hospital':
+        return pd.Series(hospitals, dtype=object).fillna("未知")
+    if group_by == 'sex':
+        return pd.Series([normalize_sex(sex) or "未知" for sex in sexes], dtype=object)
+    dates = pd.Series(dates, dtype=str)
+    if group_by == 'year':
+        return dates.str[:4]
+    if group_by == 'month':
+        return dates.str[:7]
+    # 季度：YYYY-Qn
+    months = pd.to_numeric(dates.str[5:7], errors='coerce').fillna(1).astype(int)
+    return dates.str[:4] + "-Q" + ((months - 1) // 3 + 1).astype(str)
+
+
+class CohortAggregator:
+    """人群统计聚合器
+
+    逐批接收存储引擎返回的指标行，只保留总体和各分组的流式统计量，
+    内存占用与报告数无关。
+    """
+
+    def __init__(self, group_by: Optional[str] = None, below: Optional[float] = None,
+                 above: Optional[float] = None, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if group_by is not None and group_by not in GROUP_BY_FIELDS:
+            raise ValueError(f"不支持的分组方式: {group_by}")
+        self.group_by = group_by
+        self.below = below
+        self.above = above
+        self.relative_accuracy = relative_accuracy
+        self.overall = self._new_group()
+        self.groups: Dict[str, GroupStats] = {}
+
+    def _new_group(self) -> GroupStats:
+        return GroupStats(self.below, self.above, self.relative_accuracy)
+
+    def update(self, rows: List[IndicatorRow]):
+        """加入一批指标行"""
+        if not rows:
+            return
+        values_list, abnormal_list, hospitals, dates, sexes = zip(*rows)
+        values = np.asarray(values_list, dtype=np.float64)
+        abnormal = np.asarray(abnormal_list, dtype=bool)
+        finite = np.isfinite(values)
+        self.overall.update(values[finite], abnormal[finite])
+
+        if self.group_by is None:
+            return
+        codes, uniques = pd.factorize(_group_keys(self.group_by, list(hospitals), list(dates), list(sexes)))
+        codes = np.where(finite, codes, -1)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for index, key in enumerate(uniques):
+            selected = order[bounds[index]:bounds[index + 1]]
+            if len(selected):
+                group = self.groups.get(key)
+                if group is None:
+                    group = self.groups[key] = self._new_group()
+                group.update(values[selected], abnormal[selected])
+
+    def consume(self, batches: Iterable[List[IndicatorRow]]) -> 'CohortAggregator':
+        """一次遍历消费全部批次"""
+        for rows in batches:
+            self.update(rows)
+        return self
@@ -0,0 +1,119 @@
+"""
+历史对比结果存储模块
+按报告物化保存历史对比结果，同一患者（含姓名模糊匹配到的患者）的报告新增、修改或删除时失效
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class ComparisonStore:
+    """物化的历史对比结果
+
+    以 (报告ID, 姓名匹配阈值, 分析指纹) 为键保存在SQLite中，结果只记录历史报告ID，
+    读取时再从报告缓存取出完整报告。分析逻辑或参考范围规则变化时指纹随之变化，旧结果不再命中。
+    多个进程可以共享同一个文件，失效由写入报告的进程在跨进程写锁内完成。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS comparisons (
+                report_id TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                fingerprint TEXT NOT NULL,
+                patient_name TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (report_id, threshold, fingerprint)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_comparisons_patient ON comparisons(patient_name, threshold)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, report_id: str, threshold: float, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """读取物化的对比结果，不存在或已失效时返回None"""
+        row = self._connect().execute(
+            "SELECT result FROM comparisons WHERE report_id = ? AND threshold = ? AND fingerprint = ?",
+            (report_id, threshold, fingerprint)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, report_id: str, threshold: float, fingerprint: str, patient_name: str, result: Dict[str, Any]):
+        """保存对比结果，同一报告其他指纹的旧结果一并删除"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM comparisons WHERE report_id = ? AND fingerprint != ?", (report_id, fingerprint))
+            conn.execute(
+                "INSERT OR REPLACE INTO comparisons "
+                "(report_id, threshold, fingerprint, patient_name, result, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (report_id, threshold, fingerprint, patient_name,
+                 json.dumps(result, ensure_ascii=False, default=str), time.time())
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def invalidate(self, report_ids: Iterable[str], patient_scores: Iterable[Tuple[str, float]]) -> int:
+        """
+        使受报告变化影响的对比结果失效
+
+        Args:
+            report_ids: 发生变化的报告ID
+            patient_scores: (患者姓名, 与变化报告患者姓名的匹配得分)，
+                该患者在匹配阈值不高于得分时保存的结果都会失效
+
+        Returns:
+            删除的条目数
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = 0
+            for report_id in report_ids:
+                removed += conn.execute("DELETE FROM comparisons WHERE report_id = ?", (report_id,)).rowcount
+            for patient_name, score in patient_scores:
+                removed += conn.execute(
+                    "DELETE FROM comparisons WHERE patient_name = ? AND threshold <= ?", (patient_name, score)
+                ).rowcount
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return removed
+
+    def stats(self) -> dict:
+        """条目数和本进程的命中统计"""
+        count = self._connect().execute("SELECT COUNT(*) FROM comparisons").fetchone()[0]
+        return {
+            'entries': count,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def clear(self):
+        """清空全部对比结果"""
+        self._connect().execute("DELETE FROM comparisons")
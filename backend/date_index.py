@@ -0,0 +1,57 @@
+"""
+检测日期索引模块
+按 test_date 维护有序列表，日期范围查询通过二分查找完成
+"""
+
+import bisect
+from datetime import datetime
+from typing import List, Optional, Tuple
+from models import BloodTestReport
+
+
+class DateIndex:
+    """有序的检测日期索引
+
+    作为 ReportCache 的附加索引使用，保存按 (test_date, 报告ID) 排序的列表，
+    范围查询只访问落在区间内的条目。
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[datetime, str]] = []
+
+    def clear(self):
+        self._entries = []
+
+    def add(self, report: BloodTestReport):
+        bisect.insort(self._entries, (report.test_date, report.id))
+
+    def remove(self, report: BloodTestReport):
+        entry = (report.test_date, report.id)
+        index = bisect.bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    def _bounds(self, start_date: Optional[datetime], end_date: Optional[datetime]) -> Tuple[int, int]:
+        lo = 0 if start_date is None else bisect.bisect_left(self._entries, (start_date,))
+        # (end_date, chr(0x10FFFF)) 排在同一时刻的所有报告ID之后
+        hi = len(self._entries) if end_date is None else bisect.bisect_right(self._entries, (end_date, chr(0x10FFFF)))
+        return lo, max(lo, hi)
+
+    def count(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> int:
+        """统计区间内的报告数"""
+        lo, hi = self._bounds(start_date, end_date)
+        return hi - lo
+
+    def range(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[str]:
+        """
+        查询检测日期在区间内的报告
+
+        Args:
+            start_date: 起始时间（含），为空表示不限
+            end_date: 结束时间（含），为空表示不限
+
+        Returns:
+            按检测日期升序排列的报告ID列表
+        """
+        lo, hi = self._bounds(start_date, end_date)
+        return [report_id for _, report_id in self._entries[lo:hi]]
@@ -0,0 +1,115 @@
+"""
+图片存储模块
+按内容SHA-256寻址存储报告图片，相同内容只保存一份
+"""
+
+import hashlib
+import os
+import uuid
+from typing import List, NamedTuple, Optional
+
+
+class StoredImage(NamedTuple):
+    """已保存的图片"""
+    path: str  # 图片文件路径
+    sha256: str  # 内容哈希
+    size: int  # 字节数
+    existed: bool  # 相同内容的图片此前已存在
+    data: Optional[bytes] = None  # 写入时保留的图片内容（keep_data=True时），供直接在内存中解码
+
+
+class ImageTooLargeError(ValueError):
+    """图片超过大小上限"""
+
+
+class ImageWriter:
+    """分块写入图片并同时计算哈希，提交时按哈希落到最终位置
+
+    keep_data 为True时同时在内存中保留图片内容，识别时直接解码，不必再从磁盘读回。
+    """
+
+    def __init__(self, store: 'ImageStore', filename: str, max_bytes: Optional[int] = None,
+                 keep_data: bool = False):
+        self.store = store
+        self.ext = os.path.splitext(filename or '')[1].lower()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._chunks: Optional[List[bytes]] = [] if keep_data else None
+        self._tmp_path = os.path.join(store.tmp_dir, f"{uuid.uuid4().hex}.part")
+        self._file = open(self._tmp_path, 'wb')
+
+    def write(self, chunk: bytes):
+        """写入一个数据块"""
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.abort()
+            raise ImageTooLargeError(f"图片超过大小上限 {self.max_bytes} 字节")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        if self._chunks is not None:
+            self._chunks.append(chunk)
+
+    def commit(self) -> StoredImage:
+        """完成写入，相同内容已存在时丢弃临时文件"""
+        self._file.close()
+        digest = self._hash.hexdigest()
+        data = b''.join(self._chunks) if self._chunks is not None else None
+        self._chunks = None
+
+        existing = self.store.find(digest)
+        if existing:
+            os.remove(self._tmp_path)
+            return StoredImage(existing, digest, self.size, True, data)
+
+        path = self.store.blob_path(digest, self.ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self._tmp_path, path)
+        return StoredImage(path, digest, self.size, False, data)
+
+    def abort(self):
+        """放弃写入并删除临时文件"""
+        self._chunks = None
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class ImageStore:
+    """内容寻址的图片存储
+
+    图片保存在 images/<哈希前2位>/<哈希3-4位>/<哈希><扩展名>，
+    是否仍被报告引用由存储服务根据报告的 image_path 计数判断。
+    """
+
+    def __init__(self, images_dir: str):
+        self.images_dir = images_dir
+        self.tmp_dir = os.path.join(images_dir, ".tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def blob_path(self, digest: str, ext: str = '') -> str:
+        """内容哈希对应的文件路径"""
+        return os.path.join(self.images_dir, digest[:2], digest[2:4], f"{digest}{ext}")
+
+    def find(self, digest: str) -> Optional[str]:
+        """查找已保存的相同内容图片"""
+        shard_dir = os.path.dirname(self.blob_path(digest))
+        try:
+            for name in os.listdir(shard_dir):
+                if name.startswith(digest):
+                    return os.path.join(shard_dir, name)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def open_writer(self, filename: str, max_bytes: Optional[int] = None,
+                    keep_data: bool = False) -> ImageWriter:
+        """创建分块写入器"""
+        return ImageWriter(self, filename, max_bytes, keep_data)
+
+    def save_bytes(self, image_data: bytes, filename: str) -> StoredImage:
+        """保存内存中的图片数据"""
+        writer = self.open_writer(filename)
+        writer.write(image_data)
+        return writer.commit()
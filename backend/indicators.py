@@ -0,0 +1,64 @@
+"""
+血常规指标定义模块
+标准指标名称、别名及参考范围，供OCR识别、存储和分析共用
+"""
+
+# 常见血常规指标及其单位
+BLOOD_INDICATORS = {
+    '白细胞': ['WBC', '白细胞计数', '白细胞数'],
+    '红细胞': ['RBC', '红细胞计数', '红细胞数'],
+    '血红蛋白': ['HGB', 'Hb', '血红蛋白', '血色素'],
+    '红细胞压积': ['HCT', '红细胞压积', '红细胞比容'],
+    '平均红细胞体积': ['MCV', '平均红细胞体积'],
+    '平均红细胞血红蛋白含量': ['MCH', '平均红细胞血红蛋白含量'],
+    '平均红细胞血红蛋白浓度': ['MCHC', '平均红细胞血红蛋白浓度'],
+    '血小板': ['PLT', '血小板计数', '血小板数'],
+    '淋巴细胞': ['LYM', 'LYMPH', '淋巴细胞', '淋巴细胞计数'],
+    '中性粒细胞': ['NEU', 'NEUT', '中性粒细胞', '中性粒细胞计数'],
+    '嗜酸性粒细胞': ['EOS', '嗜酸性粒细胞', '嗜酸性粒细胞计数'],
+    '嗜碱性粒细胞': ['BAS', 'BASO', '嗜碱性粒细胞', '嗜碱性粒细胞计数'],
+    '单核细胞': ['MON', 'MONO', '单核细胞', '单核细胞计数'],
+    # 白细胞分类百分比，别名中的 % 与计数（如 NEUT#）区分
+    '淋巴细胞百分比': ['LYM%', 'LYMPH%', '淋巴细胞百分比', '淋巴细胞比率'],
+    '中性粒细胞百分比': ['NEU%', 'NEUT%', '中性粒细胞百分比', '中性粒细胞比率'],
+    '嗜酸性粒细胞百分比': ['EOS%', '嗜酸性粒细胞百分比', '嗜酸性粒细胞比率'],
+    '嗜碱性粒细胞百分比': ['BAS%', 'BASO%', '嗜碱性粒细胞百分比', '嗜碱性粒细胞比率'],
+    '单核细胞百分比': ['MON%', 'MONO%', '单核细胞百分比', '单核细胞比率']
+}
+
+# 参考范围（正常值）
+REFERENCE_RANGES = {
+    '白细胞': (3.5, 9.5, '10^9/L'),
+    '红细胞': (3.8, 5.8, '10^12/L'),
+    '血红蛋白': (115, 175, 'g/L'),
+    '红细胞压积': (0.35, 0.50, 'L/L'),
+    '平均红细胞体积': (80, 100, 'fL'),
+    '平均红细胞血红蛋白含量': (27, 34, 'pg'),
+    '平均红细胞血红蛋白浓度': (320, 360, 'g/L'),
+    '血小板': (125, 350, '10^9/L'),
+    '淋巴细胞': (1.1, 3.2, '10^9/L'),
+    '中性粒细胞': (1.8, 6.3, '10^9/L'),
+    '嗜酸性粒细胞': (0.02, 0.52, '10^9/L'),
+    '嗜碱性粒细胞': (0.00, 0.06, '10^9/L'),
+    '单核细胞': (0.10, 0.60, '10^9/L'),
+    '淋巴细胞百分比': (20, 50, '%'),
+    '中性粒细胞百分比': (40, 75, '%'),
+    '嗜酸性粒细胞百分比': (0.4, 8.0, '%'),
+    '嗜碱性粒细胞百分比': (0, 1, '%'),
+    '单核细胞百分比': (3, 10, '%')
+}
+
+# 按性别、年龄区分的参考范围，优先于上面的通用范围：
+# (指标, 性别 M/F/None, 最小年龄, 最大年龄（不含）, 下限, 上限, 单位)，年龄为None表示不限
+# 成人红细胞、血红蛋白、红细胞压积按 WS/T 405-2012 区分性别；其他人群可通过 REFERENCE_RANGES_FILE 补充
+DEMOGRAPHIC_REFERENCE_RANGES = [
+    ('红细胞', 'M', 18, None, 4.3, 5.8, '10^12/L'),
+    ('红细胞', 'F', 18, None, 3.8, 5.1, '10^12/L'),
+    ('血红蛋白', 'M', 18, None, 130, 175, 'g/L'),
+    ('血红蛋白', 'F', 18, None, 115, 150, 'g/L'),
+    ('红细胞压积', 'M', 18, None, 0.40, 0.50, 'L/L'),
+    ('红细胞压积', 'F', 18, None, 0.35, 0.45, 'L/L'),
+]
+
+# 标准指标名称（固定顺序，列式存储按此顺序排列）
+INDICATOR_NAMES = list(BLOOD_INDICATORS.keys())
@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
+from utils import to_naive_local
 
 class BloodTestItem(BaseModel):
     """血常规检测项目"""
@@ -21,9 +22,17 @@ class BloodTestReport(BaseModel):
     items: List[BloodTestItem]  # 检测项目列表
     image_path: Optional[str] = None  # 原始图片路径
     notes: Optional[str] = None  # 备注
+    ocr_info: Optional[Dict[str, Any]] = None  # 识别信息：采用的预处理策略、置信度和耗时
+    sex: Optional[str] = None  # 性别：M/F，用于选择参考范围
+    age: Optional[float] = None  # 检测时年龄（岁）
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     
+    @validator('test_date', 'created_at', 'updated_at')
+    def _naive_local(cls, value: datetime) -> datetime:
+        """带时区的时间（如 ...Z）统一转换为不带时区的本地时间，保证各索引中的时间可以互相比较"""
+        return to_naive_local(value)
+    
     def dict(self, **kwargs):
         """重写dict方法，确保datetime字段被正确序列化"""
         data = super().dict(**kwargs)
@@ -33,6 +42,12 @@ class BloodTestReport(BaseModel):
                 data[field] = data[field].isoformat()
         return data
 
+class ReportPage(BaseModel):
+    """分页的报告列表"""
+    items: List[BloodTestReport]
+    next_cursor: Optional[str] = None  # 下一页游标，为空表示没有更多数据
+    limit: int
+
 class BloodTestComparison(BaseModel):
     """血常规对比数据"""
     current_report: BloodTestReport
@@ -55,5 +70,39 @@ class UploadResponse(BaseModel):
     upload_time: str
     file_path: str
     analysis: Dict[str, str]
-    status: str
+    status: str  # success：已识别并保存；queued：已进入识别队列
     fix_applied: bool
+    job_id: Optional[str] = None  # OCR任务ID
+    report_id: Optional[str] = None  # 识别完成后保存的报告ID
+
+class OCRJob(BaseModel):
+    """OCR识别任务"""
+    id: str
+    state: str  # queued/preprocessing/ocr/parsed/saved/failed
+    patient_name: str
+    image_path: str
+    report_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class BatchReportResult(BaseModel):
+    """批量上传中的一份报告（可能由多个文件、多页合并而成）"""
+    report_id: Optional[str] = None
+    patient_name: str
+    hospital: str
+    test_date: str
+    files: List[str]  # 原始文件名
+    image_paths: List[str]  # 保存后的图片路径
+    pages: int
+    items_count: int = 0
+    status: str  # saved：已保存；failed：识别失败
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    """批量上传响应"""
+    status: str  # success：全部保存；partial：部分失败；failed：全部失败
+    upload_time: str
+    saved: int
+    failed: int
+    reports: List[BatchReportResult]
@@ -0,0 +1,162 @@
+"""
+OCR引擎模块
+统一 pytesseract（每次调用启动一个 tesseract 进程）和 tesserocr（进程内常驻、语言模型只加载一次）两种识别方式
+"""
+
+import os
+import queue
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # 可选依赖（requirements-ocr.txt），未安装时使用 pytesseract
+    tesserocr = None
+
+OCR_BACKENDS = ('auto', 'tesserocr', 'pytesseract')
+
+
+class OCRText(NamedTuple):
+    """识别出的文字及Tesseract给出的单词置信度"""
+    text: str
+    confidence: float  # 单词置信度的平均值（0-100），没有识别出单词时为0
+    words: int  # 参与平均的单词数
+
+
+def _mean_confidence(confidences: List[float]) -> Tuple[float, int]:
+    """平均置信度和单词数，忽略 -1（非单词的版面元素）"""
+    valid = [float(c) for c in confidences if float(c) >= 0]
+    return (sum(valid) / len(valid) if valid else 0.0), len(valid)
+
+
+class OCRBackend:
+    """OCR引擎基类"""
+
+    name = "base"
+
+    def image_to_string(self, image: np.ndarray, psm: Optional[int] = None) -> str:
+        """识别内存中的图像，psm 为页面分割模式（None 表示引擎默认）"""
+        raise NotImplementedError
+
+    def image_to_data(self, image: np.ndarray, psm: Optional[int] = None) -> OCRText:
+        """识别内存中的图像，同时返回单词置信度"""
+        raise NotImplementedError
+
+    def close(self):
+        """释放引擎资源"""
+
+
+class PytesseractBackend(OCRBackend):
+    """通过 pytesseract 调用 tesseract 命令行
+
+    每次调用都会写临时文件、启动新进程并重新加载语言模型，作为未安装 tesserocr 时的后备方案。
+    """
+
+    name = "pytesseract"
+
+    def __init__(self, lang: str):
+        self.lang = lang
+
+    def image_to_string(self, image: np.ndarray, psm: Optional[int] = None) -> str:
+        config = f'--psm {psm}' if psm is not None else ''
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def image_to_data(self, image: np.ndarray, psm: Optional[int] = None) -> OCRText:
+        config = f'--psm {psm}' if psm is not None else ''
+        data = pytesseract.image_to_data(
+            image, lang=self.lang, config=config, output_type=pytesseract.Output.DICT
+        )
+
+        # 按 (块, 段落, 行) 把单词拼回文本行，只调用一次 tesseract
+        lines, confidences = {}, []
+        for i, word in enumerate(data['text']):
+            if not word.strip():
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(data['conf'][i])
+        text = '\n'.join(' '.join(words) for words in lines.values())
+        return OCRText(text, *_mean_confidence(confidences))
+
+
+class TesserocrPoolBackend(OCRBackend):
+    """常驻的 tesserocr 引擎池
+
+    创建时即初始化 size 个 PyTessBaseAPI（语言模型加载一次），识别时从池中借出一个引擎，
+    直接传入内存中的图像，不经过临时文件和子进程。多个线程（如并行识别的表格区域）
+    最多同时使用 size 个引擎，其余的排队等待。
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str, size: int = 2):
+        if tesserocr is None:
+            raise RuntimeError("未安装 tesserocr")
+        self.lang = lang
+        self.size = size
+        self._engines = queue.Queue()
+        for _ in range(size):
+            self._engines.put(tesserocr.PyTessBaseAPI(lang=lang))
+
+    def image_to_string(self, image: np.ndarray, psm: Optional[int] = None) -> str:
+        engine = self._engines.get()
+        try:
+            engine.SetPageSegMode(psm if psm is not None else tesserocr.PSM.AUTO)
+            engine.SetImage(Image.fromarray(image))
+            return engine.GetUTF8Text()
+        finally:
+            engine.Clear()
+            self._engines.put(engine)
+
+    def image_to_data(self, image: np.ndarray, psm: Optional[int] = None) -> OCRText:
+        engine = self._engines.get()
+        try:
+            engine.SetPageSegMode(psm if psm is not None else tesserocr.PSM.AUTO)
+            engine.SetImage(Image.fromarray(image))
+            text = engine.GetUTF8Text()
+            return OCRText(text, *_mean_confidence(engine.AllWordConfidences()))
+        finally:
+            engine.Clear()
+            self._engines.put(engine)
+
+    def close(self):
+        while not self._engines.empty():
+            self._engines.get().End()
+
+
+def resolve_backend_name(name: Optional[str] = None) -> str:
+    """确定实际使用的引擎名称（auto 时优先 tesserocr）"""
+    name = (name or os.getenv("OCR_BACKEND", "auto")).lower()
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"未知的OCR引擎: {name}，可选: {', '.join(OCR_BACKENDS)}")
+    if name == "auto":
+        return "tesserocr" if tesserocr is not None else "pytesseract"
+    return name
+
+
+def create_ocr_backend(lang: str, name: Optional[str] = None, pool_size: Optional[int] = None) -> OCRBackend:
+    """
+    创建OCR引擎
+
+    Args:
+        lang: Tesseract语言，如 chi_sim+eng
+        name: auto / tesserocr / pytesseract，默认读取环境变量 OCR_BACKEND
+        pool_size: tesserocr 引擎数，默认读取环境变量 OCR_ENGINES_PER_WORKER
+
+    Returns:
+        OCR引擎；未安装 tesserocr 或初始化失败时退回 pytesseract
+    """
+    requested = (name or os.getenv("OCR_BACKEND", "auto")).lower()
+    name = resolve_backend_name(name)
+    if requested == "auto" and name == "pytesseract":
+        print("ℹ️ 未安装 tesserocr，使用 pytesseract（每次识别启动 tesseract 进程）；"
+              "安装常驻引擎池: pip install -r requirements-ocr.txt")
+    if name == "tesserocr":
+        size = pool_size or int(os.getenv("OCR_ENGINES_PER_WORKER", 2))
+        try:
+            return TesserocrPoolBackend(lang, size)
+        except Exception as e:
+            print(f"⚠️ tesserocr 引擎初始化失败，改用 pytesseract: {str(e)}")
+    return PytesseractBackend(lang)
@@ -0,0 +1,159 @@
+"""
+OCR识别结果缓存模块
+按图片内容哈希和识别流程指纹缓存OCR原始文本与解析出的检测项目，重复上传的图片无需再次识别
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+from models import BloodTestItem
+
+
+class CachedOCRResult(NamedTuple):
+    """缓存的识别结果"""
+    text: str  # OCR原始文本
+    items: List[BloodTestItem]  # 解析出的检测项目
+    info: Optional[Dict[str, Any]] = None  # 识别时的预处理策略、置信度和耗时
+
+
+class OCRResultCache:
+    """OCR识别结果缓存
+
+    以 (图片SHA-256, 流程指纹) 为键保存在SQLite中，按最近使用时间淘汰，
+    条目数和总字节数都有上限。流程指纹变化时，旧指纹的条目在打开缓存时一次性清除。
+    多个进程可以共享同一个缓存文件。
+    """
+
+    def __init__(self, db_path: str, pipeline: str, max_entries: int = 5000,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.db_path = db_path
+        self.pipeline = pipeline
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                sha256 TEXT NOT NULL,
+                pipeline TEXT NOT NULL,
+                text TEXT NOT NULL,
+                items TEXT NOT NULL,
+                info TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (sha256, pipeline)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_results_last_used ON ocr_results(last_used)")
+        if 'info' not in {row[1] for row in conn.execute("PRAGMA table_info(ocr_results)")}:
+            conn.execute("ALTER TABLE ocr_results ADD COLUMN info TEXT")
+        # 识别流程变化后旧结果不再可用
+        removed = conn.execute("DELETE FROM ocr_results WHERE pipeline != ?", (pipeline,)).rowcount
+        if removed:
+            print(f"🧹 识别流程已变化，清除 {removed} 条OCR缓存")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sha256: str) -> Optional[CachedOCRResult]:
+        """查找图片的识别结果，命中时刷新最近使用时间"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT text, items, info FROM ocr_results WHERE sha256 = ? AND pipeline = ?",
+            (sha256, self.pipeline)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        conn.execute(
+            "UPDATE ocr_results SET last_used = ? WHERE sha256 = ? AND pipeline = ?",
+            (time.time(), sha256, self.pipeline)
+        )
+        self.hits += 1
+        return CachedOCRResult(
+            row[0],
+            [BloodTestItem(**item) for item in json.loads(row[1])],
+            json.loads(row[2]) if row[2] else None
+        )
+
+    def put(self, sha256: str, text: str, items: List[BloodTestItem], info: Optional[Dict[str, Any]] = None):
+        """保存识别结果并按上限淘汰最久未使用的条目"""
+        items_json = json.dumps([item.dict() for item in items], ensure_ascii=False)
+        info_json = json.dumps(info, ensure_ascii=False) if info is not None else None
+        size = sum(len(part.encode('utf-8')) for part in (text, items_json, info_json or ''))
+        now = time.time()
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_results "
+                "(sha256, pipeline, text, items, info, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sha256, self.pipeline, text, items_json, info_json, size, now, now)
+            )
+            self._evict(conn)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _evict(self, conn: sqlite3.Connection):
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_results").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        # 从最久未使用的条目开始删除，直到两个上限都满足
+        victims = []
+        for sha256, pipeline, size in conn.execute(
+            "SELECT sha256, pipeline, size FROM ocr_results ORDER BY last_used"
+        ):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((sha256, pipeline))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM ocr_results WHERE sha256 = ? AND pipeline = ?", victims)
+
+    def stats(self) -> dict:
+        """缓存条目数、占用字节数和本进程的命中统计"""
+        count, total = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_results"
+        ).fetchone()
+        return {
+            'entries': count,
+            'bytes': total,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'pipeline': self.pipeline,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def clear(self):
+        """清空缓存"""
+        self._connect().execute("DELETE FROM ocr_results")
+
+
+def create_ocr_cache(data_dir: str, pipeline: str) -> OCRResultCache:
+    """按环境变量 OCR_CACHE_MAX_ENTRIES / OCR_CACHE_MAX_BYTES 创建缓存"""
+    return OCRResultCache(
+        os.path.join(data_dir, "ocr_cache.db"),
+        pipeline,
+        max_entries=int(os.getenv("OCR_CACHE_MAX_ENTRIES", 5000)),
+        max_bytes=int(os.getenv("OCR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    )
@@ -0,0 +1,432 @@
+"""
+OCR任务队列模块
+上传接口只负责入队，图像预处理和Tesseract识别在独立的进程池中执行，不阻塞事件循环
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from models import BloodTestItem, OCRJob
+from report_pages import decode_image, is_pdf_data
+
+# 任务状态，按先后顺序排列；failed 可以出现在任何阶段之后
+JOB_STATES = ('queued', 'preprocessing', 'ocr', 'parsed', 'saved')
+TERMINAL_STATES = ('saved', 'failed')
+
+# 任务文件保留时间（秒）和数量上限，超过时删除最早结束的任务文件
+JOB_TTL_SECONDS = int(os.getenv("OCR_JOB_TTL", 7 * 24 * 3600))
+JOB_MAX_FILES = int(os.getenv("OCR_JOB_MAX_FILES", 10000))
+
+# 两次清理任务文件之间的最短间隔（秒）
+_PRUNE_INTERVAL = 600
+
+# 进程池中的OCR服务实例，每个工作进程创建一次
+_worker_ocr_service = None
+
+
+class QueueFullError(RuntimeError):
+    """排队任务数达到上限"""
+
+
+def _init_worker():
+    """工作进程启动时创建OCR服务并加载OCR引擎，之后的任务直接使用已加载的语言模型"""
+    global _worker_ocr_service
+    from blood_test_service import BloodTestOCRService
+    _worker_ocr_service = BloodTestOCRService()
+    _worker_ocr_service.ocr_backend
+
+
+def _run_ocr(job_id: str, image_path: str, progress_queue, image_data: Optional[bytes] = None) -> Dict:
+    """在工作进程中识别图片，返回OCR文本和检测项目字典列表
+
+    传入 image_data 时直接在内存中解码上传内容，不再从磁盘读回图片。
+    """
+    if _worker_ocr_service is None:
+        _init_worker()
+
+    def progress(stage: str):
+        progress_queue.put((job_id, stage))
+
+    image = None
+    if image_data is not None and not is_pdf_data(image_data):
+        image = decode_image(image_data)
+    result = _worker_ocr_service.process_image(image_path, progress=progress, image=image)
+    return {
+        'text': result.text,
+        'items': [item.dict() for item in result.items],
+        'ocr_info': result.raw_data.get('ocr_info')
+    }
+
+
+def _run_page_ocr(image_path: str, page: int) -> Dict:
+    """在工作进程中识别多页文件的一页（批量上传使用，不上报进度）"""
+    if _worker_ocr_service is None:
+        _init_worker()
+    result = _worker_ocr_service.process_image(image_path, page=page)
+    return {
+        'text': result.text,
+        'items': [item.dict() for item in result.items],
+        'ocr_info': result.raw_data.get('ocr_info')
+    }
+
+
+class OCRJobQueue:
+    """OCR任务队列
+
+    任务在有界的进程池中执行，工作进程通过进度队列上报阶段，
+    识别完成后交给主进程中的收尾线程构建并保存报告（不占用进程池的回调线程和事件循环）。
+    任务状态同时写入 data/jobs，多个 uvicorn worker 之间可以互相查询；
+    已结束的任务文件超过保留时间或数量上限后删除。提供 ocr_cache 时，
+    识别前按图片哈希查找缓存结果，命中则不进入进程池。
+    """
+
+    def __init__(self, analysis_service, storage_service, max_workers: Optional[int] = None,
+                 max_pending: int = 100, ocr_cache=None, finish_workers: int = 2,
+                 job_ttl: int = JOB_TTL_SECONDS, max_job_files: int = JOB_MAX_FILES):
+        self.analysis_service = analysis_service
+        self.storage_service = storage_service
+        self.ocr_cache = ocr_cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.max_job_files = max_job_files
+        self.jobs_dir = os.path.join(storage_service.data_dir, "jobs")
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+        self._jobs: Dict[str, Dict] = {}
+        self._done: Dict[str, Future] = {}
+        self._pending_pages = 0
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        # 报告分析和保存在收尾线程中执行，保存时可能等待跨进程写锁
+        self._finisher = ThreadPoolExecutor(max_workers=finish_workers, thread_name_prefix="ocr-finish")
+        self._executor = None
+        self._manager = None
+        self._progress_queue = None
+        self._progress_thread = None
+
+    def _ensure_pool(self):
+        """首次提交时创建进程池和进度队列"""
+        if self._executor is not None:
+            return
+        # 使用spawn，避免在已有线程和数据库连接的进程中fork
+        context = multiprocessing.get_context("spawn")
+        self._manager = context.Manager()
+        self._progress_queue = self._manager.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=context, initializer=_init_worker
+        )
+        self._progress_thread = threading.Thread(
+            target=self._drain_progress, name="ocr-progress", daemon=True
+        )
+        self._progress_thread.start()
+
+    def _drain_progress(self):
+        """接收工作进程上报的阶段"""
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                break
+            job_id, stage = message
+            self._set_state(job_id, stage)
+
+    def _set_state(self, job_id: str, state: str, **fields):
+        """更新任务状态，状态只前进不后退"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] in TERMINAL_STATES:
+                return
+            if state != 'failed' and JOB_STATES.index(state) <= JOB_STATES.index(job['state']):
+                return
+            job['state'] = state
+            job['updated_at'] = datetime.now().isoformat()
+            job.update(fields)
+            # 在锁内落盘，保证任务文件不会被较早的状态覆盖
+            self._persist(job)
+
+    def _persist(self, job: Dict):
+        path = os.path.join(self.jobs_dir, f"{job['id']}.json")
+        tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_file, path)
+
+    def pending_count(self) -> int:
+        """未结束的任务数（批量识别的每一页计为一个任务）"""
+        with self._lock:
+            return len(self._jobs) + self._pending_pages
+
+    def submit(self, image_path: str, patient_name: str, hospital: str, test_date: datetime,
+               notes: Optional[str] = None, known_items: Optional[List[BloodTestItem]] = None,
+               image_sha256: Optional[str] = None, image_data: Optional[bytes] = None,
+               sex: Optional[str] = None, age: Optional[float] = None) -> str:
+        """
+        提交识别任务
+
+        Args:
+            image_path: 已保存的图片路径
+            patient_name: 患者姓名
+            hospital: 医院名称
+            test_date: 检测日期
+            notes: 备注
+            known_items: 已知的识别结果（重复上传的图片），提供时不再执行OCR
+            image_sha256: 图片内容哈希，用于查找和写入识别结果缓存
+            image_data: 图片内容，提供时工作进程直接在内存中解码，不再读取 image_path
+            sex: 性别，未指定时采用报告中识别出的性别
+            age: 年龄（岁），未指定时采用报告中识别出的年龄
+
+        Returns:
+            任务ID
+
+        Raises:
+            QueueFullError: 排队任务数达到上限
+        """
+        ocr_info = None
+        if known_items is None and image_sha256 and self.ocr_cache is not None:
+            cached = self.ocr_cache.get(image_sha256)
+            if cached is not None:
+                known_items = cached.items
+                ocr_info = dict(cached.info or {}, cached=True)
+
+        if known_items is None and self.pending_count() >= self.max_pending:
+            raise QueueFullError(f"识别队列已满（{self.max_pending}个任务）")
+
+        now = datetime.now().isoformat()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'state': 'queued',
+            'patient_name': patient_name,
+            'image_path': image_path,
+            'report_id': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        }
+        done = Future()
+        with self._lock:
+            self._jobs[job_id] = job
+            self._done[job_id] = done
+        self._persist(dict(job))
+
+        context = {
+            'image_path': image_path,
+            'patient_name': patient_name,
+            'hospital': hospital,
+            'test_date': test_date,
+            'notes': notes,
+            'sex': sex,
+            'age': age,
+            'image_sha256': image_sha256,
+            'ocr_info': ocr_info
+        }
+
+        if known_items is not None:
+            self._finisher.submit(self._finish, job_id, context, known_items)
+            return job_id
+
+        self._ensure_pool()
+        future = self._executor.submit(_run_ocr, job_id, image_path, self._progress_queue, image_data)
+        future.add_done_callback(lambda f: self._finisher.submit(self._on_ocr_done, job_id, context, f))
+        return job_id
+
+    def _on_ocr_done(self, job_id: str, context: Dict, future: Future):
+        """在收尾线程中处理识别结果：写入识别结果缓存，再构建并保存报告"""
+        try:
+            result = future.result()
+            items = [BloodTestItem(**item) for item in result['items']]
+        except Exception as e:
+            self._fail(job_id, e)
+            return
+
+        if context['image_sha256'] and self.ocr_cache is not None:
+            try:
+                self.ocr_cache.put(context['image_sha256'], result['text'], items, result.get('ocr_info'))
+            except Exception as e:
+                print(f"⚠️ OCR缓存写入失败: {str(e)}")
+        context['ocr_info'] = result.get('ocr_info')
+        self._finish(job_id, context, items)
+
+    def _finish(self, job_id: str, context: Dict, items: List[BloodTestItem]):
+        """识别完成后构建并保存报告"""
+        try:
+            self._set_state(job_id, 'parsed')
+            report = self.analysis_service.analyze_report(
+                image_path=context['image_path'],
+                patient_name=context['patient_name'],
+                hospital=context['hospital'],
+                test_date=context['test_date'],
+                items=items,
+                ocr_info=context.get('ocr_info'),
+                sex=context.get('sex'),
+                age=context.get('age')
+            )
+            if context['notes']:
+                report.notes = context['notes']
+            report_id = self.storage_service.save_report(report)
+            self._set_state(job_id, 'saved', report_id=report_id)
+        except Exception as e:
+            self._fail(job_id, e)
+            return
+        self._complete(job_id)
+
+    def _fail(self, job_id: str, error: Exception):
+        print(f"❌ OCR任务 {job_id} 失败: {str(error)}")
+        self._set_state(job_id, 'failed', error=str(error))
+        self._complete(job_id)
+
+    def _complete(self, job_id: str):
+        """任务结束：移出内存（之后从任务文件查询）并通知等待方"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            done = self._done.pop(job_id, None)
+        if done is not None and job is not None:
+            done.set_result(OCRJob(**job))
+        if time.time() - self._last_prune >= _PRUNE_INTERVAL:
+            self.prune_jobs()
+
+    def prune_jobs(self) -> int:
+        """
+        删除过期的任务文件
+
+        已结束的任务文件超过保留时间（job_ttl）后删除；剩余文件仍超过 max_job_files 时，
+        按结束时间从早到晚继续删除。未结束的任务只在超过保留时间、且不在本进程中运行时删除
+        （视为已退出的进程遗留的任务）。
+
+        Returns:
+            删除的文件数
+        """
+        self._last_prune = time.time()
+        cutoff = self._last_prune - self.job_ttl
+        with self._lock:
+            running = set(self._jobs)
+
+        kept = []
+        removed = 0
+        for entry in os.scandir(self.jobs_dir):
+            if not entry.name.endswith(('.json', '.tmp')) or entry.name[:-len('.json')] in running:
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime < cutoff:
+                removed += _remove(entry.path)
+            elif entry.name.endswith('.json'):
+                kept.append((mtime, entry.path))
+
+        excess = len(kept) - self.max_job_files
+        if excess > 0:
+            # 任务文件在结束后不再修改，修改时间即结束时间
+            for _, path in sorted(kept):
+                if excess <= 0:
+                    break
+                if self._read_state(path) in TERMINAL_STATES:
+                    removed += _remove(path)
+                    excess -= 1
+        return removed
+
+    @staticmethod
+    def _read_state(path: str) -> Optional[str]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('state')
+        except (OSError, ValueError):
+            return None
+
+    def recognize_pages(self, pages: List[Tuple[str, int, Optional[str]]]) -> List[Future]:
+        """
+        批量识别若干页，不建立任务记录
+
+        Args:
+            pages: [(文件路径, 页码, 缓存键), ...]，缓存键为None时不使用识别结果缓存
+
+        Returns:
+            与 pages 一一对应的Future，结果为 (检测项目列表, 识别信息)；命中缓存的页直接完成
+
+        Raises:
+            QueueFullError: 需要识别的页数超过剩余的排队容量
+        """
+        futures: List[Optional[Future]] = []
+        misses = []
+        for image_path, page, cache_key in pages:
+            cached = self.ocr_cache.get(cache_key) if cache_key and self.ocr_cache is not None else None
+            if cached is not None:
+                done = Future()
+                done.set_result((cached.items, dict(cached.info or {}, cached=True)))
+                futures.append(done)
+            else:
+                futures.append(None)
+                misses.append((len(futures) - 1, image_path, page, cache_key))
+
+        with self._lock:
+            if len(self._jobs) + self._pending_pages + len(misses) > self.max_pending:
+                raise QueueFullError(f"识别队列已满（{self.max_pending}个任务）")
+            self._pending_pages += len(misses)
+
+        self._ensure_pool()
+        for index, image_path, page, cache_key in misses:
+            done = Future()
+            futures[index] = done
+            future = self._executor.submit(_run_page_ocr, image_path, page)
+            future.add_done_callback(lambda f, done=done, cache_key=cache_key: self._on_page_done(f, done, cache_key))
+        return futures
+
+    def _on_page_done(self, future: Future, done: Future, cache_key: Optional[str]):
+        with self._lock:
+            self._pending_pages -= 1
+        try:
+            result = future.result()
+            items = [BloodTestItem(**item) for item in result['items']]
+        except Exception as e:
+            done.set_exception(e)
+            return
+
+        if cache_key and self.ocr_cache is not None:
+            try:
+                self.ocr_cache.put(cache_key, result['text'], items, result.get('ocr_info'))
+            except Exception as e:
+                print(f"⚠️ OCR缓存写入失败: {str(e)}")
+        done.set_result((items, result.get('ocr_info')))
+
+    def get_job(self, job_id: str) -> Optional[OCRJob]:
+        """查询任务状态（本进程内存中没有时读取任务文件）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return OCRJob(**job)
+
+        path = os.path.join(self.jobs_dir, f"{job_id}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return OCRJob(**json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def completion(self, job_id: str) -> Optional[Future]:
+        """任务完成时返回最终状态的Future；任务已结束或不在本进程时返回None"""
+        with self._lock:
+            return self._done.get(job_id)
+
+    def shutdown(self):
+        """停止进程池和收尾线程"""
+        self._finisher.shutdown(wait=False)
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False)
+        self._progress_queue.put(None)
+        self._manager.shutdown()
+
+
+def _remove(path: str) -> int:
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
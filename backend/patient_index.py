@@ -0,0 +1,247 @@
+"""
+患者身份索引模块
+按规范化姓名聚合报告，并以字符二元组（及拼音三元组）建立模糊匹配索引，
+历史对比时只访问与当前患者姓名共享片段的候选患者
+"""
+
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+from models import BloodTestReport
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # 已列入 requirements.txt；未安装时只按字符匹配
+    lazy_pinyin = None
+
+# 默认匹配阈值（0-1），可通过 PATIENT_MATCH_THRESHOLD 配置
+DEFAULT_MATCH_THRESHOLD = float(os.getenv("PATIENT_MATCH_THRESHOLD", "0.6"))
+
+# 读音相同但字形不同的姓名（同音字、OCR识别错字）的得分折扣
+PINYIN_WEIGHT = 0.9
+
+# 一个姓名（至少两个字符）完整包含在另一个姓名中时的得分，如 "时新龙" 与 "时新龙3"
+CONTAINMENT_SCORE = 0.8
+
+# 括号内的备注，如 "张三（复查）"
+_BRACKETS_PATTERN = re.compile(r'[(（\[【][^)）\]】]*[)）\]】]')
+# 规范化时去除的空白和标点
+_SEPARATOR_PATTERN = re.compile(r'[\s\W_]+')
+_CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+# 可作为拼音键的拉丁字母姓名（去掉声调后）
+_LATIN_KEY_PATTERN = re.compile(r'[a-z0-9]*[a-z][a-z0-9]*')
+
+
+def normalize_name(name: str) -> str:
+    """
+    规范化患者姓名，作为同一患者的身份键
+
+    全角转半角、统一小写，去掉括号备注、空白和标点，
+    "Zhang San"、"zhang-san"、"张 三"、"张三（复查）" 分别得到相同的键。
+
+    Args:
+        name: 原始患者姓名
+
+    Returns:
+        规范化后的姓名，无有效字符时为空字符串
+    """
+    if not name:
+        return ""
+    text = unicodedata.normalize('NFKC', name).casefold()
+    text = _BRACKETS_PATTERN.sub('', text)
+    return _SEPARATOR_PATTERN.sub('', text)
+
+
+def phonetic_key(key: str) -> Optional[str]:
+    """
+    规范化姓名的拼音键，"张三" 与 "Zhang San"、"Zhāng Sān" 得到相同的 zhangsan
+
+    含汉字时用 pypinyin 转为不带声调的拼音；拉丁字母姓名去掉声调符号（ü 记为 v，与 pypinyin 一致）。
+    未安装 pypinyin 或姓名不是汉字/拉丁字母时返回 None。
+    """
+    if lazy_pinyin is None:
+        return None
+    if _CJK_PATTERN.search(key):
+        return ''.join(lazy_pinyin(key))
+    text = unicodedata.normalize('NFKD', key).replace('u\u0308', 'v')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return text if _LATIN_KEY_PATTERN.fullmatch(text) else None
+
+
+def bigrams(text: str) -> Set[str]:
+    """首尾补位后切分为字符二元组；中文姓名只有两三个字，二元组比三元组保留更多共享片段"""
+    padded = f"${text}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def trigrams(text: str) -> Set[str]:
+    """首尾补位后切分为字符三元组，用于较长的拼音串"""
+    padded = f"$${text}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _grams(key: str) -> Set[str]:
+    """姓名的全部索引片段：字符二元组，以及带前缀区分的拼音三元组"""
+    grams = {'c' + gram for gram in bigrams(key)}
+    phonetic = phonetic_key(key)
+    if phonetic is not None:
+        grams.update('p' + gram for gram in trigrams(phonetic))
+    return grams
+
+
+def _jaccard(size_a: int, size_b: int, shared: int) -> float:
+    union = size_a + size_b - shared
+    return shared / union if union else 0.0
+
+
+def edit_similarity(a: str, b: str) -> float:
+    """1 - 编辑距离 / 较长姓名的长度；三个字的姓名错一个字得 0.67，两个字的姓名错一个字得 0.5"""
+    if not a or not b:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return 1 - previous[-1] / max(len(a), len(b))
+
+
+def name_similarity(a: str, b: str, char_counts: Tuple[int, int], shared_char: int) -> float:
+    """
+    两个规范化姓名的字符相似度
+
+    取字符二元组 Jaccard、编辑相似度和包含关系得分中的最大值。二元组 Jaccard 对短姓名偏低
+    （"时新龙" 与 "时新龙3" 只有 0.5），编辑相似度和包含关系弥补短姓名的情况。
+
+    Args:
+        a: 规范化姓名
+        b: 规范化姓名
+        char_counts: 两个姓名各自的字符片段数
+        shared_char: 共享的字符片段数
+    """
+    score = _jaccard(char_counts[0], char_counts[1], shared_char)
+    shorter, longer = sorted((a, b), key=len)
+    if len(shorter) >= 2 and shorter in longer:
+        score = max(score, CONTAINMENT_SCORE)
+    # 编辑相似度不超过 1 - 长度差 / 较长长度，达不到当前得分时不必计算
+    if 1 - (len(longer) - len(shorter)) / len(longer) > score:
+        score = max(score, edit_similarity(a, b))
+    return score
+
+
+class PatientIndex:
+    """患者身份索引
+
+    作为 ReportCache 的附加索引使用。每个规范化姓名记录其下的原始姓名和报告数，
+    片段倒排表只在规范化姓名首次出现或最后一条报告删除时更新。
+
+    匹配得分见 name_similarity；安装 pypinyin 时，拼音三元组 Jaccard 相似度乘以
+    PINYIN_WEIGHT 后取两者较大值。只有与查询共享至少一个片段的姓名参与评分，
+    其他姓名得分为0，因此任意阈值下的匹配结果都可以只从倒排表得到，得分也是对称的。
+    """
+
+    def __init__(self):
+        # 规范化姓名 -> {原始姓名: 报告数}
+        self._names: Dict[str, Dict[str, int]] = {}
+        # 规范化姓名 -> 片段集合
+        self._key_grams: Dict[str, Set[str]] = {}
+        # 规范化姓名 -> (字符片段数, 拼音片段数)
+        self._gram_counts: Dict[str, Tuple[int, int]] = {}
+        # 片段 -> 包含该片段的规范化姓名
+        self._postings: Dict[str, Set[str]] = {}
+
+    def clear(self):
+        self._names = {}
+        self._key_grams = {}
+        self._gram_counts = {}
+        self._postings = {}
+
+    def add(self, report: BloodTestReport):
+        key = normalize_name(report.patient_name)
+        if not key:
+            return
+        names = self._names.get(key)
+        if names is None:
+            names = self._names[key] = {}
+            grams = self._key_grams[key] = _grams(key)
+            char_count = sum(1 for gram in grams if gram[0] == 'c')
+            self._gram_counts[key] = (char_count, len(grams) - char_count)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+        names[report.patient_name] = names.get(report.patient_name, 0) + 1
+
+    def remove(self, report: BloodTestReport):
+        key = normalize_name(report.patient_name)
+        names = self._names.get(key)
+        if names is None or report.patient_name not in names:
+            return
+        names[report.patient_name] -= 1
+        if names[report.patient_name] <= 0:
+            del names[report.patient_name]
+        if names:
+            return
+        del self._names[key]
+        del self._gram_counts[key]
+        for gram in self._key_grams.pop(key):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def _score(self, query_key: str, key: str, query_counts: Tuple[int, int],
+               shared_char: int, shared_phonetic: int) -> float:
+        char_count, phonetic_count = self._gram_counts[key]
+        score = name_similarity(query_key, key, (query_counts[0], char_count), shared_char)
+        if query_counts[1] and shared_phonetic:
+            score = max(score, PINYIN_WEIGHT * _jaccard(query_counts[1], phonetic_count, shared_phonetic))
+        return score
+
+    def match(self, patient_name: str, threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        查找与指定姓名匹配的患者
+
+        只遍历与查询共享片段的规范化姓名，与患者总数无关。
+
+        Args:
+            patient_name: 患者姓名
+            threshold: 最低匹配得分（0-1），为空时使用 DEFAULT_MATCH_THRESHOLD
+
+        Returns:
+            按得分降序排列的 (原始姓名, 得分) 列表；规范化后相同的姓名得分为1
+        """
+        if threshold is None:
+            threshold = DEFAULT_MATCH_THRESHOLD
+        key = normalize_name(patient_name)
+        if not key:
+            return []
+
+        query = _grams(key)
+        char_count = sum(1 for gram in query if gram[0] == 'c')
+        query_counts = (char_count, len(query) - char_count)
+
+        # 统计每个候选与查询共享的字符片段和拼音片段数
+        shared: Dict[str, List[int]] = {}
+        for gram in query:
+            slot = 0 if gram[0] == 'c' else 1
+            for candidate in self._postings.get(gram, ()):
+                counts = shared.get(candidate)
+                if counts is None:
+                    counts = shared[candidate] = [0, 0]
+                counts[slot] += 1
+
+        scored = []
+        for candidate, (shared_char, shared_phonetic) in shared.items():
+            if candidate == key:
+                score = 1.0
+            else:
+                score = self._score(key, candidate, query_counts, shared_char, shared_phonetic)
+            if score >= threshold:
+                scored.append((candidate, score))
+
+        matches = []
+        for candidate, score in sorted(scored, key=lambda pair: (-pair[1], pair[0])):
+            for name in sorted(self._names[candidate]):
+                matches.append((name, round(score, 4)))
+        return matches
@@ -0,0 +1,91 @@
+"""
+跨进程文件锁模块
+多个uvicorn worker共享数据目录时，用建议性文件锁协调写入
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_fd(fd: int, exclusive: bool):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    else:
+        # msvcrt 不区分共享锁，统一按独占锁处理
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class InterProcessLock:
+    """跨进程读写锁
+
+    同一线程内独占锁可重入；进程内的线程之间先通过线程锁排队，
+    再由 flock 在进程之间互斥。
+
+    加锁顺序始终为：ReportCache 的缓存锁 → 本锁 → 存储引擎内部的线程锁。
+    缓存读取时会在缓存锁内重建并通过引擎读取数据（可能取本锁的共享锁），
+    因此写入时同样先取缓存锁再取本锁；引擎内部的线程锁只在持有本锁之后获取。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def _open(self) -> int:
+        return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def exclusive(self):
+        """独占锁，用于写入"""
+        with self._thread_lock:
+            if self._depth == 0:
+                fd = self._open()
+                try:
+                    _lock_fd(fd, exclusive=True)
+                except Exception:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    _unlock_fd(self._fd)
+                    os.close(self._fd)
+                    self._fd = None
+
+    @contextmanager
+    def shared(self):
+        """共享锁，用于需要看到一致数据文件的读取"""
+        with self._thread_lock:
+            if self._depth > 0:
+                # 当前线程已持有独占锁
+                yield
+                return
+            fd = self._open()
+            try:
+                _lock_fd(fd, exclusive=False)
+                try:
+                    yield
+                finally:
+                    _unlock_fd(fd)
+            finally:
+                os.close(fd)
@@ -0,0 +1,279 @@
+"""
+参考范围引擎模块
+按指标、性别、年龄段和单位确定参考范围，并用NumPy一次判定整批数值的状态（正常/偏高/偏低），
+供OCR解析、/api/analyze、历史趋势提醒和批量回填共用
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+import numpy as np
+import pandas as pd
+from models import BloodTestItem
+from indicators import DEMOGRAPHIC_REFERENCE_RANGES, REFERENCE_RANGES
+
+# 判定结果编码
+STATUS_LOW = -1
+STATUS_NORMAL = 0
+STATUS_HIGH = 1
+STATUS_LABELS = {STATUS_LOW: "偏低", STATUS_NORMAL: "正常", STATUS_HIGH: "偏高"}
+# 没有适用的参考范围（如单位无法换算）时的状态
+STATUS_UNKNOWN_LABEL = "未知"
+
+# 年龄未知时按成人处理
+UNKNOWN_AGE = 18.0
+
+# 可换算的单位：(报告中的单位, 参考范围的单位) -> 乘数；单位已按 normalize_unit 规范化
+UNIT_CONVERSIONS = {
+    ('g/dl', 'g/l'): 10.0,
+    ('%', 'l/l'): 0.01,
+    ('10^3/ul', '10^9/l'): 1.0,
+    ('k/ul', '10^9/l'): 1.0,
+    ('10^6/ul', '10^12/l'): 1.0,
+    ('m/ul', '10^12/l'): 1.0,
+}
+
+_SEX_CODES = {'m': 1, 'male': 1, '男': 1, 'f': 2, 'female': 2, '女': 2}
+
+
+class ReferenceRule(NamedTuple):
+    """一条参考范围规则"""
+    name: str  # 标准指标名称
+    sex: Optional[str]  # M / F，None表示不限
+    age_min: Optional[float]  # 最小年龄（岁，含），None表示不限
+    age_max: Optional[float]  # 最大年龄（岁，不含），None表示不限
+    low: float
+    high: float
+    unit: str
+
+    @property
+    def range_text(self) -> str:
+        """参考范围文本，如 3.5-9.5"""
+        return f"{self.low}-{self.high}"
+
+
+class RangeClassification(NamedTuple):
+    """一批数值的判定结果，各数组与输入一一对应"""
+    values: np.ndarray  # 换算到参考范围单位后的数值
+    low: np.ndarray  # 参考下限，没有匹配规则时为NaN
+    high: np.ndarray  # 参考上限
+    codes: np.ndarray  # STATUS_LOW / STATUS_NORMAL / STATUS_HIGH
+    rules: np.ndarray  # 匹配到的规则下标，没有时为-1
+
+
+def _sex_code(sex: Optional[str]) -> int:
+    """性别编码：1 男，2 女，0 未知"""
+    return _SEX_CODES.get(str(sex).strip().lower(), 0) if sex is not None else 0
+
+
+def normalize_sex(sex: Optional[str]) -> Optional[str]:
+    """把 男/女、M/F、male/female 统一为 M / F，无法识别时返回None"""
+    return {1: 'M', 2: 'F'}.get(_sex_code(sex))
+
+
+def normalize_unit(unit: Optional[str]) -> str:
+    """单位规范化：去空格、小写，×10^9/L、x10*9/L 等写法统一为 10^9/l"""
+    unit = (unit or '').strip().lower().replace(' ', '').replace('µ', 'u').replace('μ', 'u')
+    unit = re.sub(r'^[×x*]', '', unit)
+    return re.sub(r'10[*]', '10^', unit)
+
+
+def default_rules() -> List[ReferenceRule]:
+    """内置规则：通用参考范围 + 按性别年龄区分的范围 + REFERENCE_RANGES_FILE 中的补充规则"""
+    rules = [ReferenceRule(name, None, None, None, low, high, unit)
+             for name, (low, high, unit) in REFERENCE_RANGES.items()]
+    rules.extend(ReferenceRule(*row) for row in DEMOGRAPHIC_REFERENCE_RANGES)
+
+    extra_file = os.getenv("REFERENCE_RANGES_FILE")
+    if extra_file:
+        with open(extra_file, 'r', encoding='utf-8') as f:
+            for row in json.load(f):
+                rules.append(ReferenceRule(
+                    row['name'], normalize_sex(row.get('sex')), row.get('age_min'), row.get('age_max'),
+                    row['low'], row['high'], row.get('unit', '')
+                ))
+    return rules
+
+
+class ReferenceRangeEngine:
+    """参考范围引擎
+
+    规则在创建时编译成查找表：按 (指标, 性别, 年龄段) 预先选出最具体的一条规则
+    （性别匹配优先于不限性别，限定年龄段优先于不限年龄），年龄段由所有规则的年龄边界切分。
+    判定时只需对整批数值做一次查表和上下限比较。
+    """
+
+    def __init__(self, rules: Optional[Iterable[ReferenceRule]] = None):
+        self.rules = list(rules) if rules is not None else default_rules()
+
+        self._indicator_index: Dict[str, int] = {}
+        for rule in self.rules:
+            self._indicator_index.setdefault(rule.name, len(self._indicator_index))
+
+        self._rule_indicator = np.array([self._indicator_index[r.name] for r in self.rules], dtype=np.int32)
+        self._rule_sex = np.array([_sex_code(r.sex) for r in self.rules], dtype=np.int8)
+        self._rule_age_min = np.array([-np.inf if r.age_min is None else r.age_min for r in self.rules], dtype=float)
+        self._rule_age_max = np.array([np.inf if r.age_max is None else r.age_max for r in self.rules], dtype=float)
+        self._rule_low = np.array([r.low for r in self.rules], dtype=float)
+        self._rule_high = np.array([r.high for r in self.rules], dtype=float)
+        self._rule_units = [normalize_unit(r.unit) for r in self.rules]
+        self._rule_unit_codes = {unit: code for code, unit in enumerate(dict.fromkeys(self._rule_units))}
+        self._build_lookup()
+
+    def _build_lookup(self):
+        """预先计算 (指标, 性别编码, 年龄段) -> 规则下标 的查找表，没有适用规则时为-1"""
+        self._age_breaks = np.unique(np.concatenate([self._rule_age_min, self._rule_age_max]))
+        self._age_breaks = self._age_breaks[np.isfinite(self._age_breaks)]
+        # 每个年龄段取一个代表年龄：段内任意年龄匹配到的规则相同
+        edges = np.concatenate(([-np.inf], self._age_breaks, [np.inf]))
+        representatives = np.array([lo if np.isfinite(lo) else (hi - 1 if np.isfinite(hi) else 0.0)
+                                    for lo, hi in zip(edges[:-1], edges[1:])])
+
+        # 具体程度：限定性别 2 分，限定年龄段 1 分；+1 使任何匹配都大于0
+        score = ((self._rule_sex != 0) * 2
+                 + ((self._rule_age_min > -np.inf) | (self._rule_age_max < np.inf))
+                 + 1)
+        indicators = np.arange(len(self._indicator_index))[:, None, None, None]
+        sexes = np.arange(3)[None, :, None, None]
+        ages = representatives[None, None, :, None]
+        match = ((self._rule_indicator == indicators)
+                 & ((self._rule_sex == 0) | (self._rule_sex == sexes))
+                 & (self._rule_age_min <= ages) & (ages < self._rule_age_max))
+        scores = np.where(match, score, 0)
+        best = scores.argmax(axis=-1)
+        self._lookup = np.where(np.take_along_axis(scores, best[..., None], -1)[..., 0] > 0, best, -1)
+
+    def fingerprint(self) -> str:
+        """规则内容的哈希，规则变化时识别结果缓存随之失效"""
+        payload = json.dumps([list(rule) for rule in self.rules], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def classify(self, names: Sequence[str], values: Sequence[float],
+                 sexes=None, ages=None, units: Optional[Sequence[str]] = None) -> RangeClassification:
+        """
+        批量判定数值状态
+
+        Args:
+            names: 标准指标名称
+            values: 数值
+            sexes: 性别（单个值或与 names 等长的序列，M/F/男/女，None表示未知）
+            ages: 年龄（岁，单个值或序列，None/NaN表示未知，按成人处理）
+            units: 报告中的单位；与参考范围单位不同且可换算时先换算数值
+
+        Returns:
+            判定结果
+        """
+        count = len(names)
+        values = np.asarray(values, dtype=float)
+        indicators = self._encode(names, lambda name: self._indicator_index.get(name, -1), np.int32)
+        sex_codes = self._encode(sexes, _sex_code, np.int8, count)
+        if ages is None or np.isscalar(ages):
+            age_values = np.full(count, np.nan if ages is None else float(ages))
+        else:
+            try:
+                age_values = np.asarray(ages, dtype=float)
+            except (TypeError, ValueError):
+                # 含None等缺失值
+                age_values = pd.to_numeric(pd.Series(ages, dtype=object), errors='coerce').to_numpy(dtype=float)
+        age_values = np.where(np.isnan(age_values), UNKNOWN_AGE, age_values)
+
+        age_bins = np.searchsorted(self._age_breaks, age_values, side='right')
+        known = indicators >= 0
+        rules = np.where(known, self._lookup[np.where(known, indicators, 0), sex_codes, age_bins], -1)
+
+        matched = rules >= 0
+        safe_rules = np.where(matched, rules, 0)
+        if units is not None:
+            factors = self._unit_factors(units, safe_rules, matched)
+            # 单位无法换算到参考范围的单位时不判定，按没有匹配规则处理
+            matched &= ~np.isnan(factors)
+            rules = np.where(matched, rules, -1)
+            values = np.where(matched & (factors != 1.0), np.round(values * factors, 6), values)
+
+        low = np.where(matched, self._rule_low[safe_rules], np.nan)
+        high = np.where(matched, self._rule_high[safe_rules], np.nan)
+        codes = np.zeros(count, dtype=np.int8)
+        codes[matched & (values < low)] = STATUS_LOW
+        codes[matched & (values > high)] = STATUS_HIGH
+        return RangeClassification(values, low, high, codes, rules)
+
+    @staticmethod
+    def _encode(values, convert, dtype, count: Optional[int] = None) -> np.ndarray:
+        """
+        把名称、性别等离散值转为编码数组：先去重（pandas.factorize），只对不同的值调用 convert
+
+        values 为单个值（或None）时扩展为长度 count 的数组；缺失值按 convert(None) 编码
+        """
+        if values is None or isinstance(values, str):
+            return np.full(count, convert(values), dtype=dtype)
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        lookup = np.array([convert(value) for value in uniques] + [convert(None)], dtype=dtype)
+        return lookup[codes]
+
+    def _unit_factors(self, units: Sequence[str], rules: np.ndarray, matched: np.ndarray) -> np.ndarray:
+        """报告单位换算到规则单位的乘数，单位相同或未知时为1，不可换算时为NaN"""
+        # 只对不同的 (单位, 规则单位) 组合查一次换算表
+        unit_index, unique_units = pd.factorize(pd.Series(units, dtype=object).fillna(''))
+        target_index = np.array([self._rule_unit_codes[unit] for unit in self._rule_units])[rules]
+        targets = list(self._rule_unit_codes)
+        pair_keys = unit_index.astype(np.int64) * len(targets) + target_index
+        pair_index, pairs = pd.factorize(pair_keys)
+        pair_factors = np.ones(len(pairs))
+        for i, pair in enumerate(pairs):
+            unit = normalize_unit(unique_units[pair // len(targets)])
+            target = targets[pair % len(targets)]
+            if unit and target and unit != target:
+                pair_factors[i] = UNIT_CONVERSIONS.get((unit, target), np.nan)
+        return np.where(matched, pair_factors[pair_index], 1.0)
+
+    def rule_for(self, name: str, sex: Optional[str] = None, age: Optional[float] = None) -> Optional[ReferenceRule]:
+        """单个指标适用的规则"""
+        index = int(self.classify([name], [0.0], sex, age).rules[0])
+        return self.rules[index] if index >= 0 else None
+
+    def classify_items(self, items: Sequence[BloodTestItem], sex: Optional[str] = None,
+                       age: Optional[float] = None) -> List[BloodTestItem]:
+        """按患者的性别和年龄重新判定一组检测项目，返回新的项目列表"""
+        return self.build_items([item.name for item in items], [item.value for item in items],
+                                [item.unit for item in items], sex, age)
+
+    def build_items(self, names: Sequence[str], values: Sequence[float], units: Sequence[str],
+                    sex: Optional[str] = None, age: Optional[float] = None) -> List[BloodTestItem]:
+        """
+        由解析出的指标批量创建检测项目
+
+        数值按可换算的单位换算到参考范围的单位，单位统一为参考范围的单位；
+        没有参考范围或单位无法换算的指标保留原数值和单位，不判定（状态为未知，不算异常）。
+        """
+        result = self.classify(names, values, sex, age, units)
+        items = []
+        for i, name in enumerate(names):
+            index = int(result.rules[i])
+            rule = self.rules[index] if index >= 0 else None
+            code = int(result.codes[i])
+            items.append(BloodTestItem(
+                name=name,
+                value=float(result.values[i]),
+                unit=rule.unit if rule is not None and rule.unit else units[i],
+                reference_range=rule.range_text if rule is not None else "",
+                status=STATUS_LABELS[code] if rule is not None else STATUS_UNKNOWN_LABEL,
+                is_abnormal=rule is not None and code != STATUS_NORMAL
+            ))
+        return items
+
+    def describe(self) -> List[Dict]:
+        """全部规则（供接口展示）"""
+        return [rule._asdict() for rule in self.rules]
+
+
+_default_engine: Optional[ReferenceRangeEngine] = None
+
+
+def get_reference_engine() -> ReferenceRangeEngine:
+    """进程内共享的默认引擎"""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = ReferenceRangeEngine()
+    return _default_engine
@@ -0,0 +1,169 @@
+"""
+报告缓存模块
+在进程内缓存已构建的 BloodTestReport 对象，避免每次请求都重新加载数据文件
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from models import BloodTestReport
+from storage_engine import StorageEngine
+
+
+class ReportCache:
+    """报告缓存
+
+    以 id→报告 的字典保存全部报告，并维护按患者、按图片路径的二级映射。
+    本进程的写入会直接更新缓存；其他进程修改数据文件时，
+    通过存储引擎的文件变更标记（mtime/inode/size）发现并整体重建。
+
+    附加索引（需实现 clear/add/remove）随缓存一起重建和增量更新。
+
+    返回的报告对象为缓存中的共享实例，调用方不应修改。
+    """
+
+    def __init__(self, engine: StorageEngine, indexes: Optional[List] = None):
+        self.engine = engine
+        self.indexes = list(indexes or [])
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+        self._reports: Dict[str, BloodTestReport] = {}
+        # 二级映射的值使用dict作为有序集合，保持报告的存储顺序
+        self._by_patient: Dict[str, Dict[str, None]] = {}
+        self._by_image: Dict[str, Dict[str, None]] = {}
+        self._token = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _ensure_fresh(self):
+        """检查缓存是否有效，失效时从存储引擎重建"""
+        token = self.engine.change_token()
+        if self._loaded and token == self._token:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        self._rebuild(token)
+
+    def _rebuild(self, token):
+        """从存储引擎重新加载全部报告"""
+        self._reports = {}
+        self._by_patient = {}
+        self._by_image = {}
+        for index in self.indexes:
+            index.clear()
+        for report_data in self.engine.iter_reports():
+            self._add(BloodTestReport(**report_data))
+        self._token = token
+        self._loaded = True
+        self.reloads += 1
+
+    def _add(self, report: BloodTestReport):
+        # 已存在的键原位替换，保持原有顺序
+        previous = self._reports.get(report.id)
+        if previous is not None:
+            self._unlink(previous)
+        self._reports[report.id] = report
+        self._by_patient.setdefault(report.patient_name, {})[report.id] = None
+        if report.image_path:
+            self._by_image.setdefault(report.image_path, {})[report.id] = None
+        for index in self.indexes:
+            index.add(report)
+
+    def _unlink(self, report: BloodTestReport):
+        """从二级映射和附加索引中移除报告"""
+        for index in self.indexes:
+            index.remove(report)
+        for mapping, key in ((self._by_patient, report.patient_name), (self._by_image, report.image_path)):
+            ids = mapping.get(key)
+            if ids is not None:
+                ids.pop(report.id, None)
+                if not ids:
+                    del mapping[key]
+
+    @contextmanager
+    def writing(self):
+        """包裹一次写入：持有引擎的跨进程写锁，写入前数据已被其他进程修改时，写入后让缓存失效
+
+        产出缓存在写入前是否已过期；未过期时，写入期间缓存和附加索引反映全部数据。
+        先取缓存锁再取跨进程锁，与 reading() 中重建缓存时的顺序一致（见 InterProcessLock）。
+        """
+        with self._lock, self.engine.lock.exclusive():
+            stale = not self._loaded or self.engine.change_token() != self._token
+            yield stale
+            if stale:
+                self._loaded = False
+            else:
+                self._token = self.engine.change_token()
+
+    @contextmanager
+    def reading(self, consistent: bool = False):
+        """在缓存锁内读取，保证附加索引与报告字典一致
+
+        consistent 为True时同时持有引擎的跨进程共享锁，读取期间其他进程不能写入，
+        缓存与存储中的数据保持一致。
+        """
+        with self._lock:
+            if not consistent:
+                self._ensure_fresh()
+                yield self._reports
+                return
+            with self.engine.lock.shared():
+                self._ensure_fresh()
+                yield self._reports
+
+    def put(self, report_dict: Dict):
+        """写入后更新缓存中的报告"""
+        with self._lock:
+            if self._loaded:
+                self._add(BloodTestReport(**report_dict))
+
+    def remove(self, report_id: str):
+        """删除后从缓存中移除报告"""
+        with self._lock:
+            if self._loaded:
+                report = self._reports.pop(report_id, None)
+                if report is not None:
+                    self._unlink(report)
+
+    def get(self, report_id: str) -> Optional[BloodTestReport]:
+        """根据ID获取报告"""
+        with self._lock:
+            self._ensure_fresh()
+            return self._reports.get(report_id)
+
+    def all(self) -> List[BloodTestReport]:
+        """获取所有报告"""
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._reports.values())
+
+    def by_patient(self, patient_name: str) -> List[BloodTestReport]:
+        """根据患者姓名获取报告"""
+        with self._lock:
+            self._ensure_fresh()
+            return [self._reports[i] for i in self._by_patient.get(patient_name, ())]
+
+    def patients(self) -> List[str]:
+        """所有患者姓名"""
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._by_patient)
+
+    def by_image(self, image_path: str) -> List[BloodTestReport]:
+        """获取引用指定图片的报告"""
+        with self._lock:
+            self._ensure_fresh()
+            return [self._reports[i] for i in self._by_image.get(image_path, ())]
+
+    def stats(self) -> Dict[str, int]:
+        """缓存命中统计"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "cached_reports": len(self._reports) if self._loaded else 0
+            }
@@ -0,0 +1,145 @@
+"""
+报告页面读取模块
+单张图片、多页TIFF和PDF统一按页读取为OpenCV图像；过大的照片在解码时即按目标分辨率缩小
+"""
+
+import io
+import os
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # 已列入 requirements.txt；未安装时不支持PDF
+    fitz = None
+
+# PDF渲染分辨率
+PDF_RENDER_DPI = 200
+
+MULTI_PAGE_EXTENSIONS = ('.tif', '.tiff')
+
+# 解码后长边的下限：A4纸长边（11.69英寸）按 PDF_RENDER_DPI 计算，更大的照片在解码时缩小
+TARGET_LONG_SIDE = int(11.69 * PDF_RENDER_DPI)
+
+# 解码时缩小的倍数及对应的 OpenCV 读取模式（JPEG 在 DCT 阶段直接缩小，不解码全分辨率）
+_REDUCED_MODES = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+
+
+PDF_MAGIC = b'%PDF-'
+
+
+def is_pdf(path: str) -> bool:
+    """按文件头判断是否为PDF"""
+    with open(path, 'rb') as f:
+        return f.read(len(PDF_MAGIC)) == PDF_MAGIC
+
+
+def is_pdf_data(data: bytes) -> bool:
+    """按内存中的文件头判断是否为PDF"""
+    return data[:len(PDF_MAGIC)] == PDF_MAGIC
+
+
+def _require_fitz():
+    if fitz is None:
+        raise ValueError("识别PDF需要安装 PyMuPDF（pip install pymupdf）")
+
+
+def _reduce_factor(long_side: int) -> int:
+    """缩小后长边仍不小于 TARGET_LONG_SIDE 的最大倍数"""
+    return next((factor for factor in _REDUCED_MODES if long_side // factor >= TARGET_LONG_SIDE), 1)
+
+
+def reduced_read_mode(size: Optional[Tuple[int, int]]) -> int:
+    """
+    按图像尺寸选择解码时缩小的读取模式
+
+    Args:
+        size: (宽, 高)，未知时为None
+
+    Returns:
+        cv2.imread / cv2.imdecode 的读取模式
+    """
+    factor = _reduce_factor(max(size)) if size else 1
+    return _REDUCED_MODES.get(factor, cv2.IMREAD_COLOR)
+
+
+def _image_size(source) -> Optional[Tuple[int, int]]:
+    """只读取文件头获取图像尺寸，无法识别时返回None"""
+    try:
+        with Image.open(source) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def _reduce(image: np.ndarray) -> np.ndarray:
+    """已解码的图像（如多页TIFF的某一页）按与解码时相同的规则缩小"""
+    factor = _reduce_factor(max(image.shape[:2]))
+    if factor == 1:
+        return image
+    return cv2.resize(image, (image.shape[1] // factor, image.shape[0] // factor), interpolation=cv2.INTER_AREA)
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """
+    从内存中的上传数据解码第一页为BGR图像，不经过磁盘
+
+    Args:
+        data: 图片文件内容（PDF除外）
+
+    Returns:
+        BGR图像，过大的照片已缩小
+    """
+    mode = reduced_read_mode(_image_size(io.BytesIO(data)))
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), mode)
+    if image is None:
+        raise ValueError("无法读取图像文件")
+    return image
+
+
+def count_pages(path: str) -> int:
+    """文件包含的页数，普通图片为1"""
+    if is_pdf(path):
+        _require_fitz()
+        with fitz.open(path) as document:
+            return document.page_count
+    if os.path.splitext(path)[1].lower() in MULTI_PAGE_EXTENSIONS:
+        # 只读取各页的目录项，不解码页面
+        try:
+            with Image.open(path) as image:
+                return getattr(image, 'n_frames', 1)
+        except Exception:
+            raise ValueError("无法读取图像文件")
+    return 1
+
+
+def _load_frame(path: str, page: int) -> Optional[np.ndarray]:
+    """用PIL定位并只解码多页图片的指定页，页码超出范围时返回None"""
+    try:
+        with Image.open(path) as image:
+            image.seek(page)
+            frame = np.asarray(image.convert('RGB'))
+    except Exception:  # 页码超出范围（EOFError）或无法解码
+        return None
+    return _reduce(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+
+def load_page(path: str, page: int = 0) -> np.ndarray:
+    """读取指定页为BGR图像"""
+    if is_pdf(path):
+        _require_fitz()
+        with fitz.open(path) as document:
+            pixmap = document[page].get_pixmap(dpi=PDF_RENDER_DPI)
+            image = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+            return cv2.cvtColor(image, cv2.COLOR_RGBA2BGR if pixmap.n == 4 else cv2.COLOR_RGB2BGR)
+
+    if page == 0:
+        image = cv2.imread(path, reduced_read_mode(_image_size(path)))
+    else:
+        image = _load_frame(path, page)
+    if image is None:
+        raise ValueError("无法读取图像文件")
+    return image
+
@@ -0,0 +1,155 @@
+"""
+报告统计模块
+随报告写入和删除增量维护统计信息，/api/statistics 无需遍历全部报告
+"""
+
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from models import BloodTestReport
+
+
+class StatisticsAggregator:
+    """增量统计
+
+    作为 ReportCache 的附加索引使用，维护报告总数、患者数、日期范围、
+    异常项目数，以及按指标的异常计数和按医院的报告数。
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.total_reports = 0
+        self.abnormal_count = 0
+        self._patients: Counter = Counter()
+        self._hospitals: Counter = Counter()
+        self._abnormal_by_indicator: Counter = Counter()
+        self._dates: Counter = Counter()
+        self._min_date: Optional[datetime] = None
+        self._max_date: Optional[datetime] = None
+        self._date_bounds_dirty = False
+
+    def add(self, report: BloodTestReport):
+        self.total_reports += 1
+        self._patients[report.patient_name] += 1
+        self._hospitals[report.hospital] += 1
+
+        for item in report.items:
+            if item.is_abnormal:
+                self.abnormal_count += 1
+                self._abnormal_by_indicator[item.name] += 1
+
+        self._dates[report.test_date] += 1
+        if not self._date_bounds_dirty:
+            if self._min_date is None or report.test_date < self._min_date:
+                self._min_date = report.test_date
+            if self._max_date is None or report.test_date > self._max_date:
+                self._max_date = report.test_date
+
+    def remove(self, report: BloodTestReport):
+        self.total_reports -= 1
+        _decrement(self._patients, report.patient_name)
+        _decrement(self._hospitals, report.hospital)
+
+        for item in report.items:
+            if item.is_abnormal:
+                self.abnormal_count -= 1
+                _decrement(self._abnormal_by_indicator, item.name)
+
+        _decrement(self._dates, report.test_date)
+        # 删除的恰好是边界日期时，下次读取再重新计算
+        if report.test_date not in self._dates and report.test_date in (self._min_date, self._max_date):
+            self._date_bounds_dirty = True
+
+    def _refresh_date_bounds(self):
+        if self._date_bounds_dirty:
+            self._min_date = min(self._dates) if self._dates else None
+            self._max_date = max(self._dates) if self._dates else None
+            self._date_bounds_dirty = False
+
+    def summary(self) -> Dict[str, any]:
+        """当前统计信息"""
+        if not self.total_reports:
+            return {
+                "total_reports": 0,
+                "total_patients": 0,
+                "date_range": None,
+                "abnormal_count": 0,
+                "abnormal_by_indicator": {},
+                "reports_by_hospital": {}
+            }
+
+        self._refresh_date_bounds()
+        date_range = None
+        if self._min_date is not None:
+            date_range = {
+                "start": self._min_date.isoformat(),
+                "end": self._max_date.isoformat()
+            }
+
+        return {
+            "total_reports": self.total_reports,
+            "total_patients": len(self._patients),
+            "date_range": date_range,
+            "abnormal_count": self.abnormal_count,
+            "abnormal_by_indicator": dict(self._abnormal_by_indicator.most_common()),
+            "reports_by_hospital": dict(self._hospitals.most_common())
+        }
+
+
+def _decrement(counter: Counter, key):
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+
+def compute_statistics(reports: Iterable[BloodTestReport]) -> Dict[str, any]:
+    """从头计算统计信息，用于校验增量统计"""
+    aggregator = StatisticsAggregator()
+    for report in reports:
+        aggregator.add(report)
+    return aggregator.summary()
+
+
+def find_drift(expected: Dict[str, any], actual: Dict[str, any]) -> Dict[str, Dict[str, any]]:
+    """
+    比较两份统计信息
+
+    Args:
+        expected: 从头计算的统计信息
+        actual: 增量维护的统计信息
+
+    Returns:
+        存在差异的字段 -> {"expected": ..., "actual": ...}
+    """
+    drift = {}
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            drift[key] = {"expected": expected.get(key), "actual": actual.get(key)}
+    return drift
+
+
+if __name__ == "__main__":
+    # 一致性检查：python report_statistics.py [API地址]
+    # 校验的是运行中服务进程内的增量统计（多worker部署时为处理该请求的worker）
+    import requests
+
+    base_url = (sys.argv[1] if len(sys.argv) > 1 else os.getenv("API_URL", "http://localhost:8000")).rstrip("/")
+    try:
+        response = requests.get(f"{base_url}/api/statistics/check", timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"❌ 无法连接服务: {e}")
+        sys.exit(2)
+
+    drift = response.json()["drift"]
+    if drift:
+        print(f"❌ 统计信息存在偏差（{len(drift)}项）:")
+        for key, values in drift.items():
+            print(f"  {key}: 期望 {values['expected']}，实际 {values['actual']}")
+        sys.exit(1)
+
+    print("✅ 统计信息一致")
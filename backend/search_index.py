@@ -0,0 +1,152 @@
+"""
+报告全文索引模块
+对患者姓名、医院名称和备注建立倒排索引，中文按字符二元组切分，英文和数字按单词切分
+"""
+
+import bisect
+import math
+import re
+from typing import Dict, List, Set, Tuple
+from models import BloodTestReport
+
+# 中文连续片段与英文/数字单词
+_TOKEN_PATTERN = re.compile(r'([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)|([a-z0-9]+)')
+
+# 各字段命中时的权重
+FIELD_WEIGHTS = {
+    'patient_name': 3.0,
+    'hospital': 2.0,
+    'notes': 1.0
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    将文本切分为索引词
+
+    中文片段切分为相邻字符二元组，片段末字额外作为单字词，
+    这样单字查询可以通过前缀匹配命中任意位置的字；英文和数字按单词切分并转为小写。
+
+    Args:
+        text: 待切分的文本
+
+    Returns:
+        索引词列表（可能包含重复）
+    """
+    if not text:
+        return []
+
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        if match.group(2):
+            tokens.append(match.group(2))
+            continue
+        run = match.group(1)
+        for i in range(len(run) - 1):
+            tokens.append(run[i:i + 2])
+        tokens.append(run[-1])
+    return tokens
+
+
+class InvertedIndex:
+    """报告倒排索引
+
+    随报告写入和删除增量维护，查询只访问命中词的倒排表，
+    与报告总数无关。每个查询词按前缀匹配索引词，多个查询词之间为"与"关系，
+    结果按字段权重和逆文档频率打分排序。
+    """
+
+    def __init__(self):
+        # 索引词 -> {报告ID: 加权词频}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # 报告ID -> 该报告包含的索引词，用于删除
+        self._doc_terms: Dict[str, Set[str]] = {}
+        # 有序词表，用于前缀查询
+        self._vocabulary: List[str] = []
+
+    def clear(self):
+        self._postings = {}
+        self._doc_terms = {}
+        self._vocabulary = []
+
+    def add(self, report: BloodTestReport):
+        """索引一条报告"""
+        weights: Dict[str, float] = {}
+        for field, field_weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(report, field)):
+                weights[token] = weights.get(token, 0.0) + field_weight
+
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocabulary, token)
+            postings[report.id] = weight
+        self._doc_terms[report.id] = set(weights)
+
+    def remove(self, report: BloodTestReport):
+        """从索引中移除报告"""
+        for token in self._doc_terms.pop(report.id, ()):
+            postings = self._postings[token]
+            postings.pop(report.id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                del self._vocabulary[index]
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """查找以指定前缀开头的所有索引词"""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        """
+        搜索报告
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            按得分降序排列的 (报告ID, 得分) 列表
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+
+        total_docs = max(len(self._doc_terms), 1)
+        scores: Dict[str, float] = None
+
+        # 先处理候选最少的查询词，尽早缩小结果集
+        token_matches = []
+        for token in query_tokens:
+            matches: Dict[str, float] = {}
+            for term in self._expand_prefix(token):
+                postings = self._postings[term]
+                idf = math.log(1 + total_docs / len(postings))
+                for report_id, weight in postings.items():
+                    score = weight * idf
+                    if score > matches.get(report_id, 0.0):
+                        matches[report_id] = score
+            if not matches:
+                return []
+            token_matches.append(matches)
+
+        token_matches.sort(key=len)
+        for matches in token_matches:
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {
+                    report_id: score + matches[report_id]
+                    for report_id, score in scores.items()
+                    if report_id in matches
+                }
+            if not scores:
+                return []
+
+        return sorted(scores.items(), key=lambda pair: -pair[1])
@@ -0,0 +1,685 @@
+"""
+报告存储引擎模块
+BloodTestStorageService 通过存储引擎读写报告数据，引擎之间可以互相替换
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from models import BloodTestReport
+from process_lock import InterProcessLock
+from utils import parse_iso_datetime, to_naive_local
+
+
+class StorageEngine:
+    """报告存储引擎基类
+
+    引擎只处理已序列化的报告字典（datetime 字段为 ISO 字符串）。
+    按ID、患者、日期和关键字的查询由 ReportCache 的索引完成，引擎只负责逐条读取和写入；
+    人群统计的 iter_indicator_rows 提供基于全量扫描的默认实现，子类可按需覆盖。
+    子类需提供跨进程写锁 lock（InterProcessLock），写入方法在锁内完成。
+    """
+
+    name = "base"
+    lock: InterProcessLock = None
+
+    def data_files(self) -> List[str]:
+        """引擎使用的数据文件，用于检测其他进程的修改"""
+        return []
+
+    def change_token(self) -> tuple:
+        """数据文件的变更标记（inode、mtime、size），任一文件变化时标记随之变化"""
+        token = []
+        for path in self.data_files():
+            try:
+                st = os.stat(path)
+                token.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                token.append(None)
+        return tuple(token)
+
+    def iter_reports(self) -> Iterator[Dict]:
+        """逐条返回所有报告"""
+        raise NotImplementedError
+
+    def load_reports(self) -> List[Dict]:
+        """加载所有报告"""
+        return list(self.iter_reports())
+
+    def iter_indicator_rows(self, indicator: str, start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None, hospital: Optional[str] = None,
+                            sex: Optional[str] = None, batch_size: int = 5000) -> Iterator[List[Tuple]]:
+        """
+        逐批返回指定指标的数值行，用于人群统计（不构建报告对象）
+
+        每份报告只取该指标第一次出现的项目。
+
+        Args:
+            indicator: 指标名称
+            start_date: 检测日期下界（含）
+            end_date: 检测日期上界（含）
+            hospital: 只统计该医院的报告
+            sex: 只统计该性别（M/F）的报告
+            batch_size: 每批行数
+
+        Returns:
+            (数值, 是否异常, 医院, 检测日期ISO字符串, 性别) 的列表的迭代器
+        """
+        batch = []
+        for report_data in self.iter_reports():
+            if hospital is not None and report_data.get('hospital') != hospital:
+                continue
+            if sex is not None and report_data.get('sex') != sex:
+                continue
+            if start_date is not None or end_date is not None:
+                try:
+                    test_date = to_naive_local(parse_iso_datetime(report_data.get('test_date') or ''))
+                except ValueError:
+                    continue
+                if (start_date is not None and test_date < start_date) or (end_date is not None and test_date > end_date):
+                    continue
+            for item in report_data.get('items', []):
+                if item.get('name') == indicator:
+                    batch.append((item.get('value'), bool(item.get('is_abnormal')), report_data.get('hospital'),
+                                  report_data.get('test_date'), report_data.get('sex')))
+                    break
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def save_report(self, report_dict: Dict):
+        """新增或更新报告"""
+        raise NotImplementedError
+
+    def save_reports(self, report_dicts: List[Dict]):
+        """在一次提交中新增或更新多条报告"""
+        raise NotImplementedError
+
+    def delete_report(self, report_id: str) -> bool:
+        """删除报告"""
+        raise NotImplementedError
+
+class JSONStorageEngine(StorageEngine):
+    """单个JSON文件存储引擎（每次写入重写整个文件）"""
+
+    name = "json"
+
+    def __init__(self, reports_file: str):
+        self.reports_file = reports_file
+        self.lock = InterProcessLock(reports_file + ".lock")
+
+        # 初始化数据文件
+        with self.lock.exclusive():
+            if not os.path.exists(self.reports_file):
+                self._save_reports([])
+
+    def data_files(self) -> List[str]:
+        return [self.reports_file]
+
+    def iter_reports(self) -> Iterator[Dict]:
+        return iter(self._load_reports())
+
+    def load_reports(self) -> List[Dict]:
+        return self._load_reports()
+
+    def save_report(self, report_dict: Dict):
+        self.save_reports([report_dict])
+
+    def save_reports(self, report_dicts: List[Dict]):
+        # 读-改-写期间持有独占锁，避免多进程并发写入丢失数据
+        with self.lock.exclusive():
+            reports = self._load_reports()
+            positions = {report.get('id'): i for i, report in enumerate(reports)}
+
+            # 已存在的（根据ID）原位替换，其余追加
+            for report_dict in report_dicts:
+                position = positions.get(report_dict['id'])
+                if position is not None:
+                    reports[position] = report_dict
+                else:
+                    positions[report_dict['id']] = len(reports)
+                    reports.append(report_dict)
+
+            self._save_reports(reports)
+
+    def delete_report(self, report_id: str) -> bool:
+        with self.lock.exclusive():
+            reports = self._load_reports()
+            original_count = len(reports)
+
+            # 过滤掉要删除的报告
+            reports = [r for r in reports if r.get('id') != report_id]
+
+            if len(reports) < original_count:
+                self._save_reports(reports)
+                return True
+
+            return False
+
+    def _load_reports(self) -> List[Dict]:
+        """加载报告数据"""
+        try:
+            with open(self.reports_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _save_reports(self, reports: List[Dict]):
+        """保存报告数据（临时文件+原子替换，读取方不会看到写了一半的文件）"""
+        _atomic_write_json(self.reports_file, reports, indent=2)
+
+
+class SQLiteStorageEngine(StorageEngine):
+    """SQLite存储引擎
+
+    报告主表按 id、patient_name、test_date 建立索引，检测项目存放在子表中，
+    单次写入只涉及一条报告，与已有数据量无关。
+    """
+
+    name = "sqlite"
+
+    REPORT_COLUMNS = (
+        'id', 'patient_name', 'test_date', 'hospital',
+        'image_path', 'notes', 'created_at', 'updated_at', 'ocr_info', 'sex', 'age'
+    )
+    # 以JSON文本保存的列
+    JSON_COLUMNS = ('ocr_info',)
+    # 非TEXT类型的列（迁移旧库时按此类型补列）
+    COLUMN_TYPES = {'age': 'REAL'}
+    # 以不带时区的本地ISO字符串保存的日期列
+    DATE_COLUMNS = ('test_date', 'created_at', 'updated_at')
+    ITEM_COLUMNS = ('name', 'value', 'unit', 'reference_range', 'status', 'is_abnormal')
+
+    def __init__(self, db_path: str, legacy_json_file: Optional[str] = None):
+        self.db_path = db_path
+        self.lock = InterProcessLock(db_path + ".lock")
+        self._local = threading.local()
+
+        with self.lock.exclusive():
+            self._init_schema()
+
+            # 首次启动时从旧的JSON文件迁移数据
+            if legacy_json_file:
+                self._migrate_from_json(legacy_json_file)
+            self._normalize_dates()
+
+    def data_files(self) -> List[str]:
+        # WAL模式下提交先写入-wal文件
+        return [self.db_path, self.db_path + "-wal"]
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 自动提交模式，写事务由 _transaction 显式开启
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 立即获取写锁，避免多进程下事务升级失败"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _init_schema(self):
+        """创建数据表和索引"""
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reports (
+                id TEXT PRIMARY KEY,
+                patient_name TEXT NOT NULL,
+                test_date TEXT NOT NULL,
+                hospital TEXT NOT NULL,
+                image_path TEXT,
+                notes TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                ocr_info TEXT,
+                sex TEXT,
+                age REAL
+            );
+            CREATE TABLE IF NOT EXISTS report_items (
+                report_id TEXT NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                value REAL NOT NULL,
+                unit TEXT,
+                reference_range TEXT,
+                status TEXT,
+                is_abnormal INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (report_id, position)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_reports_patient_name ON reports(patient_name);
+            CREATE INDEX IF NOT EXISTS idx_reports_test_date ON reports(test_date);
+            CREATE INDEX IF NOT EXISTS idx_report_items_name ON report_items(name);
+        """)
+
+        # 旧版数据库补充后来新增的列
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(reports)")}
+        for column in self.REPORT_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE reports ADD COLUMN {column} {self.COLUMN_TYPES.get(column, 'TEXT')}")
+
+    def _migrate_from_json(self, json_file: str):
+        """一次性导入旧版JSON数据文件"""
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+
+        reports = []
+        if os.path.exists(json_file):
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    reports = json.load(f)
+            except json.JSONDecodeError:
+                print(f"⚠️ 无法解析旧数据文件 {json_file}，跳过迁移")
+                reports = []
+
+        # 旧记录按报告模型校验后再写入，日期统一为不带时区的本地时间，与服务写入的数据一致
+        migrated = []
+        for record in reports:
+            try:
+                report_dict = BloodTestReport.model_validate(record).model_dump(mode="json")
+                if not report_dict.get('id'):
+                    raise ValueError("缺少报告ID")
+                migrated.append(report_dict)
+            except Exception as e:
+                print(f"⚠️ 跳过无法迁移的报告 {record.get('id') if isinstance(record, dict) else record!r}: {e}")
+
+        with self._transaction():
+            for report_dict in migrated:
+                self._write_report(conn, report_dict)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                (datetime.now().isoformat(),)
+            )
+
+        if migrated:
+            print(f"✅ 已从 {json_file} 迁移 {len(migrated)} 条报告到SQLite")
+
+    def _normalize_dates(self):
+        """一次性把早期迁移留下的原始日期文本统一为不带时区的本地ISO时间
+
+        test_date 在SQL中按字符串比较，只有与服务写入的格式一致时，
+        日期过滤的结果才与其他引擎相同。无法解析的值保持原样。
+        """
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'dates_normalized'").fetchone():
+            return
+
+        updated = 0
+        with self._transaction():
+            rows = conn.execute(
+                f"SELECT id, {', '.join(self.DATE_COLUMNS)} FROM reports"
+            ).fetchall()
+            for row in rows:
+                values = {}
+                for column in self.DATE_COLUMNS:
+                    if not row[column]:
+                        continue
+                    try:
+                        normalized = to_naive_local(parse_iso_datetime(row[column])).isoformat()
+                    except ValueError:
+                        continue
+                    if normalized != row[column]:
+                        values[column] = normalized
+                if values:
+                    conn.execute(
+                        f"UPDATE reports SET {', '.join(f'{column} = ?' for column in values)} WHERE id = ?",
+                        (*values.values(), row['id'])
+                    )
+                    updated += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('dates_normalized', ?)",
+                (datetime.now().isoformat(),)
+            )
+
+        if updated:
+            print(f"✅ 已统一 {updated} 条报告的日期格式")
+
+    def _write_report(self, conn: sqlite3.Connection, report_dict: Dict):
+        """在当前事务中写入一条报告及其检测项目"""
+        conn.execute(
+            f"INSERT OR REPLACE INTO reports ({', '.join(self.REPORT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(self.REPORT_COLUMNS))})",
+            tuple(
+                json.dumps(report_dict.get(column), ensure_ascii=False)
+                if column in self.JSON_COLUMNS and report_dict.get(column) is not None
+                else report_dict.get(column)
+                for column in self.REPORT_COLUMNS
+            )
+        )
+        conn.execute("DELETE FROM report_items WHERE report_id = ?", (report_dict['id'],))
+        conn.executemany(
+            "INSERT INTO report_items (report_id, position, name, value, unit, reference_range, status, is_abnormal) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    report_dict['id'], position, item.get('name'), item.get('value'),
+                    item.get('unit'), item.get('reference_range'), item.get('status'),
+                    1 if item.get('is_abnormal') else 0
+                )
+                for position, item in enumerate(report_dict.get('items', []))
+            ]
+        )
+
+    def _build_reports(self, rows: List[sqlite3.Row]) -> List[Dict]:
+        """将报告行与检测项目组装成报告字典"""
+        if not rows:
+            return []
+
+        reports = {}
+        for row in rows:
+            report_dict = {column: row[column] for column in self.REPORT_COLUMNS}
+            for column in self.JSON_COLUMNS:
+                if report_dict[column] is not None:
+                    report_dict[column] = json.loads(report_dict[column])
+            report_dict['items'] = []
+            reports[row['id']] = report_dict
+
+        conn = self._connect()
+        report_ids = list(reports.keys())
+        # 分批查询，避免超过SQLite参数数量上限
+        for start in range(0, len(report_ids), 500):
+            batch = report_ids[start:start + 500]
+            item_rows = conn.execute(
+                f"SELECT * FROM report_items WHERE report_id IN ({', '.join('?' * len(batch))}) "
+                f"ORDER BY report_id, position",
+                batch
+            ).fetchall()
+            for item_row in item_rows:
+                item = {column: item_row[column] for column in self.ITEM_COLUMNS}
+                item['is_abnormal'] = bool(item['is_abnormal'])
+                reports[item_row['report_id']]['items'].append(item)
+
+        return list(reports.values())
+
+    def iter_reports(self, batch_size: int = 200) -> Iterator[Dict]:
+        # 按rowid分批查询，每批重新获取连接，生成器可以跨线程逐步消费
+        last_rowid = 0
+        while True:
+            rows = self._connect().execute(
+                "SELECT rowid AS _rowid, * FROM reports WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1]['_rowid']
+            for report_dict in self._build_reports(rows):
+                yield report_dict
+
+    def iter_indicator_rows(self, indicator: str, start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None, hospital: Optional[str] = None,
+                            sex: Optional[str] = None, batch_size: int = 5000) -> Iterator[List[Tuple]]:
+        # 过滤在SQL中完成（test_date 统一为不带时区的本地ISO字符串，字典序与时间顺序一致）；
+        # SQLite 的 MIN() 聚合让同一行的其他列取自 position 最小的项目
+        conditions = ["i.name = ?"]
+        params = [indicator]
+        for clause, value in (("r.test_date >= ?", start_date.isoformat() if start_date else None),
+                              ("r.test_date <= ?", end_date.isoformat() if end_date else None),
+                              ("r.hospital = ?", hospital),
+                              ("r.sex = ?", sex)):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        cursor = self._connect().execute(
+            "SELECT MIN(i.position), i.value, i.is_abnormal, r.hospital, r.test_date, r.sex "
+            "FROM report_items i JOIN reports r ON r.id = i.report_id "
+            f"WHERE {' AND '.join(conditions)} GROUP BY i.report_id",
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(row[1], bool(row[2]), row[3], row[4], row[5]) for row in rows]
+
+    def save_report(self, report_dict: Dict):
+        with self.lock.exclusive(), self._transaction() as conn:
+            self._write_report(conn, report_dict)
+
+    def save_reports(self, report_dicts: List[Dict]):
+        with self.lock.exclusive(), self._transaction() as conn:
+            for report_dict in report_dicts:
+                self._write_report(conn, report_dict)
+
+    def delete_report(self, report_id: str) -> bool:
+        with self.lock.exclusive(), self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+        return cursor.rowcount > 0
+
+class JournalStorageEngine(StorageEngine):
+    """追加写日志存储引擎
+
+    每次写入只向日志文件追加一行紧凑JSON（upsert或删除墓碑）并fsync，
+    后台压缩线程在日志超过阈值后将其合并进快照文件。
+    启动时先加载快照再重放日志重建内存状态。
+
+    多进程共享时，写入前在独占锁下追上其他进程追加的日志；
+    日志或快照被其他进程压缩替换（inode变化）后整体重新加载。
+    """
+
+    name = "journal"
+
+    def __init__(self, snapshot_file: str, compact_threshold: int = 4 * 1024 * 1024):
+        self.snapshot_file = snapshot_file
+        self.journal_file = os.path.splitext(snapshot_file)[0] + ".journal"
+        self.compact_threshold = compact_threshold
+        self.lock = InterProcessLock(self.journal_file + ".lock")
+
+        self._reports: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+        self._journal = None
+        self._journal_ino = None
+        self._snapshot_ino = None
+        self._offset = 0
+
+        with self.lock.exclusive(), self._lock:
+            self._reload(repair=True)
+
+        # 后台压缩线程
+        self._compact_event = threading.Event()
+        self._closed = False
+        self._compactor = threading.Thread(
+            target=self._compact_loop, name="journal-compactor", daemon=True
+        )
+        self._compactor.start()
+
+    def data_files(self) -> List[str]:
+        return [self.snapshot_file, self.journal_file]
+
+    def _reload(self, repair: bool = False):
+        """加载快照并按顺序重放日志"""
+        self._reports = {}
+        self._snapshot_ino = None
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                self._snapshot_ino = os.fstat(f.fileno()).st_ino
+                for report_dict in json.load(f):
+                    self._reports[report_dict['id']] = report_dict
+        except FileNotFoundError:
+            pass
+
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_file, 'ab')
+        self._journal_ino = os.fstat(self._journal.fileno()).st_ino
+        self._offset = self._replay_journal(0, repair)
+
+    def _replay_journal(self, offset: int, repair: bool) -> int:
+        """从offset开始重放日志，返回已完整应用的位置
+
+        末尾不完整的行可能是其他进程正在写入的内容，只有持有独占锁时
+        （repair=True）才视为崩溃残留并截断。
+        """
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            for raw_line in f:
+                if not raw_line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(raw_line)
+                except json.JSONDecodeError:
+                    break
+                self._apply(entry)
+                offset += len(raw_line)
+
+        if repair and offset < os.path.getsize(self.journal_file):
+            print(f"⚠️ 日志文件 {self.journal_file} 末尾不完整，已截断到 {offset} 字节")
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(offset)
+        return offset
+
+    def _sync(self, repair: bool = False):
+        """追上其他进程的写入，调用方需持有进程锁"""
+        try:
+            journal_stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            journal_stat = None
+        try:
+            snapshot_ino = os.stat(self.snapshot_file).st_ino
+        except FileNotFoundError:
+            snapshot_ino = None
+
+        if (journal_stat is None
+                or journal_stat.st_ino != self._journal_ino
+                or snapshot_ino != self._snapshot_ino
+                or journal_stat.st_size < self._offset):
+            self._reload(repair)
+        elif journal_stat.st_size > self._offset or repair:
+            self._offset = self._replay_journal(self._offset, repair)
+
+    def _apply(self, entry: Dict):
+        """将一条日志记录应用到内存状态"""
+        if entry['op'] == 'upsert':
+            report_dict = entry['report']
+            self._reports[report_dict['id']] = report_dict
+        elif entry['op'] == 'upsert_many':
+            for report_dict in entry['reports']:
+                self._reports[report_dict['id']] = report_dict
+        elif entry['op'] == 'delete':
+            self._reports.pop(entry['id'], None)
+
+    def _append(self, entry: Dict):
+        """追加一条日志记录并落盘"""
+        line = (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        self._journal.write(line)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._offset += len(line)
+
+        if self._offset >= self.compact_threshold:
+            self._compact_event.set()
+
+    def iter_reports(self) -> Iterator[Dict]:
+        with self.lock.shared(), self._lock:
+            self._sync()
+            reports = list(self._reports.values())
+        return iter(reports)
+
+    def save_report(self, report_dict: Dict):
+        with self.lock.exclusive(), self._lock:
+            self._sync(repair=True)
+            self._append({'op': 'upsert', 'report': report_dict})
+            self._reports[report_dict['id']] = report_dict
+
+    def save_reports(self, report_dicts: List[Dict]):
+        # 整批写成一行日志，崩溃时要么全部重放、要么整行被截断
+        with self.lock.exclusive(), self._lock:
+            self._sync(repair=True)
+            self._append({'op': 'upsert_many', 'reports': report_dicts})
+            for report_dict in report_dicts:
+                self._reports[report_dict['id']] = report_dict
+
+    def delete_report(self, report_id: str) -> bool:
+        with self.lock.exclusive(), self._lock:
+            self._sync(repair=True)
+            if report_id not in self._reports:
+                return False
+            self._append({'op': 'delete', 'id': report_id})
+            del self._reports[report_id]
+            return True
+
+    def compact(self):
+        """将日志合并进快照"""
+        with self.lock.exclusive(), self._lock:
+            self._sync(repair=True)
+            if self._offset == 0:
+                return
+
+            # 先写快照再替换为空日志；两步之间崩溃时重放旧日志结果不变
+            _atomic_write_json(self.snapshot_file, list(self._reports.values()))
+            _atomic_write_json(self.journal_file, None)
+            self._reload()
+
+    def _compact_loop(self):
+        """后台压缩线程"""
+        while True:
+            self._compact_event.wait()
+            self._compact_event.clear()
+            if self._closed:
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"❌ 日志压缩失败: {str(e)}")
+
+    def close(self):
+        """停止后台压缩并关闭日志文件"""
+        self._closed = True
+        self._compact_event.set()
+        self._compactor.join()
+        with self._lock:
+            self._journal.close()
+
+
+def _atomic_write_json(path: str, data, indent: Optional[int] = None):
+    """写入临时文件并fsync后原子替换目标文件，data为None时写入空文件"""
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        if data is not None:
+            if indent is None:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            else:
+                json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def create_storage_engine(engine_name: str, data_dir: str) -> StorageEngine:
+    """根据名称创建存储引擎"""
+    reports_file = os.path.join(data_dir, "blood_test_reports.json")
+
+    if engine_name == "json":
+        return JSONStorageEngine(reports_file)
+    if engine_name == "sqlite":
+        return SQLiteStorageEngine(
+            os.path.join(data_dir, "blood_test_reports.db"),
+            legacy_json_file=reports_file
+        )
+    if engine_name == "journal":
+        compact_threshold = int(os.getenv("JOURNAL_COMPACT_BYTES", 4 * 1024 * 1024))
+        return JournalStorageEngine(reports_file, compact_threshold=compact_threshold)
+
+    raise ValueError(f"未知的存储引擎: {engine_name}")
@@ -1,15 +1,31 @@
-import json
+import heapq
 import os
 from datetime import datetime
-from typing import List, Optional, Dict
-from models import BloodTestReport, BloodTestItem
-from utils import parse_iso_datetime
+from typing import Iterable, Iterator, List, Optional, Dict, Tuple
+from models import BloodTestReport, BloodTestItem, ReportPage
+from storage_engine import StorageEngine, create_storage_engine
+from report_cache import ReportCache
+from search_index import InvertedIndex
+from date_index import DateIndex
+from patient_index import PatientIndex
+from comparison_store import ComparisonStore
+from image_store import ImageStore, ImageWriter, StoredImage
+from timeseries_store import IndicatorTimeSeriesStore, PatientSeries
+from trend_engine import fit_patients
+from cohort_stats import CohortAggregator
+from indicators import INDICATOR_NAMES
+from reference_ranges import STATUS_LABELS, STATUS_NORMAL
+from report_statistics import StatisticsAggregator, compute_statistics, find_drift
+from utils import parse_iso_datetime, to_naive_local, encode_cursor, decode_cursor
 import uuid
 
+# 报告列表支持的排序字段
+REPORT_SORT_FIELDS = ('test_date', 'created_at')
+
 class BloodTestStorageService:
     """血常规报告存储服务"""
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", engine: Optional[str] = None):
         self.data_dir = data_dir
         self.reports_file = os.path.join(data_dir, "blood_test_reports.json")
         self.images_dir = os.path.join(data_dir, "images")
@@ -18,17 +34,101 @@ class BloodTestStorageService:
         os.makedirs(data_dir, exist_ok=True)
         os.makedirs(self.images_dir, exist_ok=True)
         
-        # 初始化数据文件
-        self._init_data_file()
-    
-    def _init_data_file(self):
-        """初始化数据文件"""
-        if not os.path.exists(self.reports_file):
-            with open(self.reports_file, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
+        # 内容寻址的图片存储
+        self.image_store = ImageStore(self.images_dir)
+        
+        # 初始化存储引擎（默认SQLite，可通过STORAGE_ENGINE切换为json）
+        engine_name = engine or os.getenv("STORAGE_ENGINE", "sqlite")
+        self.engine: StorageEngine = create_storage_engine(engine_name, data_dir)
+        
+        # 读接口经由进程内缓存，避免每次请求重新加载和构建全部报告
+        self.search_index = InvertedIndex()
+        self.statistics = StatisticsAggregator()
+        self.date_index = DateIndex()
+        self.patient_index = PatientIndex()
+        self.cache = ReportCache(self.engine, indexes=[self.search_index, self.statistics, self.date_index,
+                                                       self.patient_index])
+        
+        # 物化的历史对比结果，随患者报告变化失效
+        self.comparisons = ComparisonStore(os.path.join(data_dir, "comparisons.db"))
+        
+        # 按患者的列式指标时间序列，首次启动或格式变化时从全部报告重建
+        self.timeseries = IndicatorTimeSeriesStore(data_dir)
+        with self.cache.writing():
+            if not self.timeseries.is_current():
+                self.timeseries.rebuild(self.cache.all())
     
     def save_report(self, report: BloodTestReport) -> str:
         """保存血常规报告"""
+        report_dict = self._prepare(report)
+        
+        previous = self.cache.get(report.id)
+        with self.cache.writing() as stale:
+            self.engine.save_report(report_dict)
+            self.cache.put(report_dict)
+            self.timeseries.record(report, previous)
+            self._invalidate_comparisons([report, previous], stale)
+        
+        return report.id
+    
+    def save_reports(self, reports: List[BloodTestReport]) -> List[str]:
+        """批量保存报告，所有报告在存储引擎中一次提交"""
+        report_dicts = [self._prepare(report) for report in reports]
+        previous = [self.cache.get(report.id) for report in reports]
+        with self.cache.writing() as stale:
+            self.engine.save_reports(report_dicts)
+            for report, report_dict, old in zip(reports, report_dicts, previous):
+                self.cache.put(report_dict)
+                self.timeseries.record(report, old)
+            self._invalidate_comparisons(reports + previous, stale)
+        
+        return [report.id for report in reports]
+    
+    def reclassify_reports(self, engine) -> int:
+        """
+        参考范围规则变化后，按各报告的性别年龄重新判定全部检测项目
+
+        所有项目在参考范围引擎中一次判定，只保存状态或参考范围发生变化的报告（一次提交）。
+
+        Returns:
+            更新的报告数
+        """
+        reports = self.cache.all()
+        flat = [(report, position, item) for report in reports for position, item in enumerate(report.items)]
+        if not flat:
+            return 0
+        result = engine.classify(
+            [item.name for _, _, item in flat],
+            [item.value for _, _, item in flat],
+            [report.sex for report, _, _ in flat],
+            [report.age for report, _, _ in flat],
+            [item.unit for _, _, item in flat]
+        )
+        
+        changed = {}
+        for i, (report, position, item) in enumerate(flat):
+            index = int(result.rules[i])
+            if index < 0:
+                continue
+            rule = engine.rules[index]
+            code = int(result.codes[i])
+            update = {
+                'value': float(result.values[i]),
+                'unit': rule.unit or item.unit,
+                'reference_range': rule.range_text,
+                'status': STATUS_LABELS[code],
+                'is_abnormal': code != STATUS_NORMAL
+            }
+            if any(getattr(item, field) != value for field, value in update.items()):
+                changed.setdefault(report.id, report.copy(deep=True))
+                changed[report.id].items[position] = item.copy(update=update)
+        
+        if changed:
+            self.save_reports(list(changed.values()))
+        return len(changed)
+    
+    def _prepare(self, report: BloodTestReport) -> Dict:
+        """补全ID和更新时间，转换为可序列化的字典"""
         # 生成唯一ID
         if not report.id:
             report.id = str(uuid.uuid4())
@@ -36,16 +136,6 @@ class BloodTestStorageService:
         # 更新时间戳
         report.updated_at = datetime.now()
         
-        # 读取现有数据
-        reports = self._load_reports()
-        
-        # 检查是否已存在（根据ID）
-        existing_index = None
-        for i, existing_report in enumerate(reports):
-            if existing_report.get('id') == report.id:
-                existing_index = i
-                break
-        
         # 转换为字典并处理datetime序列化
         report_dict = report.dict()
         
@@ -56,167 +146,276 @@ class BloodTestStorageService:
             report_dict['created_at'] = report_dict['created_at'].isoformat()
         if 'updated_at' in report_dict and isinstance(report_dict['updated_at'], datetime):
             report_dict['updated_at'] = report_dict['updated_at'].isoformat()
-        
-        if existing_index is not None:
-            # 更新现有报告
-            reports[existing_index] = report_dict
-        else:
-            # 添加新报告
-            reports.append(report_dict)
-        
-        # 保存到文件
-        self._save_reports(reports)
-        
-        return report.id
+        return report_dict
     
     def get_report(self, report_id: str) -> Optional[BloodTestReport]:
         """根据ID获取报告"""
-        reports = self._load_reports()
-        
-        for report_data in reports:
-            if report_data.get('id') == report_id:
-                return BloodTestReport(**report_data)
-        
-        return None
+        return self.cache.get(report_id)
     
     def get_all_reports(self) -> List[BloodTestReport]:
         """获取所有报告"""
-        reports = self._load_reports()
-        return [BloodTestReport(**report_data) for report_data in reports]
+        return self.cache.all()
     
     def get_reports_by_patient(self, patient_name: str) -> List[BloodTestReport]:
         """根据患者姓名获取报告"""
-        reports = self._load_reports()
-        patient_reports = []
-        
-        for report_data in reports:
-            if report_data.get('patient_name') == patient_name:
-                patient_reports.append(BloodTestReport(**report_data))
-        
-        return patient_reports
+        return self.cache.by_patient(patient_name)
     
     def delete_report(self, report_id: str) -> bool:
-        """删除报告"""
-        reports = self._load_reports()
-        original_count = len(reports)
-        
-        # 过滤掉要删除的报告
-        reports = [r for r in reports if r.get('id') != report_id]
-        
-        if len(reports) < original_count:
-            self._save_reports(reports)
-            return True
-        
-        return False
+        """删除报告，图片不再被任何报告引用时一并删除"""
+        report = self.cache.get(report_id)
+        with self.cache.writing() as stale:
+            deleted = self.engine.delete_report(report_id)
+            if deleted:
+                self.cache.remove(report_id)
+                if report is not None:
+                    self.timeseries.discard(report)
+                    self._invalidate_comparisons([report], stale)
+        if deleted and report is not None and report.image_path:
+            self.delete_image(report.image_path)
+        return deleted
     
-    def search_reports(self, query: str) -> List[BloodTestReport]:
-        """搜索报告"""
-        reports = self._load_reports()
-        results = []
-        
-        query_lower = query.lower()
-        
-        for report_data in reports:
-            # 搜索患者姓名
-            if query_lower in report_data.get('patient_name', '').lower():
-                results.append(BloodTestReport(**report_data))
-                continue
-            
-            # 搜索医院名称
-            if query_lower in report_data.get('hospital', '').lower():
-                results.append(BloodTestReport(**report_data))
-                continue
-            
-            # 搜索备注
-            if query_lower in report_data.get('notes', '').lower():
-                results.append(BloodTestReport(**report_data))
+    def match_patients(self, patient_name: str, threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """按规范化姓名和字符/拼音相似度查找匹配的患者，返回 (姓名, 得分) 列表"""
+        with self.cache.reading():
+            return self.patient_index.match(patient_name, threshold)
+    
+    def get_history_reports(self, report: BloodTestReport,
+                            threshold: Optional[float] = None) -> Tuple[List[BloodTestReport], List[Tuple[str, float]]]:
+        """
+        查找同一患者（姓名模糊匹配）的其他报告，用于历史对比
+
+        Returns:
+            (历史报告列表, 匹配到的 (姓名, 得分) 列表)
+        """
+        with self.cache.reading():
+            matches = self.patient_index.match(report.patient_name, threshold)
+            reports = [r for name, _ in matches for r in self.cache.by_patient(name) if r.id != report.id]
+        return reports, matches
+    
+    def _invalidate_comparisons(self, reports: List[Optional[BloodTestReport]], stale: bool):
+        """
+        报告新增、修改或删除后，使相关的物化对比结果失效（在写锁内调用）
+
+        受影响的是变化的报告本身，以及姓名与变化报告患者匹配的患者的对比结果；
+        匹配得分对称，按得分与各结果保存时的阈值比较即可判断新报告是否会进入其历史。
+        写入前缓存已过期时患者索引不完整，清空全部对比结果。
+        """
+        if stale:
+            self.comparisons.clear()
+            return
+        report_ids = []
+        scores: Dict[str, float] = {}
+        for report in reports:
+            if report is None:
                 continue
-        
-        return results
+            report_ids.append(report.id)
+            scores[report.patient_name] = 1.0
+            for name, score in self.patient_index.match(report.patient_name, threshold=0.0):
+                scores[name] = max(scores.get(name, 0.0), score)
+        if report_ids:
+            self.comparisons.invalidate(report_ids, scores.items())
+    
+    def get_comparison(self, report_id: str, threshold: float, fingerprint: str) -> Optional[Dict]:
+        """读取物化的历史对比结果"""
+        return self.comparisons.get(report_id, threshold, fingerprint)
+    
+    def save_comparison(self, report: BloodTestReport, threshold: float, fingerprint: str,
+                        result: Dict, token: tuple) -> bool:
+        """
+        保存历史对比结果
+
+        Args:
+            token: 开始计算前的 change_token()，期间报告有变化时不保存，避免写入过期结果
+
+        Returns:
+            是否已保存
+        """
+        with self.cache.writing():
+            if self.engine.change_token() != token:
+                return False
+            self.comparisons.put(report.id, threshold, fingerprint, report.patient_name, result)
+        return True
+    
+    def change_token(self) -> tuple:
+        """存储数据的变更标记"""
+        return self.engine.change_token()
+    
+    def search_reports(self, query: str) -> List[BloodTestReport]:
+        """搜索报告（患者姓名、医院名称、备注），按相关度排序"""
+        with self.cache.reading() as reports:
+            return [reports[report_id] for report_id, _ in self.search_index.search(query)]
     
     def get_reports_by_date_range(self, start_date: datetime, end_date: datetime) -> List[BloodTestReport]:
         """根据日期范围获取报告"""
-        reports = self._load_reports()
-        results = []
-        
-        for report_data in reports:
-            test_date_str = report_data.get('test_date')
-            if test_date_str:
-                try:
-                    test_date = parse_iso_datetime(test_date_str)
-                    if start_date <= test_date <= end_date:
-                        results.append(BloodTestReport(**report_data))
-                except ValueError:
-                    continue
-        
-        return results
+        return self.query_reports_by_date(start_date, end_date)
+    
+    def query_reports_by_date(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                              patient_name: Optional[str] = None) -> List[BloodTestReport]:
+        """按检测日期区间（可选患者）查询报告，结果按检测日期升序"""
+        with self.cache.reading() as reports:
+            if patient_name is not None:
+                patient_reports = self.cache.by_patient(patient_name)
+                # 患者报告少于区间内报告时，直接过滤患者报告
+                if len(patient_reports) < self.date_index.count(start_date, end_date):
+                    return sorted(
+                        (r for r in patient_reports
+                         if (start_date is None or r.test_date >= start_date)
+                         and (end_date is None or r.test_date <= end_date)),
+                        key=lambda r: (r.test_date, r.id)
+                    )
+            
+            results = [reports[report_id] for report_id in self.date_index.range(start_date, end_date)]
+            if patient_name is not None:
+                results = [r for r in results if r.patient_name == patient_name]
+            return results
     
     def get_statistics(self) -> Dict[str, any]:
-        """获取统计信息"""
-        reports = self._load_reports()
-        
-        if not reports:
-            return {
-                "total_reports": 0,
-                "total_patients": 0,
-                "date_range": None,
-                "abnormal_count": 0
+        """获取统计信息（增量维护）"""
+        with self.cache.reading():
+            return self.statistics.summary()
+    
+    def check_statistics(self) -> Dict[str, Dict[str, any]]:
+        """
+        校验本进程增量维护的统计信息
+
+        在跨进程共享锁内（期间没有其他进程写入）读取当前的增量统计，
+        再直接从存储引擎逐条读取报告重新计算，返回两者之间的偏差。
+        """
+        with self.cache.reading(consistent=True):
+            actual = self.statistics.summary()
+            expected = compute_statistics(BloodTestReport(**d) for d in self.engine.iter_reports())
+        return find_drift(expected, actual)
+    
+    def _patient_series(self, patient_name: str) -> PatientSeries:
+        """
+        读取患者的列式序列，并与缓存中该患者的报告核对
+
+        保存报告后、更新列式文件前进程退出时，文件缺少或仍是旧的报告；
+        指纹不一致时由缓存中的报告重建该患者的文件。修复结果只取决于报告本身，
+        与其他进程的写入交错时，下一次读取会再次核对。
+        """
+        with self.cache.reading():
+            return self.timeseries.get_series(patient_name, self.cache.by_patient(patient_name))
+    
+    def get_indicator_history(self, patient_names: Iterable[str],
+                              exclude_report_id: Optional[str] = None) -> PatientSeries:
+        """读取一个或多个患者的列式指标历史（按检测日期升序合并）"""
+        history = PatientSeries.merge([self._patient_series(name) for name in set(patient_names)])
+        if exclude_report_id is not None:
+            history = history.without(exclude_report_id)
+        return history
+    
+    def get_patient_trends(self, patient_names: Optional[List[str]] = None,
+                           indicators: Optional[List[str]] = None) -> Dict[str, Dict[str, Dict]]:
+        """
+        一次计算多个患者各标准指标的趋势
+
+        Args:
+            patient_names: 患者姓名列表，为空时计算全部患者
+            indicators: 只返回这些指标，为空时返回全部标准指标
+
+        Returns:
+            {患者姓名: {指标: 趋势}}，没有数据的指标不返回
+        """
+        if patient_names is None:
+            patient_names = self.cache.patients()
+        patient_names = list(dict.fromkeys(patient_names))
+        rows = [(i, name) for i, name in enumerate(INDICATOR_NAMES) if indicators is None or name in indicators]
+        fit = fit_patients([self._patient_series(name) for name in patient_names])
+        described = fit.describe()
+        
+        return {
+            patient_name: {
+                indicator: described[p, i]
+                for i, indicator in rows if fit.points[p, i] > 0
             }
+            for p, patient_name in enumerate(patient_names)
+        }
+    
+    def aggregate_cohort(self, indicator: str, start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None, hospital: Optional[str] = None,
+                         sex: Optional[str] = None, group_by: Optional[str] = None,
+                         below: Optional[float] = None, above: Optional[float] = None) -> CohortAggregator:
+        """一次遍历存储引擎中的指标数值，流式计算人群统计（不构建报告对象）"""
+        aggregator = CohortAggregator(group_by, below, above)
+        return aggregator.consume(self.engine.iter_indicator_rows(indicator, start_date, end_date, hospital, sex))
+    
+    def paginate_reports(self, reports: List[BloodTestReport], limit: int, after: Optional[str] = None,
+                         sort_by: str = 'test_date', descending: bool = True) -> ReportPage:
+        """对报告列表进行游标分页，游标记录上一页最后一条报告的排序值和ID"""
+        if sort_by not in REPORT_SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort_by}")
         
-        # 统计基本信息
-        total_reports = len(reports)
-        unique_patients = set(r.get('patient_name') for r in reports)
-        total_patients = len(unique_patients)
+        def sort_key(report: BloodTestReport):
+            return (getattr(report, sort_by), report.id)
         
-        # 日期范围
-        dates = []
-        for report in reports:
-            test_date_str = report.get('test_date')
-            if test_date_str:
-                try:
-                    dates.append(parse_iso_datetime(test_date_str))
-                except ValueError:
-                    continue
-        
-        date_range = None
-        if dates:
-            min_date = min(dates)
-            max_date = max(dates)
-            date_range = {
-                "start": min_date.isoformat(),
-                "end": max_date.isoformat()
-            }
+        candidates = reports
+        if after:
+            sort_value, record_id = decode_cursor(after)
+            cursor_key = (to_naive_local(parse_iso_datetime(sort_value)), record_id)
+            if descending:
+                candidates = [r for r in reports if sort_key(r) < cursor_key]
+            else:
+                candidates = [r for r in reports if sort_key(r) > cursor_key]
         
-        # 异常统计
-        abnormal_count = 0
-        for report in reports:
-            items = report.get('items', [])
-            for item in items:
-                if item.get('is_abnormal', False):
-                    abnormal_count += 1
+        # 多取一条用于判断是否还有下一页，只做部分排序
+        select = heapq.nlargest if descending else heapq.nsmallest
+        page = select(limit + 1, candidates, key=sort_key)
         
-        return {
-            "total_reports": total_reports,
-            "total_patients": total_patients,
-            "date_range": date_range,
-            "abnormal_count": abnormal_count
-        }
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            next_cursor = encode_cursor(getattr(last, sort_by).isoformat(), last.id)
+        
+        return ReportPage(items=page, next_cursor=next_cursor, limit=limit)
+    
+    def iter_report_dicts(self) -> Iterator[Dict]:
+        """逐条从存储引擎读取报告字典，用于大批量导出"""
+        return self.engine.iter_reports()
+    
+    def get_cache_stats(self) -> Dict[str, any]:
+        """获取报告缓存和物化对比结果的命中统计"""
+        stats = self.cache.stats()
+        stats["comparisons"] = self.comparisons.stats()
+        return stats
     
     def save_image(self, image_data: bytes, filename: str) -> str:
-        """保存图片文件"""
-        # 生成唯一文件名
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
-        file_path = os.path.join(self.images_dir, unique_filename)
-        
-        # 保存文件
-        with open(file_path, 'wb') as f:
-            f.write(image_data)
-        
-        return file_path
+        """保存图片文件（按内容哈希去重）"""
+        return self.image_store.save_bytes(image_data, filename).path
+    
+    def open_image_writer(self, filename: str, max_bytes: Optional[int] = None,
+                          keep_data: bool = False) -> ImageWriter:
+        """创建分块写入的图片写入器，用于流式保存上传文件（keep_data 时同时保留内存中的内容）"""
+        return self.image_store.open_writer(filename, max_bytes, keep_data)
+    
+    def get_reports_by_image(self, image_path: str) -> List[BloodTestReport]:
+        """获取引用指定图片的报告"""
+        return self.cache.by_image(image_path)
+    
+    def image_ref_count(self, image_path: str) -> int:
+        """图片被报告引用的次数"""
+        return len(self.cache.by_image(image_path))
+    
+    def release_images(self, images: Iterable[StoredImage]) -> int:
+        """
+        释放没有保存成报告的上传图片（如识别失败的批量上传）
+
+        只删除本次上传新写入（existed=False）且未被任何报告引用的文件，
+        此前已存在的相同内容图片保持不变。
+
+        Returns:
+            删除的文件数
+        """
+        released = 0
+        for path in {image.path for image in images if not image.existed}:
+            released += self.delete_image(path)
+        return released
     
     def delete_image(self, image_path: str) -> bool:
-        """删除图片文件"""
+        """删除图片文件，仍被报告引用时保留"""
+        if self.image_ref_count(image_path) > 0:
+            return False
         try:
             if os.path.exists(image_path):
                 os.remove(image_path)
@@ -224,16 +423,3 @@ class BloodTestStorageService:
         except Exception:
             pass
         return False
-    
-    def _load_reports(self) -> List[Dict]:
-        """加载报告数据"""
-        try:
-            with open(self.reports_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
-    def _save_reports(self, reports: List[Dict]):
-        """保存报告数据"""
-        with open(self.reports_file, 'w', encoding='utf-8') as f:
-            json.dump(reports, f, ensure_ascii=False, indent=2)
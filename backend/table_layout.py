@@ -0,0 +1,145 @@
+"""
+报告版面分析模块
+在二值化图像中定位检验结果表格及其文字行，只把这些区域交给OCR，跳过页眉、医院标志、二维码和手机界面
+"""
+
+from typing import List, NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+
+
+class TableRegion(NamedTuple):
+    """送去OCR的一个区域：若干连续文字行拼接成的图像"""
+    top: int  # 第一行在原图中的纵坐标
+    bottom: int  # 最后一行的下边界
+    rows: int  # 包含的文字行数
+    image: np.ndarray  # 拼接后的区域图像（白底黑字）
+
+
+def _ink_mask(binary: np.ndarray) -> np.ndarray:
+    """前景（文字和线条）为255的掩码；预处理结果为白底黑字"""
+    return cv2.bitwise_not(binary)
+
+
+def find_table_lines(ink: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    检测表格横线和竖线
+
+    Returns:
+        (横线掩码, 竖线掩码)
+    """
+    height, width = ink.shape
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // 4, 1), 1))
+    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(height // 8, 1)))
+    horizontal = cv2.morphologyEx(ink, cv2.MORPH_OPEN, horizontal_kernel)
+    vertical = cv2.morphologyEx(ink, cv2.MORPH_OPEN, vertical_kernel)
+    return horizontal, vertical
+
+
+def find_table_bbox(horizontal: np.ndarray, vertical: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    根据表格线的轮廓定位结果表格
+
+    检验单的结果表格通常至少有表头和表尾两条贯穿的横线；取线条轮廓中面积最大、
+    宽度超过图像一半的外接矩形。没有找到时返回None。
+
+    Returns:
+        (x, y, w, h)
+    """
+    height, width = horizontal.shape
+    lines = cv2.dilate(cv2.bitwise_or(horizontal, vertical), np.ones((5, 5), np.uint8))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    best = None
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w < width * 0.5 or h < height * 0.1:
+            continue
+        if best is None or w * h > best[2] * best[3]:
+            best = (x, y, w, h)
+    if best is not None:
+        return best
+
+    # 只有横线的表格（常见于三线表）：取最上和最下的贯穿横线之间的区域
+    rows = np.where(horizontal.any(axis=1))[0]
+    if len(rows) >= 2 and rows[-1] - rows[0] >= height * 0.1:
+        columns = np.where(horizontal.any(axis=0))[0]
+        return int(columns[0]), int(rows[0]), int(columns[-1] - columns[0] + 1), int(rows[-1] - rows[0] + 1)
+    return None
+
+
+def find_row_bands(ink: np.ndarray, min_height: int = 6, max_gap: int = 2) -> List[Tuple[int, int]]:
+    """
+    按水平投影切分文字行，去掉明显不是文字行的色块（二维码、标志、照片）
+
+    Returns:
+        [(top, bottom), ...]，bottom不含
+    """
+    height, width = ink.shape
+    profile = np.count_nonzero(ink, axis=1)
+    has_ink = profile > max(2, width // 200)
+
+    # 连续有墨迹的行合并成带，间隔不超过 max_gap 的带再合并
+    bands = []
+    edges = np.diff(np.concatenate(([0], has_ink.astype(np.int8), [0])))
+    for top, bottom in zip(np.where(edges == 1)[0], np.where(edges == -1)[0]):
+        if bands and top - bands[-1][1] <= max_gap:
+            bands[-1] = (bands[-1][0], bottom)
+        else:
+            bands.append((top, bottom))
+    bands = [(int(top), int(bottom)) for top, bottom in bands if bottom - top >= min_height]
+    if not bands:
+        return []
+
+    # 文字行高度相近；远高于中位数或墨迹过密的带不是文字行
+    typical = float(np.median([bottom - top for top, bottom in bands]))
+    kept = []
+    for top, bottom in bands:
+        density = profile[top:bottom].sum() / float((bottom - top) * width)
+        if bottom - top <= typical * 3 and density < 0.35:
+            kept.append((top, bottom))
+    return kept
+
+
+def detect_table_regions(binary: np.ndarray, max_regions: int = 4, padding: int = 4) -> List[TableRegion]:
+    """
+    定位结果表格并把其中的文字行分成至多 max_regions 个区域
+
+    表格线会从区域图像中抹去，避免被识别成横杠或下划线。找不到表格时在整幅图像上切分文字行；
+    文字行少于两行时返回空列表，由调用方退回整图识别。
+
+    Args:
+        binary: 预处理后的二值图像（白底黑字）
+        max_regions: 最多切分的区域数（每个区域单独调用一次OCR，可并行）
+        padding: 拼接时行与行之间插入的空白像素
+
+    Returns:
+        区域列表，按从上到下排列
+    """
+    ink = _ink_mask(binary)
+    horizontal, vertical = find_table_lines(ink)
+    bbox = find_table_bbox(horizontal, vertical)
+
+    text_only = cv2.subtract(ink, cv2.bitwise_or(horizontal, vertical))
+    if bbox is not None:
+        x, y0, w, h = bbox
+        area = text_only[y0:y0 + h, x:x + w]
+    else:
+        y0 = 0
+        area = text_only
+
+    bands = find_row_bands(area)
+    if len(bands) < 2:
+        return []
+
+    regions = []
+    per_region = -(-len(bands) // max_regions)
+    for start in range(0, len(bands), per_region):
+        group = bands[start:start + per_region]
+        blank = np.zeros((padding, area.shape[1]), dtype=area.dtype)
+        pieces = [blank]
+        for top, bottom in group:
+            pieces.extend([area[top:bottom], blank])
+        image = cv2.bitwise_not(np.vstack(pieces))
+        regions.append(TableRegion(y0 + group[0][0], y0 + group[-1][1], len(group), image))
+    return regions
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 后端模块为平铺结构，测试时从 backend 目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
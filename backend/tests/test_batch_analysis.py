@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from batch_analysis import BatchBloodTestAnalyzer, read_records
+from blood_test_service import BloodTestAnalysisService
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return BatchBloodTestAnalyzer(BloodTestAnalysisService())
+
+
+def _outcomes(analyzer, body, content_type):
+    frame, analysis_type, client_typed = read_records(body, content_type)
+    return list(analyzer.iter_results(frame, analysis_type, client_typed=client_typed))
+
+
+def test_csv_cells_are_coerced_individually(analyzer):
+    outcomes = _outcomes(analyzer, b"patient_id,plt,hgb,wbc\nP1,80,120,5\n2,40,abc,3\nP3,,130,\n", "text/csv")
+
+    first = outcomes[0]["result"]
+    assert first["patient_id"] == "P1"
+    assert first["detailed_analysis"]["platelet_analysis"]["message"] == "血小板中度减少 (80 ×10^9/L)，需要关注"
+    assert "error" in outcomes[1]
+    third = outcomes[2]["result"]["detailed_analysis"]
+    assert third["platelet_analysis"]["status"] == "unknown"
+    assert third["rbc_analysis"]["message"] == "血红蛋白正常 (Hb: 130 g/L)"
+
+
+def test_json_string_grades_match_single_record_path(analyzer):
+    outcomes = _outcomes(analyzer, json.dumps([{"plt": 80}, {"plt": "80"}]).encode(), "application/json")
+    assert "result" in outcomes[0]
+    assert "error" in outcomes[1]
@@ -0,0 +1,82 @@
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ocr_jobs import QueueFullError
+from storage_service import BloodTestStorageService
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # 导入 app 时会在当前目录创建默认数据目录
+    monkeypatch.chdir(tmp_path)
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "storage_service", BloodTestStorageService(str(tmp_path / "data"), engine="json"))
+    return app_module
+
+
+def _png(seed):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((8, 8), seed, dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _post(app_module, files, manifest=None):
+    from fastapi.testclient import TestClient
+
+    data = {"patient_name": "张三", "hospital": "协和医院", "test_date": "2024-01-01"}
+    if manifest is not None:
+        data["manifest"] = json.dumps(manifest)
+    return TestClient(app_module.app).post(
+        "/api/upload-reports/batch", data=data,
+        files=[("images", (f"{i}.png", content, "image/png")) for i, content in enumerate(files)]
+    )
+
+
+def _blobs(app_module):
+    images_dir = app_module.storage_service.images_dir
+    return [name for directory, _, names in os.walk(images_dir)
+            if os.path.basename(directory) != ".tmp" for name in names]
+
+
+def test_non_object_manifest_entry_returns_400(app_module):
+    response = _post(app_module, [_png(1)], manifest=[1])
+    assert response.status_code == 400
+
+
+def test_images_released_when_queue_is_full(app_module, monkeypatch):
+    def full(pages):
+        raise QueueFullError("识别队列已满")
+
+    monkeypatch.setattr(app_module.ocr_job_queue, "recognize_pages", full)
+    response = _post(app_module, [_png(1), _png(2)])
+    assert response.status_code == 503
+    assert _blobs(app_module) == []
+
+
+def test_images_released_for_failed_groups_only(app_module, monkeypatch):
+    from concurrent.futures import Future
+
+    def recognize(pages):
+        futures = []
+        for index, _ in enumerate(pages):
+            future = Future()
+            if index == 0:
+                future.set_result(([], None))
+            else:
+                future.set_exception(RuntimeError("识别失败"))
+            futures.append(future)
+        return futures
+
+    monkeypatch.setattr(app_module.ocr_job_queue, "recognize_pages", recognize)
+    response = _post(app_module, [_png(1), _png(2)])
+    assert response.status_code == 200
+    statuses = [report["status"] for report in response.json()["reports"]]
+    assert statuses == ["saved", "failed"]
+    saved_path = response.json()["reports"][0]["image_paths"][0]
+    assert [os.path.basename(saved_path)] == _blobs(app_module)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from cohort_stats import CohortAggregator, QuantileSketch, RunningMoments
+
+
+def test_running_moments_match_numpy_across_batches_and_merges():
+    rng = np.random.default_rng(0)
+    values = rng.normal(200, 50, 1000)
+    first, second = RunningMoments(), RunningMoments()
+    for batch in np.array_split(values[:600], 7):
+        first.update(batch)
+    second.update(values[600:])
+    first.merge(second)
+
+    assert first.count == 1000
+    assert first.mean == pytest.approx(values.mean())
+    assert first.variance == pytest.approx(values.var(ddof=1))
+    assert (first.min, first.max) == (values.min(), values.max())
+
+
+def test_single_value_has_no_variance():
+    moments = RunningMoments()
+    moments.update(np.array([5.0]))
+    assert moments.variance is None and moments.std is None
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(5, 1, 20000)
+    sketch = QuantileSketch(0.01)
+    for batch in np.array_split(values, 5):
+        sketch.update(batch)
+
+    qs = [0.05, 0.25, 0.5, 0.75, 0.95]
+    for q, estimate in zip(qs, sketch.quantiles(qs)):
+        exact = np.quantile(values, q, method="lower")
+        assert estimate == pytest.approx(exact, rel=0.011)
+
+
+def test_sketch_merge_equals_single_sketch_and_handles_signs():
+    values = np.array([-4.0, -1.0, 0.0, 0.0, 2.0, 8.0, 16.0])
+    whole = QuantileSketch()
+    whole.update(values)
+    left, right = QuantileSketch(), QuantileSketch()
+    left.update(values[:3])
+    right.update(values[3:])
+    left.merge(right)
+
+    assert left.buckets() == whole.buckets()
+    assert left.quantiles([0.0, 0.5, 1.0]) == pytest.approx([-4.0, 0.0, 16.0], rel=0.01)
+    with pytest.raises(ValueError):
+        left.merge(QuantileSketch(0.05))
+
+
+def test_aggregator_groups_rows_and_counts_thresholds():
+    rows = [
+        (100.0, True, "协和医院", "2024-01-15T08:00:00", "M"),
+        (200.0, False, "协和医院", "2024-05-01T08:00:00", "女"),
+        (300.0, False, "人民医院", "2024-05-20T08:00:00", None),
+        (float("nan"), False, "人民医院", "2024-06-01T08:00:00", "F"),
+    ]
+    aggregator = CohortAggregator("quarter", below=150, above=250).consume([rows[:2], rows[2:]])
+
+    summary = aggregator.overall.summary([50])
+    assert summary["count"] == 3
+    assert summary["mean"] == 200.0
+    assert summary["abnormal_count"] == 1
+    assert summary["below"]["count"] == 1 and summary["above"]["count"] == 1
+    assert {key: group.moments.count for key, group in aggregator.groups.items()} == {"2024-Q1": 1, "2024-Q2": 2}
+
+    by_sex = CohortAggregator("sex").consume([rows])
+    assert {key: group.moments.count for key, group in by_sex.groups.items()} == {"M": 1, "F": 1, "未知": 1}
+    with pytest.raises(ValueError):
+        CohortAggregator("ward")
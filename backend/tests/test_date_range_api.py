@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+from models import BloodTestItem, BloodTestReport
+from storage_service import BloodTestStorageService
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    # 导入 app 时会在当前目录创建默认数据目录
+    monkeypatch.chdir(tmp_path)
+    import app as app_module
+
+    service = BloodTestStorageService(str(tmp_path / "data"), engine="json")
+    monkeypatch.setattr(app_module, "storage_service", service)
+    for report_id, test_date in (("a", datetime(2019, 12, 31, 12)), ("b", "2020-01-02T08:00:00Z"),
+                                 ("c", datetime(2020, 1, 3, 9))):
+        service.save_report(BloodTestReport(
+            id=report_id, patient_name="张三", test_date=test_date, hospital="协和医院",
+            items=[BloodTestItem(name="血小板计数", value=120, unit="×10^9/L",
+                                 reference_range="125-350", status="偏低", is_abnormal=True)]
+        ))
+    return TestClient(app_module.app)
+
+
+def test_aware_bounds_compare_with_stored_dates(client):
+    response = client.get("/api/reports", params={"from": "2020-01-01T00:00:00Z"})
+    assert response.status_code == 200
+    assert [report["id"] for report in response.json()] == ["b", "c"]
+
+    response = client.get("/api/reports", params={"from": "2019-12-31T00:00:00+08:00",
+                                                   "to": "2020-01-02T23:00:00+00:00"})
+    assert response.status_code == 200
+    assert [report["id"] for report in response.json()] == ["a", "b"]
+
+
+def test_invalid_bounds_return_400(client):
+    assert client.get("/api/reports", params={"from": "not-a-date"}).status_code == 400
+    assert client.get("/api/reports", params={"to": "0001-01-01T00:00:00+14:00"}).status_code == 400
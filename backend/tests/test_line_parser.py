@@ -0,0 +1,47 @@
+import pytest
+
+from blood_test_service import BloodTestOCRService
+
+
+@pytest.fixture(scope="module")
+def service():
+    return BloodTestOCRService()
+
+
+def test_longest_alias_wins(service):
+    assert service._match_line("MCHC 330 g/L 320-360") == ("平均红细胞血红蛋白浓度", 330.0, "g/L")
+    assert service._match_line("MCH 30 pg 27-34") == ("平均红细胞血红蛋白含量", 30.0, "pg")
+
+
+@pytest.mark.parametrize("line", ["M 5", "H 3.1", "L 2.1", "白 5", "HbsAg 1.2"])
+def test_fragments_do_not_match(service, line):
+    assert service._parse_line(line) is None
+
+
+def test_latin_differential_aliases(service):
+    neut_percent = service._parse_line("NEUT% 60.5 % 40-75")
+    assert (neut_percent.name, neut_percent.value, neut_percent.unit) == ("中性粒细胞百分比", 60.5, "%")
+    assert neut_percent.status == "正常"
+
+    lymph_count = service._parse_line("Lymph# 1.5 10^9/L 1.1-3.2")
+    assert (lymph_count.name, lymph_count.value, lymph_count.unit) == ("淋巴细胞", 1.5, "10^9/L")
+
+
+def test_scientific_notation(service):
+    assert service._match_line("PLT 1.2e2 10^9/L") == ("血小板", 120.0, "10^9/L")
+    assert service._match_line("PLT 2.5E+2")[1] == 250.0
+
+
+def test_unconvertible_unit_is_kept_and_left_unclassified(service):
+    item = service._parse_line("淋巴细胞 30.5 %")
+    assert (item.value, item.unit, item.reference_range) == (30.5, "%", "")
+    assert item.status == "未知"
+    assert not item.is_abnormal
+
+    converted = service._parse_line("HGB 13.5 g/dL")
+    assert (converted.value, converted.unit, converted.status) == (135.0, "g/L", "正常")
+
+
+def test_high_low_flag_is_not_taken_as_unit(service):
+    assert service._match_line("PLT 120 H 10^9/L 125-350") == ("血小板", 120.0, "10^9/L")
+    assert service._match_line("HCT 0.45 L/L") == ("红细胞压积", 0.45, "L/L")
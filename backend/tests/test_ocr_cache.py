@@ -0,0 +1,64 @@
+import pytest
+
+import ocr_cache
+from models import BloodTestItem
+from ocr_cache import OCRResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(ocr_cache.time, "time", tick)
+
+
+def _items(value=45):
+    return [BloodTestItem(name="血小板", value=value, unit="10^9/L", reference_range="125-350",
+                          status="偏低", is_abnormal=True)]
+
+
+def test_round_trip_and_hit_statistics(tmp_path):
+    cache = OCRResultCache(str(tmp_path / "ocr.db"), "v1")
+    assert cache.get("sha-a") is None
+    cache.put("sha-a", "PLT 45", _items(), {"strategy": "otsu"})
+
+    cached = cache.get("sha-a")
+    assert cached.text == "PLT 45"
+    assert cached.items == _items()
+    assert cached.info == {"strategy": "otsu"}
+    assert (cache.stats()["hits"], cache.stats()["misses"], cache.stats()["entries"]) == (1, 1, 1)
+
+
+def test_pipeline_change_drops_old_entries(tmp_path):
+    path = str(tmp_path / "ocr.db")
+    OCRResultCache(path, "v1").put("sha-a", "PLT 45", _items())
+
+    assert OCRResultCache(path, "v1").get("sha-a") is not None
+    changed = OCRResultCache(path, "v2")
+    assert changed.get("sha-a") is None
+    assert OCRResultCache(path, "v1").stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = OCRResultCache(str(tmp_path / "ocr.db"), "v1", max_entries=2)
+    cache.put("sha-a", "a", _items())
+    cache.put("sha-b", "b", _items())
+    cache.get("sha-a")
+    cache.put("sha-c", "c", _items())
+
+    assert cache.get("sha-b") is None
+    assert cache.get("sha-a") is not None and cache.get("sha-c") is not None
+
+
+def test_byte_limit_is_enforced(tmp_path, clock):
+    cache = OCRResultCache(str(tmp_path / "ocr.db"), "v1", max_bytes=600)
+    for key in ("sha-a", "sha-b", "sha-c"):
+        cache.put(key, "x" * 200, _items())
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 600
+    assert cache.get("sha-a") is None and cache.get("sha-c") is not None
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from blood_test_service import BloodTestAnalysisService
+from models import BloodTestItem
+from ocr_jobs import OCRJobQueue
+from storage_service import BloodTestStorageService
+
+ITEMS = [BloodTestItem(name="血小板计数", value=45, unit="×10^9/L", reference_range="125-350",
+                       status="偏低", is_abnormal=True)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = OCRJobQueue(BloodTestAnalysisService(), BloodTestStorageService(str(tmp_path), engine="json"),
+                        max_job_files=3)
+    yield queue
+    queue.shutdown()
+
+
+def _submit(queue):
+    return queue.submit(image_path="images/a.png", patient_name="张三", hospital="协和医院",
+                        test_date=datetime(2024, 1, 1), known_items=ITEMS)
+
+
+def test_known_items_are_saved_off_the_calling_thread(queue, monkeypatch):
+    save_threads = []
+    save_report = queue.storage_service.save_report
+
+    def recording_save(report):
+        save_threads.append(threading.current_thread())
+        return save_report(report)
+
+    monkeypatch.setattr(queue.storage_service, "save_report", recording_save)
+    done = queue.completion(_submit(queue))
+    job = done.result(timeout=10) if done is not None else None
+    assert job is not None and job.state == "saved"
+    assert save_threads and save_threads[0] is not threading.current_thread()
+
+
+def test_prune_removes_expired_and_excess_finished_jobs(queue):
+    job_ids = []
+    for _ in range(5):
+        job_id = _submit(queue)
+        done = queue.completion(job_id)
+        if done is not None:
+            done.result(timeout=10)
+        job_ids.append(job_id)
+    for i, job_id in enumerate(job_ids):
+        path = os.path.join(queue.jobs_dir, f"{job_id}.json")
+        os.utime(path, (1_000_000 + i, 1_000_000 + i) if i == 0 else (2e9 + i, 2e9 + i))
+    stale = os.path.join(queue.jobs_dir, "stale.json")
+    with open(stale, "w", encoding="utf-8") as f:
+        json.dump({"state": "queued"}, f)
+    os.utime(stale, (1_000_000, 1_000_000))
+
+    queue.prune_jobs()
+    assert sorted(os.listdir(queue.jobs_dir)) == sorted(f"{job_id}.json" for job_id in job_ids[-3:])
+    assert queue.get_job(job_ids[0]) is None
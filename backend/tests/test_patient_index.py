@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+
+import patient_index
+from models import BloodTestReport
+from patient_index import DEFAULT_MATCH_THRESHOLD, PatientIndex
+from storage_service import BloodTestStorageService
+
+
+def _report(report_id, patient_name, day=1):
+    return BloodTestReport(id=report_id, patient_name=patient_name, test_date=datetime(2024, 1, day),
+                           hospital="协和医院", items=[])
+
+
+def _index(*names):
+    index = PatientIndex()
+    for i, name in enumerate(names):
+        index.add(_report(str(i), name))
+    return index
+
+
+def _matched(index, name, threshold=None):
+    return [matched for matched, _ in index.match(name, threshold)]
+
+
+# 基线实现（姓名互相包含）能匹配到的姓名
+@pytest.mark.parametrize("query, other", [
+    ("时新龙", "时新龙3"),
+    ("时新龙3", "时新龙"),
+    ("张三", "张三丰"),
+    ("Zhang San", "zhang san"),
+    ("zhangsan", "Zhang San"),
+    ("张三", "张三（复查）"),
+])
+def test_baseline_matches_are_kept(query, other):
+    assert other in _matched(_index(query, other), query)
+
+
+def test_one_misread_character_in_short_name_matches():
+    index = _index("时新龙", "时新尤")
+    assert _matched(index, "时新龙") == ["时新龙", "时新尤"]
+
+
+def test_different_two_character_names_do_not_match():
+    index = _index("张三", "张四", "测试")
+    assert _matched(index, "张三") == ["张三"]
+    assert _matched(index, "测试") == ["测试"]
+
+
+def test_scores_are_symmetric():
+    names = ("时新龙", "时新龙3", "时新尤", "张三", "张三丰", "测试")
+    index = _index(*names)
+    scores = {(query, name): score for query in names for name, score in index.match(query, threshold=0.0)}
+    for (query, name), score in scores.items():
+        assert scores[(name, query)] == score
+
+
+def test_homophone_matches_with_pinyin():
+    if patient_index.lazy_pinyin is None:
+        pytest.skip("pypinyin 未安装")
+    index = _index("时新龙", "石新龙")
+    assert "石新龙" in _matched(index, "时新龙")
+
+
+def test_history_found_for_baseline_names(tmp_path):
+    service = BloodTestStorageService(str(tmp_path), engine="json")
+    service.save_report(_report("a", "时新龙", day=1))
+    service.save_report(_report("b", "时新龙3", day=2))
+    service.save_report(_report("c", "测试", day=3))
+
+    history, matches = service.get_history_reports(service.get_report("b"), DEFAULT_MATCH_THRESHOLD)
+    assert [report.id for report in history] == ["a"]
+    assert [name for name, _ in matches] == ["时新龙3", "时新龙"]
+
+
+def test_chinese_and_latin_spellings_match_with_pinyin():
+    if patient_index.lazy_pinyin is None:
+        pytest.skip("pypinyin 未安装")
+    index = _index("张三", "Zhang San", "Zhāng Sān", "张四")
+    assert set(_matched(index, "张三")) == {"张三", "Zhang San", "Zhāng Sān"}
+    assert set(_matched(index, "Zhang San")) == {"张三", "Zhang San", "Zhāng Sān"}
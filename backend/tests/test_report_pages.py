@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from report_pages import count_pages, load_page
+
+
+def test_multi_page_tiff_pages_are_counted_and_loaded_individually(tmp_path):
+    path = str(tmp_path / "report.tif")
+    frames = [Image.fromarray(np.full((60, 40), shade, dtype=np.uint8)) for shade in (0, 100, 200)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], compression="tiff_lzw")
+
+    assert count_pages(path) == 3
+    for page, shade in enumerate((0, 100, 200)):
+        image = load_page(path, page)
+        assert image.shape == (60, 40, 3)
+        assert int(image[0, 0, 0]) == shade
+    with pytest.raises(ValueError):
+        load_page(path, 3)
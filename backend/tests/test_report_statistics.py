@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+from models import BloodTestItem, BloodTestReport
+from report_statistics import StatisticsAggregator, compute_statistics, find_drift
+from storage_service import BloodTestStorageService
+
+
+def _report(report_id, test_date, patient_name="张三"):
+    return BloodTestReport(
+        id=report_id,
+        patient_name=patient_name,
+        test_date=test_date,
+        hospital="协和医院",
+        items=[BloodTestItem(name="血小板计数", value=45, unit="×10^9/L",
+                             reference_range="125-350", status="偏低", is_abnormal=True)]
+    )
+
+
+def test_aware_and_naive_dates_are_normalized():
+    aware = _report("a", "2024-03-01T08:00:00Z")
+    offset = _report("b", datetime(2024, 3, 2, 8, tzinfo=timezone(timedelta(hours=8))))
+    naive = _report("c", datetime(2024, 2, 1, 9, 30))
+
+    for report in (aware, offset, naive):
+        assert report.test_date.tzinfo is None
+    assert aware.test_date == datetime(2024, 3, 1, 8, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+    aggregator = StatisticsAggregator()
+    for report in (aware, naive, offset):
+        aggregator.add(report)
+    summary = aggregator.summary()
+    assert summary["date_range"]["start"] == naive.test_date.isoformat()
+    assert summary["date_range"]["end"] == offset.test_date.isoformat()
+
+    aggregator.remove(offset)
+    assert aggregator.summary()["date_range"]["end"] == aware.test_date.isoformat()
+
+
+def test_mixed_dates_in_storage_load_in_new_process(tmp_path):
+    service = BloodTestStorageService(str(tmp_path), engine="json")
+    service.save_report(_report("a", datetime(2024, 1, 5, 10)))
+    service.save_report(_report("b", "2024-01-06T02:00:00+08:00", patient_name="李四"))
+    # 旧版本直接写入的带时区日期
+    legacy = _report("c", datetime(2024, 1, 7)).dict()
+    legacy["test_date"] = "2024-01-07T00:00:00Z"
+    service.engine.save_report(legacy)
+
+    reloaded = BloodTestStorageService(str(tmp_path), engine="json")
+    reports = reloaded.get_all_reports()
+    assert len(reports) == 3
+    assert all(report.test_date.tzinfo is None for report in reports)
+    assert reloaded.get_statistics()["total_reports"] == 3
+    assert reloaded.check_statistics() == {}
+    assert find_drift(compute_statistics(reports), reloaded.get_statistics()) == {}
+
+
+def test_check_reports_drift_in_live_incremental_state(tmp_path):
+    service = BloodTestStorageService(str(tmp_path), engine="json")
+    service.save_report(_report("a", datetime(2024, 1, 5)))
+    assert service.check_statistics() == {}
+
+    # 模拟增量维护出错
+    service.statistics.abnormal_count += 1
+    drift = service.check_statistics()
+    assert drift == {"abnormal_count": {"expected": 1, "actual": 2}}
+
+
+def test_check_sees_writes_from_other_processes(tmp_path):
+    service = BloodTestStorageService(str(tmp_path), engine="json")
+    service.save_report(_report("a", datetime(2024, 1, 5)))
+    other = BloodTestStorageService(str(tmp_path), engine="json")
+    other.save_report(_report("b", datetime(2024, 1, 6), patient_name="李四"))
+    assert service.check_statistics() == {}
+    assert service.get_statistics()["total_patients"] == 2
+
+
+def test_check_does_not_deadlock_with_concurrent_writes(tmp_path):
+    import threading
+
+    service = BloodTestStorageService(str(tmp_path), engine="journal")
+    errors = []
+
+    def write():
+        try:
+            for i in range(200):
+                service.save_report(_report(f"w{i}", datetime(2024, 1, 1 + i % 28)))
+        except Exception as e:
+            errors.append(e)
+
+    def check():
+        try:
+            while writer.is_alive():
+                service.check_statistics()
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write, daemon=True)
+    checker = threading.Thread(target=check, daemon=True)
+    writer.start()
+    checker.start()
+    writer.join(timeout=60)
+    checker.join(timeout=60)
+    assert not writer.is_alive() and not checker.is_alive(), "写入与一致性检查互相等待"
+    assert not errors
+    assert service.check_statistics() == {}
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from models import BloodTestReport
+from search_index import InvertedIndex, tokenize
+
+
+def _report(report_id, patient_name, hospital="协和医院", notes=None):
+    return BloodTestReport(id=report_id, patient_name=patient_name, test_date=datetime(2024, 1, 1),
+                           hospital=hospital, items=[], notes=notes)
+
+
+def _index(*reports):
+    index = InvertedIndex()
+    for report in reports:
+        index.add(report)
+    return index
+
+
+def _ids(index, query):
+    return [report_id for report_id, _ in index.search(query)]
+
+
+def test_chinese_is_split_into_bigrams_and_latin_into_words():
+    assert tokenize("张三丰 Zhang-San 2024") == ["张三", "三丰", "丰", "zhang", "san", "2024"]
+
+
+def test_bigram_and_single_character_queries_match_any_position():
+    index = _index(_report("a", "张三丰"), _report("b", "李四", hospital="人民医院"))
+    assert _ids(index, "三丰") == ["a"]
+    assert _ids(index, "三") == ["a"]
+    assert _ids(index, "人民") == ["b"]
+    assert _ids(index, "丰四") == []
+
+
+def test_query_terms_match_by_prefix_and_all_must_match():
+    index = _index(_report("a", "Zhangsan"), _report("b", "Zhang Wei"), _report("c", "Li Na"))
+    assert sorted(_ids(index, "zha")) == ["a", "b"]
+    assert _ids(index, "zhangs") == ["a"]
+    assert _ids(index, "zhang wei") == ["b"]
+    assert _ids(index, "zhang na") == []
+
+
+def test_rarer_terms_and_heavier_fields_rank_first():
+    index = _index(
+        _report("name", "王芳", notes="复查"),
+        _report("notes", "李四", notes="王芳家属"),
+        _report("other1", "赵六", notes="复查"),
+        _report("other2", "钱七", notes="复查"),
+    )
+    # 姓名字段权重高于备注
+    assert _ids(index, "王芳") == ["name", "notes"]
+
+    scores = dict(index.search("复查"))
+    rare = dict(index.search("家属"))
+    # 出现在更少报告中的词逆文档频率更高
+    assert rare["notes"] > scores["name"]
+
+
+def test_removed_reports_are_no_longer_found():
+    report = _report("a", "张三")
+    index = _index(report, _report("b", "张三丰"))
+    index.remove(report)
+    assert _ids(index, "张三") == ["b"]
+    index.remove(_report("b", "张三丰"))
+    assert _ids(index, "张") == []
@@ -0,0 +1,154 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from storage_engine import JSONStorageEngine, JournalStorageEngine, SQLiteStorageEngine, create_storage_engine
+
+
+def _legacy_record(report_id, test_date):
+    return {
+        "id": report_id,
+        "patient_name": "张三",
+        "test_date": test_date,
+        "hospital": "协和医院",
+        "items": [{"name": "血小板计数", "value": 45, "unit": "×10^9/L",
+                   "reference_range": "125-350", "status": "偏低", "is_abnormal": True}]
+    }
+
+
+def _report(report_id, test_date="2024-03-01T08:00:00", hospital="协和医院", sex="M", values=(45,)):
+    return {
+        "id": report_id, "patient_name": "张三", "test_date": test_date, "hospital": hospital,
+        "image_path": None, "notes": None, "created_at": test_date, "updated_at": test_date,
+        "ocr_info": None, "sex": sex, "age": 30.0,
+        "items": [{"name": "血小板计数", "value": value, "unit": "×10^9/L", "reference_range": "125-350",
+                   "status": "偏低", "is_abnormal": True} for value in values]
+    }
+
+
+@pytest.fixture(params=["json", "sqlite", "journal"])
+def open_engine(request, tmp_path):
+    engines = []
+
+    def factory():
+        engine = create_storage_engine(request.param, str(tmp_path))
+        engines.append(engine)
+        return engine
+
+    yield factory
+    for engine in engines:
+        if hasattr(engine, "close"):
+            engine.close()
+
+
+def test_engine_round_trip_survives_reopen(open_engine):
+    engine = open_engine()
+    token = engine.change_token()
+    engine.save_report(_report("a"))
+    engine.save_reports([_report("b"), _report("c", values=(50, 60))])
+    engine.save_report(_report("a", hospital="人民医院"))
+    assert engine.delete_report("b")
+    assert not engine.delete_report("missing")
+    assert engine.change_token() != token
+
+    reopened = open_engine()
+    reports = {r["id"]: r for r in reopened.iter_reports()}
+    assert set(reports) == {"a", "c"}
+    assert reports["a"]["hospital"] == "人民医院"
+    assert reports["c"] == _report("c", values=(50, 60))
+
+
+def test_indicator_rows_are_filtered_alike_in_every_engine(open_engine):
+    engine = open_engine()
+    engine.save_reports([
+        _report("a", "2024-01-10T08:00:00", values=(40, 99)),
+        _report("b", "2024-02-10T08:00:00", hospital="人民医院", sex="F", values=(50,)),
+        _report("c", "2024-03-10T08:00:00", values=(60,)),
+    ])
+
+    def values(**filters):
+        return sorted(row[0] for batch in engine.iter_indicator_rows("血小板计数", batch_size=2, **filters)
+                      for row in batch)
+
+    # 每份报告只取该指标第一次出现的项目
+    assert values() == [40, 50, 60]
+    assert values(start_date=datetime(2024, 2, 10, 8), end_date=datetime(2024, 3, 1)) == [50]
+    assert values(hospital="协和医院") == [40, 60]
+    assert values(sex="F") == [50]
+    assert list(engine.iter_indicator_rows("白细胞计数")) == []
+
+
+def test_sqlite_migration_normalizes_dates_and_skips_invalid_records(tmp_path):
+    legacy_file = tmp_path / "blood_test_reports.json"
+    legacy_file.write_text(json.dumps([
+        _legacy_record("a", "2024-03-01T08:00:00Z"),
+        _legacy_record("b", "2024-03-02T09:30:00"),
+        {"id": "c", "patient_name": "李四"},
+    ]), encoding="utf-8")
+
+    engine = SQLiteStorageEngine(str(tmp_path / "reports.db"), str(legacy_file))
+    reports = {r["id"]: r for r in engine.iter_reports()}
+
+    assert set(reports) == {"a", "b"}
+    local = datetime(2024, 3, 1, 8, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert reports["a"]["test_date"] == local.isoformat()
+    assert reports["b"]["test_date"] == "2024-03-02T09:30:00"
+
+
+def test_sqlite_date_filter_matches_json_engine_for_legacy_rows(tmp_path):
+    # 早期版本迁移时原样保存了带时区的日期文本
+    raw_date = "2024-03-01T23:30:00-02:00"
+    local = datetime(2024, 3, 1, 23, 30, tzinfo=timezone(timedelta(hours=-2))).astimezone().replace(tzinfo=None)
+    db_path = str(tmp_path / "reports.db")
+    engine = SQLiteStorageEngine(db_path)
+    engine.save_report(_legacy_record("a", raw_date))
+    conn = engine._connect()
+    conn.execute("DELETE FROM meta WHERE key = 'dates_normalized'")
+
+    reopened = SQLiteStorageEngine(db_path)
+    json_engine = JSONStorageEngine(str(tmp_path / "reports.json"))
+    json_engine.save_report(_legacy_record("a", raw_date))
+
+    for start in (local - timedelta(minutes=1), local + timedelta(minutes=1)):
+        sqlite_rows = [row for batch in reopened.iter_indicator_rows("血小板计数", start_date=start) for row in batch]
+        json_rows = [row for batch in json_engine.iter_indicator_rows("血小板计数", start_date=start) for row in batch]
+        assert len(sqlite_rows) == len(json_rows)
+    assert next(reopened.iter_reports())["test_date"] == local.isoformat()
+
+
+def test_journal_truncates_partial_line_left_by_crash(tmp_path):
+    engine = JournalStorageEngine(str(tmp_path / "reports.json"))
+    engine.save_report(_report("a"))
+    engine.close()
+    with open(engine.journal_file, "ab") as f:
+        f.write(b'{"op":"upsert","report":{"id":"b"')
+
+    reopened = JournalStorageEngine(str(tmp_path / "reports.json"))
+    try:
+        assert [r["id"] for r in reopened.iter_reports()] == ["a"]
+        reopened.save_report(_report("c"))
+        assert sorted(r["id"] for r in reopened.iter_reports()) == ["a", "c"]
+    finally:
+        reopened.close()
+
+
+def test_journal_compaction_keeps_state_and_empties_journal(tmp_path):
+    snapshot = str(tmp_path / "reports.json")
+    engine = JournalStorageEngine(snapshot)
+    other = JournalStorageEngine(snapshot)
+    try:
+        engine.save_reports([_report("a"), _report("b")])
+        engine.delete_report("a")
+        engine.compact()
+        assert os.path.getsize(engine.journal_file) == 0
+        with open(snapshot, encoding="utf-8") as f:
+            assert [r["id"] for r in json.load(f)] == ["b"]
+
+        # 另一个实例发现快照和日志被替换后重新加载
+        other.save_report(_report("c"))
+        assert sorted(r["id"] for r in engine.iter_reports()) == ["b", "c"]
+    finally:
+        engine.close()
+        other.close()
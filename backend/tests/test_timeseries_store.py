@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from models import BloodTestItem, BloodTestReport
+from storage_service import BloodTestStorageService
+
+
+def _report(report_id, day, value, patient_name="张三"):
+    return BloodTestReport(
+        id=report_id,
+        patient_name=patient_name,
+        test_date=datetime(2024, 1, day),
+        hospital="协和医院",
+        items=[BloodTestItem(name="血小板", value=value, unit="10^9/L",
+                             reference_range="125-350", status="偏低", is_abnormal=True)]
+    )
+
+
+def _platelets(service, patient_name="张三"):
+    return list(service.get_indicator_history([patient_name]).column("血小板"))
+
+
+def test_series_written_incrementally_matches_reports(tmp_path):
+    service = BloodTestStorageService(str(tmp_path), engine="json")
+    service.save_report(_report("a", 1, 80))
+    service.save_report(_report("b", 3, 60))
+    service.save_report(_report("c", 2, 70))
+    service.delete_report("b")
+
+    assert _platelets(service) == [80, 70]
+    series, fingerprint = service.timeseries._load("张三")
+    assert len(series) == 2 and fingerprint is not None
+    # 增量维护的文件一致，读取时不重建
+    assert service.timeseries.get_series("张三", service.cache.by_patient("张三")) is series
+
+
+def test_series_repaired_after_crash_before_record(tmp_path, monkeypatch):
+    service = BloodTestStorageService(str(tmp_path), engine="json")
+    service.save_report(_report("a", 1, 80))
+
+    # 报告已写入存储，更新列式文件前进程退出
+    monkeypatch.setattr(service.timeseries, "record", lambda report, previous=None: None)
+    service.save_report(_report("b", 2, 60))
+    service.save_report(_report("a", 1, 90))
+    monkeypatch.undo()
+
+    restarted = BloodTestStorageService(str(tmp_path), engine="json")
+    assert _platelets(restarted) == [90, 60]
+    assert len(restarted.timeseries._load("张三")[0]) == 2
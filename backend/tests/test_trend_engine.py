@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from indicators import INDICATOR_NAMES
+from timeseries_store import PatientSeries
+from trend_engine import TREND_DOWN, TREND_NONE, TREND_STABLE, TREND_UP, fit_patients, fit_ragged, fit_trends
+
+
+def test_slope_uses_actual_test_dates():
+    # 间隔不均匀：第1、2、11天，数值按每天+2线性增长
+    fit = fit_ragged([([datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 11)], [100, 102, 120])])
+    assert fit.slope_per_day[0] == pytest.approx(2.0)
+    assert fit.span_days[0] == pytest.approx(10.0)
+    assert fit.confidence[0] == pytest.approx(1.0)
+    assert fit.labels()[0] == TREND_UP
+
+
+def test_ragged_series_are_fitted_independently():
+    fit = fit_ragged([
+        ([datetime(2024, 1, 1), datetime(2024, 1, 3)], [50, 40]),
+        ([datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 3)], [10, 10.1, 10]),
+        ([datetime(2024, 1, 1)], [5]),
+    ])
+    assert fit.slope_per_day[0] == pytest.approx(-5.0)
+    assert fit.confidence[0] == 0.0  # 两个点没有残差自由度
+    assert list(fit.labels()) == [TREND_DOWN, TREND_STABLE, TREND_NONE]
+    assert np.isnan(fit.slope_per_day[2])
+
+
+def test_missing_values_and_same_day_tests_are_not_fitted():
+    fit = fit_trends([0.0, 1.0, 2.0], [[1.0, np.nan, 3.0], [np.nan, np.nan, 4.0]])
+    assert fit.slope_per_day[0] == pytest.approx(1.0)
+    assert list(fit.points) == [2, 1]
+
+    same_day = fit_trends([0.0, 0.0], [[1.0, 2.0]])
+    assert np.isnan(same_day.slope_per_day[0])
+    assert same_day.labels()[0] == TREND_NONE
+
+
+def test_fit_patients_returns_one_fit_per_patient_and_indicator():
+    platelets = INDICATOR_NAMES.index("血小板")
+    dates = np.array([datetime(2024, 1, 1), datetime(2024, 1, 5)], dtype='datetime64[us]')
+    values = np.full((len(INDICATOR_NAMES), 2), np.nan)
+    values[platelets] = [100, 140]
+    series = PatientSeries(dates, np.array(["a", "b"]), values)
+
+    fit = fit_patients([series, PatientSeries.empty()])
+    assert fit.slope_per_day.shape == (2, len(INDICATOR_NAMES))
+    assert fit.slope_per_day[0, platelets] == pytest.approx(10.0)
+    assert fit.points[1].sum() == 0
+    assert fit.describe()[0, platelets]["trend"] == TREND_UP
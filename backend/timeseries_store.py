@@ -0,0 +1,246 @@
+"""
+指标时间序列存储模块
+按患者以列式数组保存各标准指标的历史值，趋势和对比分析直接读取连续数组
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from models import BloodTestReport
+from indicators import INDICATOR_NAMES
+
+# 列式文件格式版本，指标列表或布局变化时需要整体重建
+TIMESERIES_FORMAT_VERSION = 1
+
+_INDICATOR_INDEX = {name: i for i, name in enumerate(INDICATOR_NAMES)}
+
+
+class PatientSeries:
+    """单个患者（或合并后的多个患者）的指标时间序列
+
+    dates 与 report_ids 按检测日期升序排列；values 形状为 (指标数, 报告数)，
+    每一行是一个指标的连续数组，缺失值为 NaN。
+    """
+
+    def __init__(self, dates: np.ndarray, report_ids: np.ndarray, values: np.ndarray):
+        self.dates = dates
+        self.report_ids = report_ids
+        self.values = values
+
+    @classmethod
+    def empty(cls) -> 'PatientSeries':
+        return cls(
+            np.empty(0, dtype='datetime64[us]'),
+            np.empty(0, dtype='U64'),
+            np.empty((len(INDICATOR_NAMES), 0), dtype=np.float64)
+        )
+
+    @classmethod
+    def from_reports(cls, reports: List[BloodTestReport]) -> 'PatientSeries':
+        """由报告列表一次性构建序列"""
+        if not reports:
+            return cls.empty()
+        ordered = sorted(reports, key=lambda r: r.test_date.replace(tzinfo=None))
+        return cls(
+            np.array([r.test_date.replace(tzinfo=None) for r in ordered], dtype='datetime64[us]'),
+            np.array([r.id for r in ordered], dtype=f'U{max(64, max(len(r.id) for r in ordered))}'),
+            np.column_stack([report_column(r) for r in ordered])
+        )
+
+    def __len__(self) -> int:
+        return len(self.report_ids)
+
+    def column(self, indicator_name: str) -> Optional[np.ndarray]:
+        """指定指标的数值数组，非标准指标返回None"""
+        index = _INDICATOR_INDEX.get(indicator_name)
+        if index is None:
+            return None
+        return self.values[index]
+
+    def without(self, report_id: str) -> 'PatientSeries':
+        """排除指定报告"""
+        keep = self.report_ids != report_id
+        if keep.all():
+            return self
+        return PatientSeries(self.dates[keep], self.report_ids[keep], self.values[:, keep])
+
+    def with_report(self, report: BloodTestReport) -> 'PatientSeries':
+        """插入或替换一条报告，保持按日期排序"""
+        series = self.without(report.id)
+        date = np.datetime64(report.test_date.replace(tzinfo=None), 'us')
+        position = int(np.searchsorted(series.dates, date, side='right'))
+        return PatientSeries(
+            np.insert(series.dates, position, date),
+            np.insert(series.report_ids.astype(f'U{max(64, len(report.id))}'), position, report.id),
+            np.insert(series.values, position, report_column(report), axis=1)
+        )
+
+    @staticmethod
+    def merge(series_list: List['PatientSeries']) -> 'PatientSeries':
+        """合并多个序列并按日期稳定排序"""
+        series_list = [s for s in series_list if len(s)]
+        if not series_list:
+            return PatientSeries.empty()
+        if len(series_list) == 1:
+            return series_list[0]
+        dates = np.concatenate([s.dates for s in series_list])
+        order = np.argsort(dates, kind='stable')
+        return PatientSeries(
+            dates[order],
+            np.concatenate([s.report_ids for s in series_list])[order],
+            np.concatenate([s.values for s in series_list], axis=1)[:, order]
+        )
+
+
+def report_digest(report: BloodTestReport) -> int:
+    """单条报告版本（ID和更新时间）的64位摘要"""
+    payload = f"{report.id}\0{report.updated_at.isoformat()}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), 'little')
+
+
+def report_fingerprint(reports: Iterable[BloodTestReport]) -> int:
+    """一组报告的指纹：各报告摘要的异或，与顺序无关，增删单条报告时可以增量更新"""
+    fingerprint = 0
+    for report in reports:
+        fingerprint ^= report_digest(report)
+    return fingerprint
+
+
+def report_column(report: BloodTestReport) -> np.ndarray:
+    """报告中各标准指标的数值（同一指标出现多次时取第一次）"""
+    column = np.full(len(INDICATOR_NAMES), np.nan)
+    for item in report.items:
+        index = _INDICATOR_INDEX.get(item.name)
+        if index is not None and np.isnan(column[index]):
+            column[index] = item.value
+    return column
+
+
+class IndicatorTimeSeriesStore:
+    """按患者保存的列式指标存储
+
+    每个患者一个 .npz 文件（dates、report_ids、values），随报告写入增量更新。
+    写入由存储服务在跨进程写锁内调用；读取时按文件 inode/mtime 复用已加载的数组。
+
+    每个文件同时保存其中报告的指纹（report_fingerprint）。保存报告后、更新序列前进程退出时，
+    文件与存储中的报告不再一致；按报告读取（get_series 传入 reports）时比较指纹，
+    不一致则由这些报告重建该患者的文件。
+    """
+
+    def __init__(self, data_dir: str):
+        self.series_dir = os.path.join(data_dir, "timeseries")
+        self.manifest_file = os.path.join(self.series_dir, "manifest.json")
+        os.makedirs(self.series_dir, exist_ok=True)
+
+        self._loaded: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def is_current(self) -> bool:
+        """列式文件是否存在且与当前格式、指标列表一致"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        return (manifest.get('version') == TIMESERIES_FORMAT_VERSION
+                and manifest.get('indicators') == INDICATOR_NAMES)
+
+    def rebuild(self, reports: Iterable[BloodTestReport]):
+        """根据全部报告重建列式文件"""
+        by_patient: Dict[str, List[BloodTestReport]] = {}
+        for report in reports:
+            by_patient.setdefault(report.patient_name, []).append(report)
+
+        for name in os.listdir(self.series_dir):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.series_dir, name))
+        with self._lock:
+            self._loaded = {}
+        for patient_name, patient_reports in by_patient.items():
+            self._save(patient_name, PatientSeries.from_reports(patient_reports), report_fingerprint(patient_reports))
+
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': TIMESERIES_FORMAT_VERSION,
+                'indicators': INDICATOR_NAMES,
+                'built_at': datetime.now().isoformat()
+            }, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+
+    def _path(self, patient_name: str) -> str:
+        digest = hashlib.sha1(patient_name.encode('utf-8')).hexdigest()
+        return os.path.join(self.series_dir, f"{digest}.npz")
+
+    def _save(self, patient_name: str, series: PatientSeries, fingerprint: int):
+        path = self._path(patient_name)
+        if not len(series):
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, dates=series.dates, report_ids=series.report_ids, values=series.values,
+                     fingerprint=np.uint64(fingerprint))
+        os.replace(tmp_file, path)
+
+    def _load(self, patient_name: str) -> Tuple[PatientSeries, Optional[int]]:
+        """读取患者的序列及其报告指纹；没有文件时为空序列和空集合的指纹0，旧文件没有指纹时为None"""
+        path = self._path(patient_name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return PatientSeries.empty(), 0
+        # 文件通过 os.replace 整体替换，inode 与 mtime 一起判断是否变化
+        token = (st.st_ino, st.st_mtime_ns)
+
+        with self._lock:
+            cached = self._loaded.get(patient_name)
+            if cached is not None and cached[0] == token:
+                return cached[1], cached[2]
+
+        with np.load(path) as data:
+            series = PatientSeries(data['dates'], data['report_ids'], data['values'])
+            fingerprint = int(data['fingerprint']) if 'fingerprint' in data.files else None
+        with self._lock:
+            self._loaded[patient_name] = (token, series, fingerprint)
+        return series, fingerprint
+
+    def get_series(self, patient_name: str, reports: Optional[List[BloodTestReport]] = None) -> PatientSeries:
+        """
+        读取患者的指标时间序列
+
+        Args:
+            patient_name: 患者姓名
+            reports: 该患者当前的全部报告；传入时校验文件的指纹，不一致则由这些报告重建文件
+        """
+        series, fingerprint = self._load(patient_name)
+        if reports is None or fingerprint == report_fingerprint(reports):
+            return series
+        series = PatientSeries.from_reports(reports)
+        self._save(patient_name, series, report_fingerprint(reports))
+        return series
+
+    def record(self, report: BloodTestReport, previous: Optional[BloodTestReport] = None):
+        """写入报告后追加或更新其指标值；报告改换患者时从原患者序列中移除"""
+        if previous is not None and previous.patient_name != report.patient_name:
+            self.discard(previous)
+            previous = None
+        series, fingerprint = self._load(report.patient_name)
+        # 文件原本就不一致时指纹随之不一致，下次按报告读取时重建
+        fingerprint = (fingerprint or 0) ^ report_digest(report)
+        if previous is not None:
+            fingerprint ^= report_digest(previous)
+        self._save(report.patient_name, series.with_report(report), fingerprint)
+
+    def discard(self, report: BloodTestReport):
+        """删除报告后移除其指标值"""
+        series, fingerprint = self._load(report.patient_name)
+        remaining = series.without(report.id)
+        if remaining is not series:
+            self._save(report.patient_name, remaining, (fingerprint or 0) ^ report_digest(report))
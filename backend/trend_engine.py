@@ -0,0 +1,171 @@
+"""
+指标趋势计算模块
+以实际检测时间（天）为自变量，对任意多个指标/患者的序列一次向量化做最小二乘拟合
+"""
+
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+import numpy as np
+from timeseries_store import PatientSeries
+from indicators import INDICATOR_NAMES
+
+# 拟合变化量（斜率 × 时间跨度）相对均值低于该比例时视为稳定
+TREND_RELATIVE_THRESHOLD = 0.05
+
+TREND_NONE = "无趋势"
+TREND_UP = "上升"
+TREND_DOWN = "下降"
+TREND_STABLE = "稳定"
+
+_US_PER_DAY = 86400 * 1e6
+
+
+class TrendFit(NamedTuple):
+    """一组序列的拟合结果，各字段形状与输入去掉最后一维（时间）后相同"""
+    slope_per_day: np.ndarray  # 每天的变化量（指标单位/天），无法拟合时为 NaN
+    relative_change: np.ndarray  # 拟合变化量（斜率 × 时间跨度）相对均值的比例
+    confidence: np.ndarray  # 调整后的决定系数（0-1），少于3个点时为0
+    points: np.ndarray  # 参与拟合的点数
+    span_days: np.ndarray  # 首末检测间隔天数
+    mean: np.ndarray  # 参与拟合的数值均值
+
+    def labels(self) -> np.ndarray:
+        """趋势文字：上升/下降/稳定，少于2个点或所有检测在同一时刻时为无趋势"""
+        labels = np.full(self.slope_per_day.shape, TREND_STABLE, dtype=object)
+        fitted = ~np.isnan(self.slope_per_day)
+        change = np.nan_to_num(self.relative_change)
+        labels[fitted & (change >= TREND_RELATIVE_THRESHOLD)] = TREND_UP
+        labels[fitted & (change <= -TREND_RELATIVE_THRESHOLD)] = TREND_DOWN
+        labels[~fitted] = TREND_NONE
+        return labels
+
+    def describe(self) -> np.ndarray:
+        """各序列的拟合结果字典（JSON可序列化），形状与字段相同"""
+        labels = self.labels().ravel().tolist()
+
+        def numbers(array, digits):
+            rounded = np.round(array, digits).ravel()
+            return [None if value != value else value for value in rounded.tolist()]
+
+        slopes = numbers(self.slope_per_day, 6)
+        changes = numbers(self.relative_change, 4)
+        confidences = numbers(self.confidence, 4)
+        spans = numbers(self.span_days, 2)
+        points = self.points.ravel().tolist()
+
+        described = np.empty(len(labels), dtype=object)
+        described[:] = [
+            {
+                "trend": labels[i],
+                "slope_per_day": slopes[i],
+                "relative_change": changes[i],
+                "confidence": confidences[i],
+                "points": points[i],
+                "span_days": spans[i]
+            }
+            for i in range(len(labels))
+        ]
+        return described.reshape(self.points.shape)
+
+
+def to_days(dates: np.ndarray, origin: Optional[np.datetime64] = None) -> np.ndarray:
+    """
+    将检测时间转换为相对天数
+
+    Args:
+        dates: datetime64 数组，NaT 表示缺失
+        origin: 起点，为空时取最早的有效时间
+
+    Returns:
+        浮点天数数组，缺失处为 NaN
+    """
+    dates = np.asarray(dates, dtype='datetime64[us]')
+    valid = ~np.isnat(dates)
+    if origin is None:
+        if not valid.any():
+            return np.full(dates.shape, np.nan)
+        origin = dates[valid].min()
+    days = (dates - origin).astype(np.float64) / _US_PER_DAY
+    days[~valid] = np.nan
+    return days
+
+
+def fit_trends(days: np.ndarray, values: np.ndarray) -> TrendFit:
+    """
+    沿最后一维对每条序列做最小二乘直线拟合
+
+    Args:
+        days: 检测时间（天），可广播到 values 的形状，NaN 表示缺失
+        values: 指标数值，形状 (..., 时间点数)，NaN 表示缺失（不同长度的序列用 NaN 补齐）
+
+    Returns:
+        拟合结果
+    """
+    values = np.asarray(values, dtype=np.float64)
+    days = np.broadcast_to(np.asarray(days, dtype=np.float64), values.shape)
+    mask = ~(np.isnan(values) | np.isnan(days))
+    points = mask.sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(mask, days, 0.0).sum(axis=-1) / points
+        y_mean = np.where(mask, values, 0.0).sum(axis=-1) / points
+        dx = np.where(mask, days - x_mean[..., None], 0.0)
+        dy = np.where(mask, values - y_mean[..., None], 0.0)
+        sxx = (dx * dx).sum(axis=-1)
+        sxy = (dx * dy).sum(axis=-1)
+        syy = (dy * dy).sum(axis=-1)
+
+        fitted = (points >= 2) & (sxx > 0)
+        slope = np.where(fitted, sxy / sxx, np.nan)
+        span = np.where(mask, days, -np.inf).max(axis=-1) - np.where(mask, days, np.inf).min(axis=-1)
+        span = np.where(points > 0, span, np.nan)
+        relative = np.where(y_mean != 0, slope * span / np.abs(y_mean), np.nan)
+
+        # 数值完全不变时直线拟合无残差，决定系数记为1
+        r_squared = np.where(syy > 0, sxy * sxy / (sxx * syy), 1.0)
+        adjusted = 1 - (1 - r_squared) * (points - 1) / (points - 2)
+        confidence = np.where(fitted & (points >= 3), np.clip(adjusted, 0.0, 1.0), 0.0)
+
+    return TrendFit(slope, relative, confidence, points, span, y_mean)
+
+
+def fit_ragged(series: List[tuple]) -> TrendFit:
+    """
+    一次拟合多条长度不同的序列
+
+    Args:
+        series: [(检测时间列表, 数值列表), ...]
+
+    Returns:
+        拟合结果，各字段形状为 (序列数,)
+    """
+    length = max((len(values) for _, values in series), default=0)
+    dates = np.full((len(series), length), np.datetime64('NaT'), dtype='datetime64[us]')
+    values = np.full((len(series), length), np.nan)
+    for row, (row_dates, row_values) in enumerate(series):
+        # 带时区的检测时间按其本地时间计算，与列式存储一致
+        dates[row, :len(row_dates)] = np.array([d.replace(tzinfo=None) if isinstance(d, datetime) else d
+                                                for d in row_dates], dtype='datetime64[us]')
+        values[row, :len(row_values)] = row_values
+    return fit_trends(to_days(dates), values)
+
+
+def fit_patients(series_list: List[PatientSeries]) -> TrendFit:
+    """
+    一次拟合多个患者的全部标准指标
+
+    各患者的列式序列按最长者用 NaN/NaT 补齐后堆叠为 (患者数, 指标数, 时间点数) 的数组。
+
+    Args:
+        series_list: 各患者的指标时间序列
+
+    Returns:
+        拟合结果，各字段形状为 (患者数, 指标数)，指标顺序同 INDICATOR_NAMES
+    """
+    length = max((len(series) for series in series_list), default=0)
+    dates = np.full((len(series_list), length), np.datetime64('NaT'), dtype='datetime64[us]')
+    values = np.full((len(series_list), len(INDICATOR_NAMES), length), np.nan)
+    for row, series in enumerate(series_list):
+        dates[row, :len(series)] = series.dates
+        values[row, :, :len(series)] = series.values
+    return fit_trends(to_days(dates)[:, None, :], values)
@@ -3,7 +3,9 @@
 包含各种兼容性和辅助函数
 """
 
+import base64
 import datetime
+import json
 from typing import Union
 
 
@@ -52,6 +54,24 @@ def parse_iso_datetime(date_string: str) -> datetime.datetime:
         raise ValueError(f"日期解析失败: {str(e)}")
 
 
+def to_naive_local(dt: datetime.datetime) -> datetime.datetime:
+    """
+    统一为不带时区的本地时间
+
+    带时区的时间先换算到服务器本地时区再去掉时区信息，
+    与 datetime.now() 生成的时间可以直接比较和排序。
+
+    Args:
+        dt: datetime对象（带或不带时区）
+
+    Returns:
+        不带时区的本地时间
+    """
+    if dt.tzinfo is not None and dt.utcoffset() is not None:
+        return dt.astimezone().replace(tzinfo=None)
+    return dt.replace(tzinfo=None)
+
+
 def format_datetime(dt: datetime.datetime, format_str: str = None) -> str:
     """
     格式化datetime对象为字符串
@@ -88,3 +108,39 @@ def is_valid_date(date_string: str) -> bool:
         return True
     except ValueError:
         return False
+
+
+def encode_cursor(sort_value: str, record_id: str) -> str:
+    """
+    将排序值和记录ID编码为分页游标
+    
+    Args:
+        sort_value: 当前页最后一条记录的排序字段值
+        record_id: 当前页最后一条记录的ID
+        
+    Returns:
+        URL安全的游标字符串
+    """
+    raw = json.dumps([sort_value, record_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    解析分页游标
+    
+    Args:
+        cursor: encode_cursor生成的游标字符串
+        
+    Returns:
+        (排序值, 记录ID)
+        
+    Raises:
+        ValueError: 如果游标格式无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return sort_value, record_id
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
@@ -26,10 +26,15 @@ interface ComparisonData {
     values: number[];
     dates: string[];
     trend: string;
+    slope_per_day?: number | null;  // 每天的变化量（按实际检测时间拟合）
+    relative_change?: number | null;  // 拟合变化量相对均值的比例
+    confidence?: number;  // 拟合置信度（0-1）
+    statuses?: string[];
   }>;
   abnormal_changes: string[];
   comparison_summary: string;
   previous_reports?: BloodTestReport[]; // 新增字段，用于存储对比的报告
+  previous_report_ids?: string[];  // compact=true 时只返回历史报告ID
 }
 
 const BloodTestComparison: React.FC = () => {
@@ -75,7 +75,7 @@ const BloodTestUpload: React.FC = () => {
         data.append('notes', formData.notes);
       }
 
-      const response = await fetch('/api/upload-report', {
+      const response = await fetch('/api/upload-report?wait=true', {
         method: 'POST',
         body: data,
       });
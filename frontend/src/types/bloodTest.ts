@@ -2,6 +2,8 @@
 export interface BloodTestResult {
   patient_id: string;
   test_date: string;
+  sex?: 'M' | 'F';  // 性别，用于选择参考范围
+  age?: number;  // 年龄（岁）
   // 血细胞计数相关指标
   wbc?: number;  // 白细胞计数
   neut_percent?: number;  // 中性粒细胞百分比